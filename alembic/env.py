@@ -1,3 +1,4 @@
+import asyncio
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -59,19 +60,28 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
-def run_migrations_online():
-    connectable = engine.sync_engine
+def do_run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-        )
+async def run_async_migrations() -> None:
+    # The app engine is async (asyncpg), so migrations run through
+    # run_sync on one of its connections.
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
 
-        with context.begin_transaction():
-            context.run_migrations()
+    await engine.dispose()
 
 
+def run_migrations_online():
+    asyncio.run(run_async_migrations())
+
 
 if context.is_offline_mode():
     run_migrations_offline()
@@ -0,0 +1,46 @@
+"""add audit event id
+
+Revision ID: 0480b2f84b14
+Revises: 946092206183
+Create Date: 2026-10-19 20:41:09.552871
+
+Audit events carry an id assigned when they are captured, so an event
+replayed from a worker's spool after it already reached the table is
+skipped instead of stored twice.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0480b2f84b14'
+down_revision: Union[str, None] = '946092206183'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'audit_event',
+        sa.Column(
+            'event_id',
+            sa.Uuid(),
+            server_default=sa.text('gen_random_uuid()'),
+            nullable=False
+        )
+    )
+    op.alter_column('audit_event', 'event_id', server_default=None)
+    op.create_index(
+        'ix_audit_event_event_id',
+        'audit_event',
+        ['event_id'],
+        unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_event_event_id', table_name='audit_event')
+    op.drop_column('audit_event', 'event_id')
@@ -0,0 +1,66 @@
+"""add user search indexes
+
+Revision ID: 0f6b3f433f44
+Revises: 8facef9c0614
+Create Date: 2026-10-19 11:27:48.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f6b3f433f44'
+down_revision: Union[str, None] = '8facef9c0614'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_user_email_trgm',
+        'user',
+        ['email'],
+        postgresql_using='gin',
+        postgresql_ops={'email': 'gin_trgm_ops'},
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_full_name_trgm',
+        'user',
+        ['full_name'],
+        postgresql_using='gin',
+        postgresql_ops={'full_name': 'gin_trgm_ops'},
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_updated_at_live',
+        'user',
+        ['updated_at', 'id'],
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_superuser_live',
+        'user',
+        ['email'],
+        postgresql_where=sa.text('is_superuser AND deleted_at IS NULL')
+    )
+    op.create_index(
+        'ix_user_inactive_live',
+        'user',
+        ['email'],
+        postgresql_where=sa.text('NOT is_active AND deleted_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_inactive_live', table_name='user')
+    op.drop_index('ix_user_superuser_live', table_name='user')
+    op.drop_index('ix_user_updated_at_live', table_name='user')
+    op.drop_index('ix_user_full_name_trgm', table_name='user')
+    op.drop_index('ix_user_email_trgm', table_name='user')
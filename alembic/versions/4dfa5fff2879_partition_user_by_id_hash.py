@@ -0,0 +1,198 @@
+"""partition user by id hash
+
+Revision ID: 4dfa5fff2879
+Revises: 69492016be73
+Create Date: 2026-10-19 16:48:05.731942
+
+Rewrites "user" as a hash-partitioned table. A unique index on a
+partitioned table must contain the partition key, so email uniqueness
+moves to the user_email table, keyed by lower(email) and kept in step
+by a trigger. The copy takes an exclusive lock on "user" for its
+duration.
+
+Emails become unique regardless of case: user_email holds
+lower(email), so "Ann@example.com" and "ann@example.com" can no
+longer both belong to live users. The old unique index was case
+sensitive, so such pairs may exist; the upgrade refuses to run while
+they do and lists them, to be merged or renamed by hand first.
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4dfa5fff2879'
+down_revision: Union[str, None] = '69492016be73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+
+LIVE = sa.text('deleted_at IS NULL')
+
+SYNC_USER_EMAIL = """
+CREATE FUNCTION sync_user_email() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.deleted_at IS NULL AND (
+        TG_OP = 'DELETE'
+        OR NEW.deleted_at IS NOT NULL
+        OR lower(NEW.email) <> lower(OLD.email)
+    ) THEN
+        DELETE FROM user_email
+        WHERE email = lower(OLD.email) AND user_id = OLD.id;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.deleted_at IS NULL AND (
+        TG_OP = 'INSERT'
+        OR OLD.deleted_at IS NOT NULL
+        OR lower(NEW.email) <> lower(OLD.email)
+    ) THEN
+        INSERT INTO user_email (email, user_id)
+        VALUES (lower(NEW.email), NEW.id);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def create_user_indexes(unique_email: bool) -> None:
+    op.create_index(
+        'ix_user_email_live',
+        'user',
+        ['email'],
+        unique=unique_email,
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_deleted_at',
+        'user',
+        ['deleted_at'],
+        postgresql_where=sa.text('deleted_at IS NOT NULL')
+    )
+    op.create_index(
+        'ix_user_email_trgm',
+        'user',
+        ['email'],
+        postgresql_using='gin',
+        postgresql_ops={'email': 'gin_trgm_ops'},
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_full_name_trgm',
+        'user',
+        ['full_name'],
+        postgresql_using='gin',
+        postgresql_ops={'full_name': 'gin_trgm_ops'},
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_updated_at_live',
+        'user',
+        ['updated_at', 'id'],
+        postgresql_where=LIVE
+    )
+    op.create_index(
+        'ix_user_superuser_live',
+        'user',
+        ['email'],
+        postgresql_where=sa.text('is_superuser AND deleted_at IS NULL')
+    )
+    op.create_index(
+        'ix_user_inactive_live',
+        'user',
+        ['email'],
+        postgresql_where=sa.text('NOT is_active AND deleted_at IS NULL')
+    )
+
+
+def replace_user_table(partition_by: str | None) -> None:
+    op.drop_constraint('api_key_user_id_fkey', 'api_key')
+    op.rename_table('user', 'user_old')
+    op.execute(
+        'ALTER TABLE user_old RENAME CONSTRAINT user_pkey TO user_old_pkey'
+    )
+    op.execute(
+        'CREATE TABLE "user" '
+        '(LIKE user_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        + (f' PARTITION BY {partition_by}' if partition_by else '')
+    )
+    op.execute(
+        'ALTER TABLE "user" ADD CONSTRAINT user_pkey PRIMARY KEY (id)'
+    )
+    if partition_by:
+        for remainder in range(PARTITIONS):
+            op.execute(
+                f'CREATE TABLE user_p{remainder:02d} PARTITION OF "user" '
+                f'FOR VALUES WITH (MODULUS {PARTITIONS}, '
+                f'REMAINDER {remainder})'
+            )
+    op.execute('INSERT INTO "user" SELECT * FROM user_old')
+    op.drop_table('user_old')
+
+
+def restore_api_key_fk() -> None:
+    op.create_foreign_key(
+        'api_key_user_id_fkey',
+        'api_key',
+        'user',
+        ['user_id'],
+        ['id'],
+        ondelete='CASCADE'
+    )
+
+
+def check_case_duplicates() -> None:
+    if context.is_offline_mode():
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT lower(email), array_agg(id::text ORDER BY id) '
+        'FROM "user" WHERE deleted_at IS NULL '
+        'GROUP BY lower(email) HAVING count(*) > 1 '
+        'ORDER BY 1 LIMIT 20'
+    )).all()
+    if duplicates:
+        raise RuntimeError(
+            'Live users share an email up to case; resolve these '
+            'before upgrading:\n' + '\n'.join(
+                f'{email}: {", ".join(user_ids)}'
+                for email, user_ids in duplicates
+            )
+        )
+
+
+def upgrade() -> None:
+    check_case_duplicates()
+    replace_user_table('HASH (id)')
+    op.create_table(
+        'user_email',
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.PrimaryKeyConstraint('email')
+    )
+    op.execute(
+        'INSERT INTO user_email (email, user_id) '
+        'SELECT lower(email), id FROM "user" WHERE deleted_at IS NULL'
+    )
+    op.execute(SYNC_USER_EMAIL)
+    op.execute(
+        'CREATE TRIGGER user_email_sync '
+        'AFTER INSERT OR DELETE OR UPDATE OF email, deleted_at '
+        'ON "user" FOR EACH ROW EXECUTE FUNCTION sync_user_email()'
+    )
+    create_user_indexes(unique_email=False)
+    restore_api_key_fk()
+    op.execute('ANALYZE "user"')
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER user_email_sync ON "user"')
+    op.execute('DROP FUNCTION sync_user_email()')
+    op.drop_table('user_email')
+    replace_user_table(None)
+    create_user_indexes(unique_email=True)
+    restore_api_key_fk()
+    op.execute('ANALYZE "user"')
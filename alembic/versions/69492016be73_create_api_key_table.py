@@ -0,0 +1,66 @@
+"""create api key table
+
+Revision ID: 69492016be73
+Revises: 76af8962dc8d
+Create Date: 2026-10-19 16:02:17.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '69492016be73'
+down_revision: Union[str, None] = '76af8962dc8d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'api_key',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('prefix', sa.String(length=12), nullable=False),
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column(
+            'scopes',
+            postgresql.ARRAY(sa.String()),
+            nullable=False
+        ),
+        sa.Column(
+            'created_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False
+        ),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['user_id'],
+            ['user.id'],
+            ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_api_key_prefix'),
+        'api_key',
+        ['prefix'],
+        unique=True
+    )
+    op.create_index(
+        op.f('ix_api_key_user_id'),
+        'api_key',
+        ['user_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_api_key_user_id'), table_name='api_key')
+    op.drop_index(op.f('ix_api_key_prefix'), table_name='api_key')
+    op.drop_table('api_key')
@@ -0,0 +1,54 @@
+"""create audit event table
+
+Revision ID: 76af8962dc8d
+Revises: 8c319e6743d6
+Create Date: 2026-10-19 15:11:52.006195
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '76af8962dc8d'
+down_revision: Union[str, None] = '8c319e6743d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'audit_event',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('occurred_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('action', sa.String(length=64), nullable=False),
+        sa.Column('actor_id', sa.Uuid(), nullable=True),
+        sa.Column('target_id', sa.Uuid(), nullable=True),
+        sa.Column('details', postgresql.JSONB(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_audit_event_target_id_occurred_at',
+        'audit_event',
+        ['target_id', 'occurred_at']
+    )
+    op.create_index(
+        'ix_audit_event_actor_id_occurred_at',
+        'audit_event',
+        ['actor_id', 'occurred_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_audit_event_actor_id_occurred_at',
+        table_name='audit_event'
+    )
+    op.drop_index(
+        'ix_audit_event_target_id_occurred_at',
+        table_name='audit_event'
+    )
+    op.drop_table('audit_event')
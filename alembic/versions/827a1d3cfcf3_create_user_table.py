@@ -0,0 +1,39 @@
+"""create user table
+
+Revision ID: 827a1d3cfcf3
+Revises: 
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '827a1d3cfcf3'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user',
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('is_superuser', sa.Boolean(), nullable=False),
+        sa.Column('full_name', sa.String(length=255), nullable=True),
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_user_email'), 'user', ['email'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_email'), table_name='user')
+    op.drop_table('user')
@@ -0,0 +1,42 @@
+"""add user activity
+
+Revision ID: 8c319e6743d6
+Revises: 0f6b3f433f44
+Create Date: 2026-10-19 14:05:33.481672
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c319e6743d6'
+down_revision: Union[str, None] = '0f6b3f433f44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user',
+        sa.Column(
+            'last_login_at',
+            sa.DateTime(timezone=True),
+            nullable=True
+        )
+    )
+    op.add_column(
+        'user',
+        sa.Column(
+            'last_seen_at',
+            sa.DateTime(timezone=True),
+            nullable=True
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'last_seen_at')
+    op.drop_column('user', 'last_login_at')
@@ -0,0 +1,51 @@
+"""add user soft delete
+
+Revision ID: 8facef9c0614
+Revises: f8bc13be297b
+Create Date: 2026-10-19 10:41:19.902337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8facef9c0614'
+down_revision: Union[str, None] = 'f8bc13be297b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user',
+        sa.Column(
+            'deleted_at',
+            sa.DateTime(timezone=True),
+            nullable=True
+        )
+    )
+    op.drop_index('ix_user_email', table_name='user')
+    op.create_index(
+        'ix_user_email_live',
+        'user',
+        ['email'],
+        unique=True,
+        postgresql_where=sa.text('deleted_at IS NULL')
+    )
+    op.create_index(
+        'ix_user_deleted_at',
+        'user',
+        ['deleted_at'],
+        postgresql_where=sa.text('deleted_at IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_deleted_at', table_name='user')
+    op.drop_index('ix_user_email_live', table_name='user')
+    op.execute('DELETE FROM "user" WHERE deleted_at IS NOT NULL')
+    op.create_index('ix_user_email', 'user', ['email'], unique=True)
+    op.drop_column('user', 'deleted_at')
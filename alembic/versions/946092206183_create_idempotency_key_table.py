@@ -0,0 +1,61 @@
+"""create idempotency key table
+
+Revision ID: 946092206183
+Revises: bf773a8890ab
+Create Date: 2026-10-19 20:12:41.318204
+
+Idempotency keys shared by every worker, so a retry reaching another
+worker finds the first request's claim or stored response.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '946092206183'
+down_revision: Union[str, None] = 'bf773a8890ab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'idempotency_key',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('fingerprint', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=True),
+        sa.Column(
+            'headers',
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=True
+        ),
+        sa.Column('body', sa.LargeBinary(), nullable=True),
+        sa.Column(
+            'locked_until',
+            sa.DateTime(timezone=True),
+            nullable=False
+        ),
+        sa.Column(
+            'expires_at',
+            sa.DateTime(timezone=True),
+            nullable=False
+        ),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(
+        op.f('ix_idempotency_key_expires_at'),
+        'idempotency_key',
+        ['expires_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f('ix_idempotency_key_expires_at'),
+        table_name='idempotency_key'
+    )
+    op.drop_table('idempotency_key')
@@ -0,0 +1,34 @@
+"""add user updated_at
+
+Revision ID: 997bf39c5d01
+Revises: 827a1d3cfcf3
+Create Date: 2026-10-19 09:20:07.640115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '997bf39c5d01'
+down_revision: Union[str, None] = '827a1d3cfcf3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user',
+        sa.Column(
+            'updated_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'updated_at')
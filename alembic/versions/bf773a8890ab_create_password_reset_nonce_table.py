@@ -0,0 +1,54 @@
+"""create password reset nonce table
+
+Revision ID: bf773a8890ab
+Revises: c606e5f7e324
+Create Date: 2026-10-19 18:21:07.664920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bf773a8890ab'
+down_revision: Union[str, None] = 'c606e5f7e324'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'password_reset_nonce',
+        sa.Column('nonce', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column(
+            'expires_at',
+            sa.DateTime(timezone=True),
+            nullable=False
+        ),
+        sa.PrimaryKeyConstraint('nonce')
+    )
+    op.create_index(
+        op.f('ix_password_reset_nonce_user_id'),
+        'password_reset_nonce',
+        ['user_id']
+    )
+    op.create_index(
+        op.f('ix_password_reset_nonce_expires_at'),
+        'password_reset_nonce',
+        ['expires_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f('ix_password_reset_nonce_expires_at'),
+        table_name='password_reset_nonce'
+    )
+    op.drop_index(
+        op.f('ix_password_reset_nonce_user_id'),
+        table_name='password_reset_nonce'
+    )
+    op.drop_table('password_reset_nonce')
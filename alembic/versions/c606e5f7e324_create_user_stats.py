@@ -0,0 +1,120 @@
+"""create user stats
+
+Revision ID: c606e5f7e324
+Revises: 4dfa5fff2879
+Create Date: 2026-10-19 17:34:50.226817
+
+Live user totals, kept per shard by a trigger on "user" so concurrent
+writers rarely update the same counter row. A user always counts
+towards the shard of its id.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c606e5f7e324'
+down_revision: Union[str, None] = '4dfa5fff2879'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SHARDS = 16
+
+USER_STATS_SHARD = f"""
+CREATE FUNCTION user_stats_shard(user_id uuid) RETURNS smallint
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT (hashtext(user_id::text) & {SHARDS - 1})::smallint $$
+"""
+
+COUNT_USER_STATS = """
+CREATE FUNCTION count_user_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    old_live boolean := TG_OP <> 'INSERT' AND OLD.deleted_at IS NULL;
+    new_live boolean := TG_OP <> 'DELETE' AND NEW.deleted_at IS NULL;
+    d_total bigint;
+    d_active bigint;
+    d_superusers bigint;
+BEGIN
+    d_total := new_live::int - old_live::int;
+    d_active := (new_live AND NEW.is_active)::int
+        - (old_live AND OLD.is_active)::int;
+    d_superusers := (new_live AND NEW.is_superuser)::int
+        - (old_live AND OLD.is_superuser)::int;
+    IF d_total <> 0 OR d_active <> 0 OR d_superusers <> 0 THEN
+        UPDATE user_stats
+        SET total = total + d_total,
+            active = active + d_active,
+            superusers = superusers + d_superusers
+        WHERE shard = user_stats_shard(
+            CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END
+        );
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute(USER_STATS_SHARD)
+    op.create_table(
+        'user_stats',
+        sa.Column(
+            'shard',
+            sa.SmallInteger(),
+            autoincrement=False,
+            nullable=False
+        ),
+        sa.Column(
+            'total',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False
+        ),
+        sa.Column(
+            'active',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False
+        ),
+        sa.Column(
+            'superusers',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False
+        ),
+        sa.PrimaryKeyConstraint('shard')
+    )
+    # The trigger goes in first: it locks out writers until this
+    # transaction commits, so the seed counts cannot miss any change.
+    op.execute(COUNT_USER_STATS)
+    op.execute(
+        'CREATE TRIGGER user_stats_count '
+        'AFTER INSERT OR DELETE '
+        'OR UPDATE OF is_active, is_superuser, deleted_at '
+        'ON "user" FOR EACH ROW EXECUTE FUNCTION count_user_stats()'
+    )
+    op.execute(f"""
+        INSERT INTO user_stats (shard, total, active, superusers)
+        SELECT
+            shards.shard,
+            count(u.id),
+            count(u.id) FILTER (WHERE u.is_active),
+            count(u.id) FILTER (WHERE u.is_superuser)
+        FROM generate_series(0, {SHARDS - 1}) AS shards(shard)
+        LEFT JOIN "user" AS u
+            ON user_stats_shard(u.id) = shards.shard
+            AND u.deleted_at IS NULL
+        GROUP BY shards.shard
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER user_stats_count ON "user"')
+    op.execute('DROP FUNCTION count_user_stats()')
+    op.drop_table('user_stats')
+    op.execute('DROP FUNCTION user_stats_shard(uuid)')
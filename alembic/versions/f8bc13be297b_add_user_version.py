@@ -0,0 +1,34 @@
+"""add user version
+
+Revision ID: f8bc13be297b
+Revises: 997bf39c5d01
+Create Date: 2026-10-19 10:02:55.174630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8bc13be297b'
+down_revision: Union[str, None] = '997bf39c5d01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user',
+        sa.Column(
+            'version',
+            sa.Integer(),
+            server_default=sa.text('1'),
+            nullable=False
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'version')
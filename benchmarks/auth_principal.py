@@ -0,0 +1,108 @@
+"""
+Resolve the current user the two ways `get_current_user` can: as a
+full `User` entity or as the column-only `AuthPrincipal`.
+
+Every simulated request opens its own session and holds its result
+until the whole wave completes, as concurrent requests would. The
+timing and memory passes run separately so tracemalloc does not skew
+the timings.
+
+    DATABASE_URL=postgresql+asyncpg://... \\
+        python benchmarks/auth_principal.py --concurrency 500
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from sqlmodel import select  # noqa: E402
+
+from src.database import async_session, engine  # noqa: E402
+from auth import crud  # noqa: E402
+from auth.models import User  # noqa: E402
+
+VARIANTS = {
+    "entity": crud.get_user,
+    "principal": crud.get_auth_principal,
+}
+
+
+async def user_ids(count: int) -> list:
+    async with async_session() as session:
+        result = await session.exec(
+            select(User.id).where(User.deleted_at.is_(None)).limit(count)
+        )
+        ids = list(result.all())
+    if not ids:
+        sys.exit("No live users to load; seed the database first")
+    return [ids[i % len(ids)] for i in range(count)]
+
+
+async def request(load, user_id):
+    async with async_session() as session:
+        loaded = await load(session=session, user_id=user_id)
+        # Stand-in for the rest of the request holding on to it
+        await asyncio.sleep(0)
+        return loaded
+
+
+async def wave(load, ids: list) -> list:
+    return await asyncio.gather(
+        *(request(load, user_id) for user_id in ids)
+    )
+
+
+async def timed(load, ids: list, rounds: int) -> tuple[float, float]:
+    await wave(load, ids)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(rounds):
+        await wave(load, ids)
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+async def memory(load, ids: list) -> tuple[int, int]:
+    """
+    Peak bytes allocated during a wave, and bytes still held by its
+    results once it is done.
+    """
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    results = await wave(load, ids)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return peak - baseline, held - baseline
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    ids = await user_ids(args.concurrency)
+    requests = args.concurrency * args.rounds
+    print(
+        f"{'variant':<10} {'req/s':>10} {'cpu us/req':>11} "
+        f"{'peak KiB/req':>13} {'held B/req':>11}"
+    )
+    for name, load in VARIANTS.items():
+        wall, cpu = await timed(load, ids, args.rounds)
+        peak, held = await memory(load, ids)
+        print(
+            f"{name:<10} {requests / wall:>10.0f} "
+            f"{cpu / requests * 1e6:>11.1f} "
+            f"{peak / args.concurrency / 1024:>13.2f} "
+            f"{held / args.concurrency:>11.0f}"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
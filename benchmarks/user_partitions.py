@@ -0,0 +1,227 @@
+"""
+Compare an unpartitioned users table with the hash-partitioned layout
+and its user_email lookup table, on scratch copies seeded with the
+same rows.
+
+Both tables are timed on:
+- bulk load
+- lookups by id and by email
+- a live-row count
+- VACUUM after churning a tenth of the rows
+- building an index
+
+    DATABASE_URL=postgresql+asyncpg://... \\
+        python benchmarks/user_partitions.py --rows 5000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+COLUMNS = """
+    id uuid NOT NULL,
+    email varchar(255) NOT NULL,
+    full_name varchar(255),
+    is_active boolean NOT NULL,
+    is_superuser boolean NOT NULL,
+    hashed_password varchar NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    deleted_at timestamptz
+"""
+
+SEED = """
+INSERT INTO {table} (
+    id, email, full_name, is_active, is_superuser,
+    hashed_password, updated_at, deleted_at
+)
+SELECT
+    md5('bench' || n)::uuid,
+    'user' || n || '@example.com',
+    'Name ' || substr(md5(n::text), 1, 12),
+    n % 100 <> 0,
+    false,
+    'not-a-hash',
+    now() - make_interval(secs => n),
+    CASE WHEN n % 50 = 0 THEN now() END
+FROM generate_series(1, {rows}) AS n
+"""
+
+SYNC_EMAIL = """
+CREATE FUNCTION bench_sync_email() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.deleted_at IS NULL THEN
+        DELETE FROM bench_user_email
+        WHERE email = lower(OLD.email) AND user_id = OLD.id;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.deleted_at IS NULL THEN
+        INSERT INTO bench_user_email (email, user_id)
+        VALUES (lower(NEW.email), NEW.id);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+LAYOUTS = {
+    "plain": dict(
+        table="bench_user_plain",
+        create=[
+            f"CREATE TABLE bench_user_plain ({COLUMNS}, PRIMARY KEY (id))",
+        ],
+        after_seed=[
+            "CREATE UNIQUE INDEX ON bench_user_plain (email) "
+            "WHERE deleted_at IS NULL",
+        ],
+        by_email=(
+            "SELECT id, is_active, hashed_password FROM bench_user_plain "
+            "WHERE email = $1 AND deleted_at IS NULL"
+        ),
+    ),
+    "hashed": dict(
+        table="bench_user_hashed",
+        create=[
+            f"CREATE TABLE bench_user_hashed ({COLUMNS}, PRIMARY KEY (id)) "
+            "PARTITION BY HASH (id)",
+            "CREATE TABLE bench_user_email ("
+            "email varchar(255) PRIMARY KEY, user_id uuid NOT NULL)",
+            SYNC_EMAIL,
+            "CREATE TRIGGER bench_sync_email AFTER INSERT OR DELETE "
+            "OR UPDATE OF email, deleted_at ON bench_user_hashed "
+            "FOR EACH ROW EXECUTE FUNCTION bench_sync_email()",
+        ],
+        after_seed=[
+            "CREATE INDEX ON bench_user_hashed (email) "
+            "WHERE deleted_at IS NULL",
+        ],
+        by_email=(
+            "SELECT id, is_active, hashed_password FROM bench_user_hashed "
+            "WHERE id = (SELECT user_id FROM bench_user_email "
+            "WHERE email = lower($1)) AND deleted_at IS NULL"
+        ),
+    ),
+}
+
+DROP = [
+    "DROP TABLE IF EXISTS bench_user_plain",
+    "DROP TABLE IF EXISTS bench_user_hashed",
+    "DROP TABLE IF EXISTS bench_user_email",
+    "DROP FUNCTION IF EXISTS bench_sync_email()",
+]
+
+
+async def timed(conn, sql: str, *args) -> float:
+    started = time.perf_counter()
+    await conn.execute(sql, *args)
+    return time.perf_counter() - started
+
+
+async def lookups(conn, sql: str, args: list) -> float:
+    statement = await conn.prepare(sql)
+    for value in args[:50]:
+        await statement.fetchrow(value)
+    started = time.perf_counter()
+    for value in args:
+        await statement.fetchrow(value)
+    return (time.perf_counter() - started) / len(args) * 1e6
+
+
+async def run_layout(
+    conn,
+    name: str,
+    rows: int,
+    partitions: int,
+    samples: list[int]
+) -> dict[str, float]:
+    layout = LAYOUTS[name]
+    table = layout["table"]
+    for sql in layout["create"]:
+        await conn.execute(sql)
+    if name == "hashed":
+        for remainder in range(partitions):
+            await conn.execute(
+                f"CREATE TABLE {table}_p{remainder:02d} "
+                f"PARTITION OF {table} FOR VALUES WITH "
+                f"(MODULUS {partitions}, REMAINDER {remainder})"
+            )
+
+    results = {}
+    results["load s"] = await timed(
+        conn, SEED.format(table=table, rows=rows)
+    )
+    for sql in layout["after_seed"]:
+        await conn.execute(sql)
+    await conn.execute(f"VACUUM ANALYZE {table}")
+
+    ids = [
+        await conn.fetchval("SELECT md5('bench' || $1::text)::uuid", n)
+        for n in samples
+    ]
+    emails = [f"user{n}@example.com" for n in samples]
+    results["by id us"] = await lookups(
+        conn, f"SELECT * FROM {table} WHERE id = $1", ids
+    )
+    results["by email us"] = await lookups(
+        conn, layout["by_email"], emails
+    )
+    results["count s"] = await timed(
+        conn, f"SELECT count(*) FROM {table} WHERE deleted_at IS NULL"
+    )
+    await conn.execute(
+        f"UPDATE {table} SET updated_at = now() "
+        f"WHERE hashtext(id::text) % 10 = 0"
+    )
+    results["vacuum s"] = await timed(conn, f"VACUUM {table}")
+    results["index s"] = await timed(
+        conn, f"CREATE INDEX ON {table} (updated_at, id)"
+    )
+    return results
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument(
+        "--keep", action="store_true",
+        help="leave the scratch tables in place"
+    )
+    args = parser.parse_args()
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    samples = [
+        n for n in random.sample(range(1, args.rows + 1), args.lookups)
+        if n % 50
+    ]
+    async with engine.connect() as connection:
+        raw = await connection.get_raw_connection()
+        conn = raw.driver_connection
+        for sql in DROP:
+            await conn.execute(sql)
+        results = {
+            name: await run_layout(
+                conn, name, args.rows, args.partitions, samples
+            )
+            for name in LAYOUTS
+        }
+        if not args.keep:
+            for sql in DROP:
+                await conn.execute(sql)
+    await engine.dispose()
+
+    print(f"{'':<14}" + "".join(f"{name:>12}" for name in results))
+    for metric in results["plain"]:
+        print(
+            f"{metric:<14}"
+            + "".join(
+                f"{results[name][metric]:>12.3f}" for name in results
+            )
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
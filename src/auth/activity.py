@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, Uuid, column, func, values
+from sqlmodel import update
+
+from src import metrics
+from src.config import settings
+from src.database import async_session
+from auth.models import User, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """
+    Write-behind buffer for last_login_at / last_seen_at.
+
+    Activity is coalesced per user in memory and written periodically
+    with one UPDATE ... FROM (VALUES ...) per batch. At most
+    `max_users` users are buffered; activity beyond that is dropped,
+    since these columns are analytics, not state.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_users: int,
+        batch_size: int
+    ):
+        self.max_users = max_users
+        self.batch_size = batch_size
+        # user id -> [last_login_at, last_seen_at]
+        self._pending: dict[uuid.UUID, list[datetime | None]] = {}
+        # Set once max_users is reached; wakes the flush job early
+        self.full = asyncio.Event()
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failures = 0
+
+    def record_login(self, user_id: uuid.UUID) -> None:
+        now = utcnow()
+        self._record(user_id, now, now)
+
+    def record_seen(self, user_id: uuid.UUID) -> None:
+        self._record(user_id, None, utcnow())
+
+    def _record(
+        self,
+        user_id: uuid.UUID,
+        login: datetime | None,
+        seen: datetime
+    ) -> None:
+        entry = self._pending.get(user_id)
+        if entry is None:
+            if len(self._pending) >= self.max_users:
+                self.dropped += 1
+                self.full.set()
+                return
+            entry = self._pending[user_id] = [None, None]
+        if login is not None:
+            entry[0] = login
+        entry[1] = seen
+        self.recorded += 1
+
+    def flush_statement(self, rows: list[tuple]):
+        activity = values(
+            column("id", Uuid),
+            column("last_login_at", DateTime(timezone=True)),
+            column("last_seen_at", DateTime(timezone=True)),
+            name="activity"
+        ).data(rows)
+        return update(User).where(
+            User.id == activity.c.id
+        ).values(
+            last_login_at=func.greatest(
+                User.last_login_at, activity.c.last_login_at
+            ),
+            last_seen_at=func.greatest(
+                User.last_seen_at, activity.c.last_seen_at
+            ),
+            # Activity is not a change to the resource, keep ETags
+            # and Last-Modified stable.
+            updated_at=User.updated_at
+        ).execution_options(synchronize_session=False)
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        self.full.clear()
+        rows = [
+            (user_id, login, seen)
+            for user_id, (login, seen) in pending.items()
+        ]
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                async with async_session() as session:
+                    await session.execute(self.flush_statement(batch))
+                    await session.commit()
+            except Exception:
+                self.failures += 1
+                logger.exception(
+                    "Dropping activity for %d users", len(batch)
+                )
+                continue
+            self.flushed += len(batch)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failures": self.failures,
+        }
+
+
+activity_buffer = ActivityBuffer(
+    max_users=settings.ACTIVITY_BUFFER_MAX_USERS,
+    batch_size=settings.ACTIVITY_FLUSH_BATCH_SIZE
+)
+metrics.register("activity_buffer", activity_buffer.stats)
@@ -0,0 +1,167 @@
+import hashlib
+import hmac
+import secrets
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlmodel import select
+
+from src import metrics
+from src.cache import TTLCache
+from src.config import settings
+from src.database import async_session
+from src.invalidation import invalidation_bus
+from src.singleflight import SingleFlight
+from auth.models import ApiKey, User, utcnow
+
+KEY_TYPE = "uak"
+PREFIX_BYTES = 6
+
+
+@dataclass(frozen=True, slots=True)
+class ApiKeyPrincipal:
+    key_id: uuid.UUID
+    user_id: uuid.UUID
+    prefix: str
+    scopes: frozenset[str]
+    expires_at: datetime | None
+
+
+@dataclass(frozen=True, slots=True)
+class _Entry:
+    digest: str | None
+    principal: ApiKeyPrincipal | None
+
+
+def generate_api_key() -> tuple[str, str]:
+    """
+    Return a new `(prefix, api_key)`; the key is shown to its owner
+    once and only its digest is stored.
+    """
+    prefix = secrets.token_hex(PREFIX_BYTES)
+    return prefix, f"{KEY_TYPE}_{prefix}_{secrets.token_urlsafe(32)}"
+
+
+def api_key_digest(api_key: str) -> str:
+    # Keys carry 256 random bits, so a keyed digest is as good as a
+    # slow hash here and costs microseconds instead of a bcrypt round.
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        f"api-key:{api_key}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def api_key_prefix(api_key: str) -> str | None:
+    parts = api_key.split("_", 2)
+    if len(parts) != 3 or parts[0] != KEY_TYPE:
+        return None
+    prefix = parts[1]
+    if len(prefix) != PREFIX_BYTES * 2:
+        return None
+    try:
+        bytes.fromhex(prefix)
+    except ValueError:
+        return None
+    return prefix
+
+
+# Resolved keys by prefix, including unknown prefixes for a short
+# while, so repeated calls never reach the database.
+api_key_cache = TTLCache(
+    maxsize=settings.API_KEY_CACHE_SIZE,
+    ttl=settings.API_KEY_CACHE_TTL
+)
+metrics.register("api_key_cache", api_key_cache.stats)
+
+api_key_lookups = SingleFlight()
+
+
+def on_users_changed(user_ids: set[str]) -> None:
+    # A deactivated or deleted owner takes its keys down with it
+    api_key_cache.prune(
+        lambda entry: entry.principal is not None
+        and str(entry.principal.user_id) in user_ids
+    )
+
+
+def on_api_keys_changed(prefixes: set[str]) -> None:
+    for prefix in prefixes:
+        api_key_cache.pop(prefix)
+
+
+invalidation_bus.subscribe(
+    "user",
+    on_users_changed,
+    flush=api_key_cache.clear
+)
+invalidation_bus.subscribe(
+    "api_key",
+    on_api_keys_changed,
+    flush=api_key_cache.clear
+)
+
+
+async def load_entry(prefix: str) -> _Entry:
+    statement = select(
+        ApiKey.id,
+        ApiKey.user_id,
+        ApiKey.digest,
+        ApiKey.scopes,
+        ApiKey.expires_at
+    ).join(
+        User, User.id == ApiKey.user_id
+    ).where(
+        ApiKey.prefix == prefix,
+        ApiKey.revoked_at.is_(None),
+        User.is_active,
+        User.deleted_at.is_(None)
+    )
+    async with async_session() as session:
+        result = await session.exec(statement)
+        row = result.first()
+    if row is None:
+        return _Entry(digest=None, principal=None)
+    return _Entry(
+        digest=row.digest,
+        principal=ApiKeyPrincipal(
+            key_id=row.id,
+            user_id=row.user_id,
+            prefix=prefix,
+            scopes=frozenset(row.scopes),
+            expires_at=row.expires_at
+        )
+    )
+
+
+async def resolve_api_key(api_key: str) -> ApiKeyPrincipal | None:
+    """
+    Return the principal behind a live, unexpired `api_key`, or None.
+    """
+    prefix = api_key_prefix(api_key)
+    if prefix is None:
+        return None
+    entry = api_key_cache.get(prefix)
+    if entry is None:
+        entry = await api_key_lookups.do(
+            prefix, lambda: load_entry(prefix)
+        )
+        if entry.principal is None:
+            ttl = settings.API_KEY_NEGATIVE_CACHE_TTL
+        elif entry.principal.expires_at is not None:
+            ttl = min(
+                settings.API_KEY_CACHE_TTL,
+                (entry.principal.expires_at - utcnow()).total_seconds()
+            )
+        else:
+            ttl = None
+        api_key_cache.set(prefix, entry, ttl=ttl)
+    if entry.principal is None:
+        return None
+    if not hmac.compare_digest(entry.digest, api_key_digest(api_key)):
+        return None
+    expires_at = entry.principal.expires_at
+    if expires_at is not None and expires_at <= utcnow():
+        return None
+    return entry.principal
@@ -0,0 +1,338 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src import metrics
+from src.config import settings
+from src.database import async_session, session_teardown_hooks
+from auth.models import AuditEvent, utcnow
+
+logger = logging.getLogger(__name__)
+
+STAGED = "audit_staged"
+COMMITTED = "audit_committed"
+
+
+def load_spooled(line: str) -> dict[str, Any]:
+    audit_event = json.loads(line)
+    audit_event["occurred_at"] = datetime.fromisoformat(
+        audit_event["occurred_at"]
+    )
+    for key in ("event_id", "actor_id", "target_id"):
+        if audit_event[key] is not None:
+            audit_event[key] = uuid.UUID(audit_event[key])
+    return audit_event
+
+
+class Spool:
+    """
+    Write-ahead files of committed audit events, one set per worker.
+
+    Events are appended as soon as their transaction commits, before
+    they are queued, so a worker that crashes or is killed leaves
+    them on disk. Each worker holds an flock on the files it is still
+    writing to; any file that is not locked belongs to a dead worker
+    and is replayed by whichever worker gets to it first. A segment is
+    deleted once every event in it has been written to the database.
+    Lines are flushed to the OS on every commit, which is enough to
+    survive the process dying; they are only fsynced when a segment
+    is closed.
+    """
+
+    def __init__(self, directory: Path, segment_size: int):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._file = None
+        self._segment: Path | None = None
+        self._segment_events = 0
+        # Open, locked files of this worker with events not yet written
+        self._outstanding: dict[Path, list] = {}
+
+    def _open_segment(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{os.getpid()}-{uuid.uuid4().hex}"
+        # Locked before it gets a name recovery looks at, so no other
+        # worker can mistake it for an abandoned file.
+        partial = self.directory / f"{name}.tmp"
+        spool = open(partial, "a")
+        fcntl.flock(spool, fcntl.LOCK_EX)
+        segment = partial.rename(self.directory / f"{name}.jsonl")
+        self._file, self._segment = spool, segment
+        self._segment_events = 0
+        self._outstanding[segment] = [spool, 0]
+
+    def _close_segment(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        segment = self._segment
+        self._file = self._segment = None
+        self._release(segment, 0)
+
+    def append(self, events: list[dict[str, Any]]) -> Path:
+        if self._file is None:
+            self._open_segment()
+        for audit_event in events:
+            self._file.write(json.dumps(audit_event, default=str) + "\n")
+        self._file.flush()
+        segment = self._segment
+        self._outstanding[segment][1] += len(events)
+        self._segment_events += len(events)
+        if self._segment_events >= self.segment_size:
+            self._close_segment()
+        return segment
+
+    def written(self, segment: Path, count: int) -> None:
+        self._release(segment, count)
+
+    def _release(self, segment: Path, count: int) -> None:
+        entry = self._outstanding[segment]
+        entry[1] -= count
+        if entry[1] == 0 and segment != self._segment:
+            del self._outstanding[segment]
+            segment.unlink(missing_ok=True)
+            entry[0].close()
+
+    def close(self) -> None:
+        """
+        Stop writing. Files with unwritten events are left behind,
+        unlocked, for the next worker to replay.
+        """
+        if self._file is not None:
+            self._close_segment()
+        for spool, _ in self._outstanding.values():
+            spool.close()
+        self._outstanding.clear()
+
+    def abandoned(self):
+        """
+        Yield the path and events of each file no live worker holds,
+        keeping it locked while the caller replays it. The file is
+        deleted if the caller finishes without raising.
+        """
+        if not self.directory.exists():
+            return
+        for path in sorted(self.directory.glob("*.jsonl")):
+            if path in self._outstanding:
+                continue
+            try:
+                spool = open(path)
+            except FileNotFoundError:
+                continue
+            with spool:
+                try:
+                    fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if not path.exists():
+                    # Replayed by another worker while we waited
+                    continue
+                events = [
+                    load_spooled(line)
+                    for line in spool.read().splitlines()
+                    if line.strip()
+                ]
+                yield path, events
+                path.unlink(missing_ok=True)
+
+
+class AuditLog:
+    """
+    Batched, asynchronous audit trail of user mutations.
+
+    Events are captured on the session of the mutating request and
+    only released once that transaction commits. They are then
+    appended to the worker's spool and go through a bounded queue to
+    a single writer that inserts them in multi-row batches; a full
+    queue makes requests wait (backpressure) rather than dropping
+    events. Spooled events a worker never wrote, because it crashed
+    or the database was down at shutdown, are replayed from disk by
+    another worker. Every event has an id, so replaying one that did
+    reach the database is harmless.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        spool: Spool
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool = spool
+        self._queue: asyncio.Queue[
+            tuple[Path, dict[str, Any]]
+        ] = asyncio.Queue(maxsize=queue_size)
+        self._batch: list[tuple[Path, dict[str, Any]]] = []
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.recovered = 0
+        self.failures = 0
+
+    def capture(
+        self,
+        session,
+        action: str,
+        *,
+        actor_id: uuid.UUID | None = None,
+        target_id: uuid.UUID | None = None,
+        **details: Any
+    ) -> None:
+        session.info.setdefault(STAGED, []).append({
+            "event_id": uuid.uuid4(),
+            "occurred_at": utcnow(),
+            "action": action,
+            "actor_id": actor_id,
+            "target_id": target_id,
+            "details": details,
+        })
+
+    def _after_commit(self, session: Session) -> None:
+        staged = session.info.pop(STAGED, None)
+        if staged:
+            segment = self.spool.append(staged)
+            session.info.setdefault(COMMITTED, []).extend(
+                (segment, audit_event) for audit_event in staged
+            )
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop(STAGED, None)
+
+    async def dispatch(self, session) -> None:
+        for item in session.info.pop(COMMITTED, ()):
+            await self._queue.put(item)
+
+    async def _write(self, batch: list[dict[str, Any]]) -> None:
+        statement = insert(AuditEvent).on_conflict_do_nothing(
+            index_elements=["event_id"]
+        )
+        async with async_session() as session:
+            await session.execute(statement, batch)
+            await session.commit()
+
+    async def _write_spooled(
+        self,
+        batch: list[tuple[Path, dict[str, Any]]]
+    ) -> None:
+        await self._write([audit_event for _, audit_event in batch])
+        self.written += len(batch)
+        for segment, count in Counter(
+            segment for segment, _ in batch
+        ).items():
+            self.spool.written(segment, count)
+
+    async def _fill_batch(self) -> None:
+        if not self._batch:
+            self._batch.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(
+                    await asyncio.wait_for(self._queue.get(), timeout)
+                )
+            except asyncio.TimeoutError:
+                break
+
+    async def run_forever(self) -> None:
+        backoff = 1.0
+        while True:
+            await self._fill_batch()
+            try:
+                await self._write_spooled(self._batch)
+            except Exception:
+                # Keep the batch; the queue fills up behind it and
+                # pushes back on writers until the DB recovers.
+                self.failures += 1
+                logger.exception(
+                    "Writing %d audit events failed", len(self._batch)
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            self._batch = []
+            backoff = 1.0
+
+    def _drain(self) -> list[tuple[Path, dict[str, Any]]]:
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        return pending
+
+    async def recover(self) -> int:
+        """
+        Replay the spool files of workers that are gone.
+        """
+        recovered = 0
+        for path, events in self.spool.abandoned():
+            for start in range(0, len(events), self.batch_size):
+                await self._write(events[start:start + self.batch_size])
+            recovered += len(events)
+            logger.info(
+                "Recovered %d spooled audit events from %s",
+                len(events), path.name
+            )
+        self.recovered += recovered
+        return recovered
+
+    async def start(self) -> None:
+        try:
+            await self.recover()
+        except Exception:
+            logger.exception("Could not replay the audit spool")
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        pending = self._drain()
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                await self._write_spooled(
+                    pending[start:start + self.batch_size]
+                )
+        except Exception:
+            logger.exception(
+                "Leaving unwritten audit events in the spool"
+            )
+        self.spool.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "recovered": self.recovered,
+            "failures": self.failures,
+        }
+
+
+audit_log = AuditLog(
+    queue_size=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    spool=Spool(
+        Path(settings.AUDIT_SPOOL_DIR),
+        segment_size=settings.AUDIT_SPOOL_SEGMENT_SIZE
+    )
+)
+event.listen(Session, "after_commit", audit_log._after_commit)
+event.listen(Session, "after_rollback", audit_log._after_rollback)
+session_teardown_hooks.append(audit_log.dispatch)
+metrics.register("audit_log", audit_log.stats)
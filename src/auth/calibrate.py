@@ -0,0 +1,121 @@
+"""
+Measure password hashing cost on this host and recommend settings.
+
+    python -m src.auth.calibrate --target-ms 250
+"""
+import argparse
+import itertools
+import statistics
+import time
+from typing import Any
+
+from passlib.hash import argon2, bcrypt
+
+PASSWORD = "correct horse battery staple"
+
+
+def measure(handler, samples: int) -> float:
+    handler.hash(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash(PASSWORD)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def bcrypt_candidates() -> list[dict[str, Any]]:
+    return [{"rounds": rounds} for rounds in range(10, 16)]
+
+
+def argon2_candidates() -> list[dict[str, Any]]:
+    return [
+        {
+            "time_cost": time_cost,
+            "memory_cost": memory_cost,
+            "parallelism": parallelism,
+        }
+        for time_cost, memory_cost, parallelism in itertools.product(
+            (1, 2, 3, 4, 6),
+            (19456, 32768, 65536, 131072),
+            (1, 2, 4),
+        )
+    ]
+
+
+def strength(scheme: str, params: dict[str, Any]) -> tuple:
+    if scheme == "bcrypt":
+        return (params["rounds"],)
+    # Memory hardness first, then passes over it
+    return (params["memory_cost"], params["time_cost"])
+
+
+def calibrate(
+    scheme: str,
+    target_ms: float,
+    samples: int
+) -> list[tuple[dict[str, Any], float]]:
+    handler = bcrypt if scheme == "bcrypt" else argon2
+    candidates = (
+        bcrypt_candidates() if scheme == "bcrypt"
+        else argon2_candidates()
+    )
+    results = []
+    for params in sorted(candidates, key=lambda p: strength(scheme, p)):
+        elapsed = measure(handler.using(**params), samples)
+        results.append((params, elapsed))
+        print(f"{scheme} {params}: {elapsed:.1f} ms")
+        # Costs only grow from here along this axis
+        if scheme == "bcrypt" and elapsed > target_ms * 2:
+            break
+    return results
+
+
+def recommend(
+    scheme: str,
+    results: list[tuple[dict[str, Any], float]],
+    target_ms: float
+) -> dict[str, Any] | None:
+    within = [
+        (params, elapsed) for params, elapsed in results
+        if elapsed <= target_ms
+    ]
+    if not within:
+        return None
+    return max(
+        within,
+        key=lambda item: (strength(scheme, item[0]), -item[1])
+    )[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--target-ms", type=float, default=250,
+        help="hash time budget per login"
+    )
+    parser.add_argument(
+        "--scheme", choices=("bcrypt", "argon2"), default="argon2"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=5,
+        help="hashes timed per parameter set"
+    )
+    args = parser.parse_args()
+
+    results = calibrate(args.scheme, args.target_ms, args.samples)
+    params = recommend(args.scheme, results, args.target_ms)
+    if params is None:
+        print(f"\nNo {args.scheme} setting fits {args.target_ms} ms")
+        return
+
+    print("\nRecommended settings:")
+    print(f'PASSWORD_SCHEMES=["{args.scheme}", "bcrypt"]'
+          if args.scheme == "argon2"
+          else 'PASSWORD_SCHEMES=["bcrypt"]')
+    for key, value in params.items():
+        print(f"{args.scheme.upper()}_{key.upper()}={value}")
+
+
+if __name__ == "__main__":
+    main()
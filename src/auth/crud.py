@@ -1,26 +1,197 @@
+import secrets
 import uuid
-from typing import Any
+from datetime import datetime
+from typing import Any, Sequence
 
-from sqlmodel import select
+from sqlalchemy import Uuid, any_, func, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlmodel import delete, select, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from auth.utils import generate_password_hash, verify_password
-from auth.models import User, UserCreate, UserUpdate
+from src import invalidation
+from src.exceptions import UserVersionConflict
+from auth.audit import audit_log
+from auth.utils import generate_password_hash
+from auth.api_keys import api_key_digest, generate_api_key
+from auth.principal import AuthPrincipal
+from auth.models import (
+    ApiKey,
+    ApiKeyCreate,
+    PasswordResetNonce,
+    User,
+    UserCreate,
+    UserEmail,
+    UserStats,
+    UserStatsPublic,
+    UserUpdate,
+    UserUpdateMe,
+    utcnow
+)
+
+
+async def get_user(
+    *, session: AsyncSession,
+    user_id: uuid.UUID
+) -> User | None:
+    user = await session.get(User, user_id)
+    if user is None or user.deleted_at is not None:
+        return None
+    return user
+
+
+def email_owner(email: str):
+    """
+    Id of the live user owning `email`, as a scalar subquery. Comparing
+    the partition key against it lets Postgres prune the user lookup
+    to a single partition at execution time.
+    """
+    return select(UserEmail.user_id).where(
+        UserEmail.email == func.lower(email)
+    ).scalar_subquery()
+
+
+def user_by_email_statement(email: str):
+    return select(User).where(
+        User.id == email_owner(email),
+        User.deleted_at.is_(None)
+    )
+
+
+def principal_statement():
+    return select(
+        User.id,
+        User.is_active,
+        User.is_superuser,
+        User.hashed_password
+    ).where(User.deleted_at.is_(None))
+
+
+async def get_auth_principal(
+    *, session: AsyncSession,
+    user_id: uuid.UUID
+) -> AuthPrincipal | None:
+    result = await session.exec(
+        principal_statement().where(User.id == user_id)
+    )
+    row = result.first()
+    return AuthPrincipal(*row) if row else None
+
+
+async def get_auth_principal_by_email(
+    *, session: AsyncSession,
+    email: str
+) -> AuthPrincipal | None:
+    result = await session.exec(
+        principal_statement().where(User.id == email_owner(email))
+    )
+    row = result.first()
+    return AuthPrincipal(*row) if row else None
+
+
+async def update_password_hash(
+    *, session: AsyncSession,
+    user_id: uuid.UUID,
+    verified_hash: str,
+    hashed_password: str
+) -> None:
+    """
+    Swap in an upgraded hash of the same password. Nothing a client
+    can see changes, so neither version nor updated_at moves. Only
+    replaces `verified_hash`: if the password changed since it was
+    verified, the stale rehash matches nothing.
+    """
+    await session.execute(
+        update(User)
+        .where(
+            User.id == user_id,
+            User.hashed_password == verified_hash
+        )
+        .values(
+            hashed_password=hashed_password,
+            updated_at=User.updated_at
+        )
+    )
+    await session.commit()
+
+
+async def get_user_stats(
+    *, session: AsyncSession
+) -> UserStatsPublic:
+    statement = select(
+        func.coalesce(func.sum(UserStats.total), 0),
+        func.coalesce(func.sum(UserStats.active), 0),
+        func.coalesce(func.sum(UserStats.superusers), 0)
+    )
+    total, active, superusers = (await session.exec(statement)).one()
+    return UserStatsPublic(
+        total=total,
+        active=active,
+        superusers=superusers
+    )
+
+
+async def get_users_by_ids(
+    *, session: AsyncSession,
+    user_ids: Sequence[uuid.UUID]
+) -> list[User]:
+    # One array parameter, so the statement text is the same for any
+    # number of ids.
+    statement = select(User).where(
+        User.id == any_(literal(list(user_ids), ARRAY(Uuid))),
+        User.deleted_at.is_(None)
+    )
+    result = await session.exec(statement)
+    return list(result.all())
+
+
+async def get_user_fields(
+    *, session: AsyncSession,
+    user_id: uuid.UUID,
+    columns: list[Any]
+) -> Any:
+    """
+    Load only the given columns of a live user, plus the ones its
+    validators are derived from.
+    """
+    statement = select(
+        *columns, User.version, User.updated_at
+    ).where(
+        User.id == user_id,
+        User.deleted_at.is_(None)
+    )
+    result = await session.exec(statement)
+    return result.first()
+
+
+async def get_user_by_email(
+    *, session: AsyncSession,
+    email: str
+) -> User | None:
+    result = await session.exec(user_by_email_statement(email))
+    return result.first()
 
 
 async def create_user(
     *, session: AsyncSession,
-    user_create: UserCreate
+    user_create: UserCreate,
+    actor_id: uuid.UUID | None = None
 ) -> User:
     db_obj = User.model_validate(
         user_create,
         update={
-            "hashed_password": generate_password_hash(
+            "hashed_password": await generate_password_hash(
                 user_create.password
             )
         }
     )
     session.add(db_obj)
+    audit_log.capture(
+        session,
+        "user.create",
+        actor_id=actor_id,
+        target_id=db_obj.id,
+        is_superuser=db_obj.is_superuser
+    )
     await session.commit()
     await session.refresh(db_obj)
     return db_obj
@@ -28,22 +199,203 @@ async def create_user(
 
 async def update_user(
     *, session: AsyncSession,
-    db_user: User,
-    user_in: UserUpdate
-) -> Any:
+    user_id: uuid.UUID,
+    user_in: UserUpdate | UserUpdateMe,
+    expected_version: int | None = None,
+    actor_id: uuid.UUID | None = None
+) -> User | None:
+    """
+    Apply the update as a single UPDATE ... RETURNING. With an
+    expected_version the statement only matches that version, so a
+    concurrent edit makes it miss instead of being overwritten.
+    """
     user_data = user_in.model_dump(exclude_unset=True)
-    extra_data = {}
+    changed = sorted(user_data)
     if "password" in user_data:
-        password = user_data["password"]
-        hashed_password = generate_password_hash(
-            password
+        user_data["hashed_password"] = await generate_password_hash(
+            user_data.pop("password")
         )
-        extra_data["hashed_password"] = hashed_password
-    db_user.sqlmodel_update(
-        user_data,
-        update=extra_data
+    statement = (
+        update(User)
+        .where(
+            User.id == user_id,
+            User.deleted_at.is_(None)
+        )
+        .values(**user_data, version=User.version + 1)
+        .returning(User)
+        .execution_options(populate_existing=True)
+    )
+    if expected_version is not None:
+        statement = statement.where(
+            User.version == expected_version
+        )
+    result = await session.execute(statement)
+    db_user = result.scalars().first()
+    if db_user is None:
+        await session.rollback()
+        if (
+            expected_version is not None
+            and await get_user(session=session, user_id=user_id)
+        ):
+            raise UserVersionConflict()
+        return None
+    invalidation.publish(session, "user", user_id)
+    audit_log.capture(
+        session,
+        "user.update",
+        actor_id=actor_id,
+        target_id=user_id,
+        fields=changed
     )
-    session.add(db_user)
     await session.commit()
-    await session.refresh(db_user)
     return db_user
+
+
+async def delete_user(
+    *, session: AsyncSession,
+    db_user: User,
+    actor_id: uuid.UUID | None = None
+) -> None:
+    """
+    Soft-delete the user; the row is hard-deleted later by the purger.
+    """
+    db_user.deleted_at = utcnow()
+    session.add(db_user)
+    invalidation.publish(session, "user", db_user.id)
+    audit_log.capture(
+        session,
+        "user.delete",
+        actor_id=actor_id,
+        target_id=db_user.id
+    )
+    await session.commit()
+
+
+async def create_api_key(
+    *, session: AsyncSession,
+    key_in: ApiKeyCreate,
+    user_id: uuid.UUID,
+    actor_id: uuid.UUID | None = None
+) -> tuple[ApiKey, str]:
+    """
+    Store a new key for `user_id`; the plain key is returned once
+    and never persisted.
+    """
+    prefix, api_key = generate_api_key()
+    db_obj = ApiKey(
+        user_id=user_id,
+        name=key_in.name,
+        prefix=prefix,
+        digest=api_key_digest(api_key),
+        scopes=sorted(set(key_in.scopes)),
+        expires_at=key_in.expires_at
+    )
+    session.add(db_obj)
+    audit_log.capture(
+        session,
+        "api_key.create",
+        actor_id=actor_id,
+        target_id=user_id,
+        prefix=prefix,
+        scopes=db_obj.scopes
+    )
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj, api_key
+
+
+async def get_api_keys(
+    *, session: AsyncSession,
+    user_id: uuid.UUID | None = None
+) -> list[ApiKey]:
+    statement = select(ApiKey).order_by(ApiKey.created_at)
+    if user_id is not None:
+        statement = statement.where(ApiKey.user_id == user_id)
+    result = await session.exec(statement)
+    return list(result.all())
+
+
+async def revoke_api_key(
+    *, session: AsyncSession,
+    key_id: uuid.UUID,
+    actor_id: uuid.UUID | None = None
+) -> ApiKey | None:
+    db_key = await session.get(ApiKey, key_id)
+    if db_key is None:
+        return None
+    if db_key.revoked_at is not None:
+        return db_key
+    db_key.revoked_at = utcnow()
+    session.add(db_key)
+    invalidation.publish(session, "api_key", db_key.prefix)
+    audit_log.capture(
+        session,
+        "api_key.revoke",
+        actor_id=actor_id,
+        target_id=db_key.user_id,
+        prefix=db_key.prefix
+    )
+    await session.commit()
+    await session.refresh(db_key)
+    return db_key
+
+
+async def create_password_reset_nonce(
+    *, session: AsyncSession,
+    user_id: uuid.UUID,
+    expires_at: datetime
+) -> str:
+    nonce = secrets.token_urlsafe(24)
+    session.add(
+        PasswordResetNonce(
+            nonce=nonce,
+            user_id=user_id,
+            expires_at=expires_at
+        )
+    )
+    await session.commit()
+    return nonce
+
+
+async def consume_password_reset_nonce(
+    *, session: AsyncSession,
+    nonce: str
+) -> uuid.UUID | None:
+    """
+    Atomically use up `nonce`, returning its user id, or None when it
+    is unknown, expired or already used. A concurrent request for the
+    same nonce waits on the row lock and then finds it gone. The
+    deletion commits with the caller's transaction.
+    """
+    result = await session.execute(
+        delete(PasswordResetNonce)
+        .where(
+            PasswordResetNonce.nonce == nonce,
+            PasswordResetNonce.expires_at > utcnow()
+        )
+        .returning(PasswordResetNonce.user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def revoke_password_reset_nonces(
+    *, session: AsyncSession,
+    user_id: uuid.UUID
+) -> None:
+    await session.execute(
+        delete(PasswordResetNonce).where(
+            PasswordResetNonce.user_id == user_id
+        )
+    )
+
+
+async def prune_password_reset_nonces(
+    *, session: AsyncSession
+) -> int:
+    result = await session.execute(
+        delete(PasswordResetNonce).where(
+            PasswordResetNonce.expires_at <= utcnow()
+        )
+    )
+    await session.commit()
+    return result.rowcount
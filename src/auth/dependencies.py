@@ -1,20 +1,36 @@
+import uuid
 from typing import Annotated
 
 import jwt
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.config import settings
 from src.database import get_session
+from auth.activity import activity_buffer
+from auth.api_keys import ApiKeyPrincipal, resolve_api_key
+from auth.loaders import DataLoader
 from auth.models import TokenPayload, User
-from auth import utils
+from auth.principal import AuthPrincipal
+from auth.service import UserService
+from auth import crud, utils
+
+user_service = UserService()
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"/login/access-token"
 )
+optional_oauth2 = OAuth2PasswordBearer(
+    tokenUrl=f"/login/access-token",
+    auto_error=False
+)
+api_key_header = APIKeyHeader(
+    name="X-API-Key",
+    auto_error=False
+)
 
 SessionDep = Annotated[
     AsyncSession,
@@ -24,24 +40,59 @@ TokenDep = Annotated[
     str,
     Depends(reusable_oauth2)
 ]
+OptionalTokenDep = Annotated[
+    str | None,
+    Depends(optional_oauth2)
+]
+ApiKeyDep = Annotated[
+    str | None,
+    Depends(api_key_header)
+]
+
+
+def create_user_loader(
+    session: AsyncSession
+) -> DataLoader[uuid.UUID, User]:
+    async def load_users(user_ids: list[uuid.UUID]):
+        users = await crud.get_users_by_ids(
+            session=session,
+            user_ids=user_ids
+        )
+        return {user.id: user for user in users}
+
+    return DataLoader(
+        load_users,
+        max_batch_size=settings.USER_BATCH_MAX_IDS
+    )
+
+
+async def get_user_loader(
+    session: SessionDep
+) -> DataLoader[uuid.UUID, User]:
+    return create_user_loader(session)
+
+
+UserLoaderDep = Annotated[
+    DataLoader[uuid.UUID, User],
+    Depends(get_user_loader)
+]
 
 
 async def get_current_user(
-    session: SessionDep,
     token: TokenDep
-) -> User:
+) -> AuthPrincipal:
+    payload = utils.decode_token(token)
     try:
-        payload = utils.decode_token(token)
+        if payload is None:
+            raise InvalidTokenError()
         token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
+        user_id = uuid.UUID(token_data.sub)
+    except (InvalidTokenError, ValidationError, TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = await session.get(
-        User,
-        token_data.sub
-    )
+    user = await user_service.get_principal(user_id)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -52,21 +103,118 @@ async def get_current_user(
             status_code=400,
             detail="Inactive user"
         )
+    activity_buffer.record_seen(user.id)
     return user
 
 
 CurrentUser = Annotated[
-    User,
+    AuthPrincipal,
     Depends(get_current_user)
 ]
 
 
-async def get_current_active_superuser(
+async def get_current_user_entity(
+    session: SessionDep,
     current_user: CurrentUser
 ) -> User:
+    """
+    The full `User` behind the current principal, for handlers that
+    read or change more than the principal carries.
+    """
+    user = await user_service.get_user(
+        user_id=current_user.id,
+        session=session
+    )
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="User not found"
+        )
+    return user
+
+
+CurrentUserEntity = Annotated[
+    User,
+    Depends(get_current_user_entity)
+]
+
+
+async def get_current_active_superuser(
+    current_user: CurrentUser
+) -> AuthPrincipal:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+async def get_api_key_principal(
+    api_key: ApiKeyDep
+) -> ApiKeyPrincipal:
+    if api_key is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    principal = await resolve_api_key(api_key)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return principal
+
+
+ApiKeyPrincipalDep = Annotated[
+    ApiKeyPrincipal,
+    Depends(get_api_key_principal)
+]
+
+
+def ensure_scopes(
+    principal: ApiKeyPrincipal,
+    scopes: set[str]
+) -> ApiKeyPrincipal:
+    if not scopes <= principal.scopes:
+        raise HTTPException(
+            status_code=403,
+            detail="The API key doesn't have the required scopes"
+        )
+    return principal
+
+
+def require_scopes(*scopes: str):
+    async def check_scopes(
+        principal: ApiKeyPrincipalDep
+    ) -> ApiKeyPrincipal:
+        return ensure_scopes(principal, set(scopes))
+
+    return check_scopes
+
+
+async def get_user_reader(
+    api_key: ApiKeyDep,
+    token: OptionalTokenDep
+) -> AuthPrincipal | ApiKeyPrincipal:
+    """
+    Accept either a `users:read` API key, for service callers, or a
+    user's bearer token.
+    """
+    if api_key is not None:
+        principal = await get_api_key_principal(api_key)
+        return ensure_scopes(principal, {"users:read"})
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_user(token)
+
+
+UserReader = Annotated[
+    AuthPrincipal | ApiKeyPrincipal,
+    Depends(get_user_reader)
+]
@@ -0,0 +1,117 @@
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+from src import metrics
+from src.cache import TTLCache
+from src.config import settings
+from src.exceptions import UserVersionConflict
+from src.invalidation import invalidation_bus
+from auth.models import User
+
+Validators = tuple[str, datetime]
+
+# Last known validators per user id, so a superuser polling another
+# user's resource can be answered with 304 before touching the DB.
+user_validators = TTLCache(
+    maxsize=settings.USER_VALIDATOR_CACHE_SIZE,
+    ttl=settings.USER_VALIDATOR_CACHE_TTL
+)
+metrics.register("user_validators", user_validators.stats)
+
+
+def on_users_changed(user_ids: set[str]) -> None:
+    for user_id in user_ids:
+        user_validators.pop(uuid.UUID(user_id))
+
+
+invalidation_bus.subscribe(
+    "user",
+    on_users_changed,
+    flush=user_validators.clear
+)
+
+
+def user_etag(user: User, variant: str | None = None) -> str:
+    if variant is None:
+        return f'"{user.id.hex}-{user.version}"'
+    return f'"{user.id.hex}-{user.version}-{variant}"'
+
+
+def remember(user: User) -> Validators:
+    validators = (user_etag(user), user.updated_at)
+    user_validators.set(user.id, validators)
+    return validators
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(
+        value.astimezone(timezone.utc).replace(microsecond=0),
+        usegmt=True
+    )
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    candidates = (
+        candidate.strip().removeprefix("W/")
+        for candidate in header.split(",")
+    )
+    return etag in candidates
+
+
+def expected_version(request: Request, user_id) -> int | None:
+    """
+    Version the client's If-Match header pins an update to, or None
+    when the update is unconditional.
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    prefix = f'"{user_id.hex}-'
+    for candidate in if_match.split(","):
+        # Compressed responses carry the weak form of the ETag
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate.startswith(prefix) and candidate.endswith('"'):
+            version = candidate[len(prefix):-1]
+            if version.isdigit():
+                return int(version)
+    raise UserVersionConflict()
+
+
+def is_not_modified(
+    request: Request,
+    etag: str,
+    last_modified: datetime
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def set_validators(
+    response: Response,
+    etag: str,
+    last_modified: datetime
+) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def not_modified(etag: str, last_modified: datetime) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
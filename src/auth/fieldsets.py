@@ -0,0 +1,100 @@
+import hashlib
+from functools import lru_cache
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Response
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+
+from auth.models import User, UserPublic
+
+FieldSet = tuple[str, ...]
+
+PUBLIC_FIELDS: FieldSet = tuple(UserPublic.model_fields)
+
+
+def parse_fields(fields: str | None) -> FieldSet | None:
+    """
+    Turn a `fields=email,full_name` parameter into a canonical field
+    set, so equal requests share one cached serializer. The id is
+    always included.
+    """
+    if fields is None:
+        return None
+    requested = {
+        name.strip() for name in fields.split(",")
+        if name.strip()
+    }
+    unknown = requested.difference(PUBLIC_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    requested.add("id")
+    return tuple(
+        name for name in PUBLIC_FIELDS
+        if name in requested
+    )
+
+
+def columns(shape: FieldSet) -> list[Any]:
+    return [getattr(User, name) for name in shape]
+
+
+def tag(shape: FieldSet) -> str:
+    return hashlib.blake2b(
+        ",".join(shape).encode(), digest_size=4
+    ).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def item_type(shape: FieldSet) -> type:
+    return TypedDict(
+        f"UserFields_{tag(shape)}",
+        {
+            name: UserPublic.model_fields[name].annotation
+            for name in shape
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def user_serializer(shape: FieldSet) -> TypeAdapter:
+    return TypeAdapter(item_type(shape))
+
+
+@lru_cache(maxsize=None)
+def page_serializer(shape: FieldSet) -> TypeAdapter:
+    page = TypedDict(
+        f"UsersFields_{tag(shape)}",
+        {"data": list[item_type(shape)], "count": int}
+    )
+    return TypeAdapter(page)
+
+
+def render_user(user: Any, shape: FieldSet) -> Response:
+    content = user_serializer(shape).dump_json(
+        {name: getattr(user, name) for name in shape}
+    )
+    return Response(
+        content=content,
+        media_type="application/json"
+    )
+
+
+def render_page(
+    rows: Sequence[Any],
+    count: int,
+    shape: FieldSet
+) -> Response:
+    content = page_serializer(shape).dump_json(
+        {
+            "data": [row._asdict() for row in rows],
+            "count": count
+        }
+    )
+    return Response(
+        content=content,
+        media_type="application/json"
+    )
@@ -0,0 +1,71 @@
+from src.config import settings
+from src.database import async_session
+from src.idempotency import idempotency_store
+from src.scheduler import CronTrigger, IntervalTrigger, Scheduler
+from auth import crud
+from auth.activity import activity_buffer
+from auth.audit import audit_log
+from auth.purge import user_purger
+from auth.stats import user_stats_reconciler
+
+
+async def prune_password_reset_nonces() -> None:
+    async with async_session() as session:
+        await crud.prune_password_reset_nonces(session=session)
+
+
+def register_jobs(scheduler: Scheduler) -> None:
+    scheduler.add_job(
+        "user_purge",
+        user_purger.run,
+        IntervalTrigger(
+            settings.USER_PURGE_INTERVAL,
+            jitter=settings.SCHEDULER_JITTER
+        )
+    )
+    scheduler.add_job(
+        "user_stats_reconcile",
+        user_stats_reconciler.reconcile,
+        CronTrigger(
+            settings.USER_STATS_RECONCILE_CRON,
+            jitter=settings.SCHEDULER_JITTER
+        )
+    )
+    scheduler.add_job(
+        "password_reset_nonce_prune",
+        prune_password_reset_nonces,
+        IntervalTrigger(
+            settings.PASSWORD_RESET_NONCE_PRUNE_INTERVAL,
+            jitter=settings.SCHEDULER_JITTER
+        )
+    )
+    scheduler.add_job(
+        "idempotency_prune",
+        idempotency_store.prune,
+        IntervalTrigger(
+            settings.IDEMPOTENCY_PRUNE_INTERVAL,
+            jitter=settings.SCHEDULER_JITTER
+        )
+    )
+    # Any worker may replay a dead worker's audit spool; the file
+    # locks keep two from replaying the same file
+    scheduler.add_job(
+        "audit_spool_recover",
+        audit_log.recover,
+        IntervalTrigger(
+            settings.AUDIT_SPOOL_RECOVER_INTERVAL,
+            jitter=settings.SCHEDULER_JITTER
+        ),
+        leader_only=False
+    )
+    # Each worker buffers its own activity, so every worker flushes
+    scheduler.add_job(
+        "activity_flush",
+        activity_buffer.flush,
+        IntervalTrigger(
+            settings.ACTIVITY_FLUSH_INTERVAL,
+            jitter=settings.SCHEDULER_JITTER
+        ),
+        leader_only=False,
+        wake=activity_buffer.full
+    )
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Coalesces the `load` calls made within one event-loop tick into
+    batched `batch_load` calls and memoizes the results.
+
+    A loader wraps a single AsyncSession, so it must be scoped to one
+    request; batches are dispatched one after another on that session.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[list[K]], Awaitable[dict[K, V]]],
+        max_batch_size: int = 100
+    ):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._futures: dict[K, asyncio.Future] = {}
+        self._queue: list[K] = []
+        self._scheduled = False
+        # The loop only keeps weak references to tasks
+        self._tasks: set[asyncio.Task] = set()
+
+    def load(self, key: K) -> Awaitable[V | None]:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._queue.append(key)
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+        # Shielded so one cancelled caller can't cancel the shared result
+        return asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> list[V | None]:
+        return list(
+            await asyncio.gather(*(self.load(key) for key in keys))
+        )
+
+    def prime(self, key: K, value: V) -> None:
+        if key not in self._futures:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._futures[key] = future
+
+    def clear(self, key: K) -> None:
+        self._futures.pop(key, None)
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        self._scheduled = False
+        task = asyncio.ensure_future(self._load_batches(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_batches(self, keys: list[K]) -> None:
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = keys[start:start + self.max_batch_size]
+            try:
+                values = await self.batch_load(batch)
+            except Exception as exc:
+                for key in batch:
+                    future = self._futures.pop(key, None)
+                    if future is not None and not future.done():
+                        future.set_exception(exc)
+                continue
+            for key in batch:
+                future = self._futures.get(key)
+                if future is not None and not future.done():
+                    future.set_result(values.get(key))
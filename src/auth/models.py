@@ -1,15 +1,41 @@
 import uuid
+from datetime import datetime, timezone
+from typing import Any, Literal
 
 from pydantic import EmailStr
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Identity,
+    Index,
+    Integer,
+    SmallInteger,
+    String,
+    text
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlmodel import Field, Relationship, SQLModel
 
+ApiKeyScope = Literal["users:read"]
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Shared with __mapper_args__ so every ORM flush of a User is a
+# conditional UPDATE ... WHERE version = :v.
+user_version_column = Column(
+    "version",
+    Integer,
+    nullable=False,
+    server_default=text("1")
+)
+
 
 class UserBase(SQLModel):
-    email: EmailStr = Field(
-        unique=True,
-        index=True,
-        max_length=255
-    )
+    email: EmailStr = Field(max_length=255)
     is_active: bool = True
     is_superuser: bool = False
     full_name: str | None = Field(
@@ -77,6 +103,248 @@ class User(UserBase, table=True):
         primary_key=True
     )
     hashed_password: str
+    updated_at: datetime = Field(
+        default_factory=utcnow,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=text("now()"),
+            onupdate=utcnow
+        )
+    )
+    version: int = Field(
+        default=1,
+        sa_column=user_version_column
+    )
+    deleted_at: datetime | None = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=True
+        )
+    )
+    last_login_at: datetime | None = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=True
+        )
+    )
+    last_seen_at: datetime | None = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=True
+        )
+    )
+
+    __mapper_args__ = {
+        "version_id_col": user_version_column
+    }
+    # The table is hash-partitioned on id, so no index can enforce
+    # email uniqueness across partitions; UserEmail does that. Soft-
+    # deleted rows stay out of the live indexes. The partitions, the
+    # UserEmail trigger and the pg_trgm search indexes are created by
+    # the Alembic migrations only.
+    __table_args__ = (
+        Index(
+            "ix_user_email_live",
+            "email",
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+        Index(
+            "ix_user_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL")
+        ),
+        Index(
+            "ix_user_updated_at_live",
+            "updated_at",
+            "id",
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+        Index(
+            "ix_user_superuser_live",
+            "email",
+            postgresql_where=text("is_superuser AND deleted_at IS NULL")
+        ),
+        Index(
+            "ix_user_inactive_live",
+            "email",
+            postgresql_where=text("NOT is_active AND deleted_at IS NULL")
+        ),
+        {"postgresql_partition_by": "HASH (id)"},
+    )
+
+
+class UserEmail(SQLModel, table=True):
+    """
+    Owner of each live, lower-cased email. Maintained by a trigger on
+    "user"; email lookups go through it so they touch one partition.
+    """
+    __tablename__ = "user_email"
+
+    email: str = Field(
+        primary_key=True,
+        max_length=255
+    )
+    user_id: uuid.UUID
+
+
+class PasswordResetNonce(SQLModel, table=True):
+    """
+    Outstanding password-reset links; each token carries one nonce
+    and is only honoured while its row exists.
+    """
+    __tablename__ = "password_reset_nonce"
+
+    nonce: str = Field(
+        primary_key=True,
+        max_length=64
+    )
+    user_id: uuid.UUID = Field(index=True)
+    expires_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            index=True
+        )
+    )
+
+
+class UserStats(SQLModel, table=True):
+    """
+    One shard of the live user totals. The totals are the sums over
+    all shards; a trigger on "user" keeps them current.
+    """
+    __tablename__ = "user_stats"
+
+    shard: int = Field(
+        sa_column=Column(
+            SmallInteger,
+            primary_key=True,
+            autoincrement=False
+        )
+    )
+    total: int = Field(sa_column=Column(BigInteger, nullable=False))
+    active: int = Field(sa_column=Column(BigInteger, nullable=False))
+    superusers: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+class AuditEvent(SQLModel, table=True):
+    __tablename__ = "audit_event"
+    __table_args__ = (
+        Index(
+            "ix_audit_event_target_id_occurred_at",
+            "target_id",
+            "occurred_at"
+        ),
+        Index(
+            "ix_audit_event_actor_id_occurred_at",
+            "actor_id",
+            "occurred_at"
+        ),
+        # Lets a replayed event be skipped if it was already written
+        Index(
+            "ix_audit_event_event_id",
+            "event_id",
+            unique=True
+        ),
+    )
+
+    id: int | None = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger,
+            Identity(),
+            primary_key=True
+        )
+    )
+    event_id: uuid.UUID = Field(default_factory=uuid.uuid4)
+    occurred_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False
+        )
+    )
+    action: str = Field(max_length=64)
+    actor_id: uuid.UUID | None = None
+    target_id: uuid.UUID | None = None
+    details: dict[str, Any] = Field(
+        default_factory=dict,
+        sa_column=Column(JSONB, nullable=False)
+    )
+
+
+class ApiKey(SQLModel, table=True):
+    __tablename__ = "api_key"
+
+    id: uuid.UUID = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True
+    )
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id",
+        ondelete="CASCADE",
+        index=True
+    )
+    name: str = Field(max_length=255)
+    # Public, indexed part of the key; the secret is only ever stored
+    # as an HMAC digest of the whole key
+    prefix: str = Field(
+        max_length=12,
+        unique=True
+    )
+    digest: str = Field(max_length=64)
+    scopes: list[str] = Field(
+        default_factory=list,
+        sa_column=Column(ARRAY(String), nullable=False)
+    )
+    created_at: datetime = Field(
+        default_factory=utcnow,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=text("now()")
+        )
+    )
+    expires_at: datetime | None = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=True
+        )
+    )
+    revoked_at: datetime | None = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=True
+        )
+    )
+
+
+class ApiKeyCreate(SQLModel):
+    name: str = Field(max_length=255)
+    scopes: list[ApiKeyScope] = Field(min_length=1)
+    user_id: uuid.UUID | None = None
+    expires_at: datetime | None = None
+
+
+class ApiKeyPublic(SQLModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    name: str
+    prefix: str
+    scopes: list[str]
+    created_at: datetime
+    expires_at: datetime | None
+    revoked_at: datetime | None
+
+
+class ApiKeyCreated(ApiKeyPublic):
+    # Only ever returned once, at creation
+    api_key: str
 
 
 class UserPublic(UserBase):
@@ -88,6 +356,26 @@ class UsersPublic(SQLModel):
     count: int
 
 
+class UserStatsPublic(SQLModel):
+    total: int
+    active: int
+    superusers: int
+
+
+class UsersBatch(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1)
+
+
+class UsersBatchPublic(SQLModel):
+    data: list[UserPublic]
+    missing: list[uuid.UUID]
+
+
+class UsersPage(SQLModel):
+    data: list[UserPublic]
+    next_cursor: str | None = None
+
+
 class Message(SQLModel):
     message: str
 
@@ -0,0 +1,15 @@
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class AuthPrincipal:
+    """
+    The columns authentication and authorization need, read without
+    building a `User` entity. Load the entity only where a handler
+    needs more than this.
+    """
+    id: uuid.UUID
+    is_active: bool
+    is_superuser: bool
+    hashed_password: str
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlmodel import delete, select
+
+from src import metrics
+from src.config import settings
+from src.database import async_session
+from auth.models import User, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+class UserPurger:
+    """
+    Hard-deletes soft-deleted users in small batches, pacing them so
+    row locks and WAL stay bounded regardless of the backlog size.
+    """
+
+    def __init__(
+        self,
+        *,
+        retention: timedelta,
+        batch_size: int,
+        max_rows_per_second: float
+    ):
+        self.retention = retention
+        self.batch_size = batch_size
+        self.max_rows_per_second = max_rows_per_second
+        self.purged = 0
+        self.batches = 0
+
+    async def purge_batch(self) -> int:
+        doomed = (
+            select(User.id)
+            .where(User.deleted_at < utcnow() - self.retention)
+            .order_by(User.deleted_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        statement = delete(User).where(
+            User.id.in_(doomed.scalar_subquery())
+        ).execution_options(synchronize_session=False)
+        async with async_session() as session:
+            result = await session.execute(statement)
+            await session.commit()
+        self.batches += 1
+        self.purged += result.rowcount
+        return result.rowcount
+
+    async def run_once(self) -> int:
+        total = 0
+        pause = self.batch_size / self.max_rows_per_second
+        while True:
+            purged = await self.purge_batch()
+            total += purged
+            if purged < self.batch_size:
+                return total
+            await asyncio.sleep(pause)
+
+    async def run(self) -> None:
+        purged = await self.run_once()
+        if purged:
+            logger.info("Purged %d deleted users", purged)
+
+    def stats(self) -> dict:
+        return {
+            "purged": self.purged,
+            "batches": self.batches,
+        }
+
+
+user_purger = UserPurger(
+    retention=timedelta(hours=settings.USER_PURGE_RETENTION_HOURS),
+    batch_size=settings.USER_PURGE_BATCH_SIZE,
+    max_rows_per_second=settings.USER_PURGE_MAX_ROWS_PER_SECOND
+)
+metrics.register("user_purger", user_purger.stats)
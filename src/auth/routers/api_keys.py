@@ -0,0 +1,85 @@
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, status
+
+from auth import crud
+from auth.dependencies import SessionDep, CurrentUser
+from auth.models import (
+    ApiKeyCreate,
+    ApiKeyCreated,
+    ApiKeyPublic
+)
+from auth.service import UserService
+
+router = APIRouter()
+user_service = UserService()
+
+
+@router.post(
+    "/",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ApiKeyCreated
+)
+async def create_api_key(
+    session: SessionDep,
+    key_in: ApiKeyCreate,
+    current_user: CurrentUser
+) -> Any:
+    """
+    Issue an API key; the key itself is only shown in this response.
+    """
+    user_id = key_in.user_id or current_user.id
+    user = await user_service.get_user(
+        user_id=user_id,
+        session=session
+    )
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="User not found"
+        )
+    db_key, api_key = await crud.create_api_key(
+        session=session,
+        key_in=key_in,
+        user_id=user_id,
+        actor_id=current_user.id
+    )
+    return ApiKeyCreated(
+        **ApiKeyPublic.model_validate(db_key).model_dump(),
+        api_key=api_key
+    )
+
+
+@router.get("/", response_model=list[ApiKeyPublic])
+async def get_api_keys(
+    session: SessionDep,
+    user_id: uuid.UUID | None = None
+) -> Any:
+    return await crud.get_api_keys(
+        session=session,
+        user_id=user_id
+    )
+
+
+@router.delete("/{key_id}", response_model=ApiKeyPublic)
+async def revoke_api_key(
+    key_id: uuid.UUID,
+    session: SessionDep,
+    current_user: CurrentUser
+) -> Any:
+    """
+    Revoke an API key; every worker stops accepting it once the
+    invalidation arrives.
+    """
+    db_key = await crud.revoke_api_key(
+        session=session,
+        key_id=key_id,
+        actor_id=current_user.id
+    )
+    if not db_key:
+        raise HTTPException(
+            status_code=404,
+            detail="API key not found"
+        )
+    return db_key
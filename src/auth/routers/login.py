@@ -3,12 +3,16 @@ from typing import Annotated, Any
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import HTMLResponse, JSONResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src import invalidation
 from src.config import settings
 from src.utils import send_email
 from src.exceptions import (
     InvalidCredentials
 )
 from auth import crud
+from auth.activity import activity_buffer
+from auth.audit import audit_log
 from auth.dependencies import (
     SessionDep,
     get_current_active_superuser
@@ -25,7 +29,7 @@ from auth.utils import (
     generate_password_hash,
     generate_password_reset_token,
     generate_reset_password_email,
-    verify_password,
+    password_reset_expiry,
     verify_password_reset_token
 )
 
@@ -35,6 +39,23 @@ user_service = UserService()
 REFRESH_TOKEN_EXPIRY = settings.JWT_EXPIRY
 
 
+async def issue_password_reset_token(
+    session: AsyncSession,
+    user: User
+) -> str:
+    expires = password_reset_expiry()
+    nonce = await crud.create_password_reset_nonce(
+        session=session,
+        user_id=user.id,
+        expires_at=expires
+    )
+    return generate_password_reset_token(
+        email=user.email,
+        nonce=nonce,
+        expires=expires
+    )
+
+
 @router.post("/login")
 async def login_user(
     session: SessionDep,
@@ -43,35 +64,30 @@ async def login_user(
         Depends()
     ]
 ):
-    email = form_data.email
-    password = form_data.password
-
-    user = await user_service.get_user_by_email(
-        email, session
+    user = await user_service.authenticate(
+        session=session,
+        email=form_data.username,
+        password=form_data.password
     )
 
     if user is not None:
-        password_valid = verify_password(
-            password, user.password_hash
+        access_token = create_access_token(
+            subject=str(user.id),
+            expiry=timedelta(
+                minutes=ACCESS_TOKEN_EXPIRY
+            ),
+        )
+        activity_buffer.record_login(user.id)
+        return JSONResponse(
+            content={
+                "message": "Login successful",
+                "access_token": access_token,
+                "user": {
+                    "email": form_data.username,
+                    "id": str(user.id)
+                },
+            }
         )
-
-        if password_valid:
-            access_token = create_access_token(
-                subject=str(user.id),
-                expiry=timedelta(
-                    minutes=ACCESS_TOKEN_EXPIRY
-                ),
-            )
-            return JSONResponse(
-                content={
-                    "message": "Login successful",
-                    "access_token": access_token,
-                    "user": {
-                        "email": user.email,
-                        "id": str(user.id)
-                    },
-                }
-            )
 
     raise InvalidCredentials()
 
@@ -95,8 +111,8 @@ async def recover_password(
             detail="The user with this email \
                 does not exist in the system.",
         )
-    password_reset_token = generate_password_reset_token(
-        email=email
+    password_reset_token = await issue_password_reset_token(
+        session, user
     )
     email_data = await generate_reset_password_email(
         email_to=user.email,
@@ -121,34 +137,59 @@ async def reset_password(
     """
     Reset password
     """
-    email = verify_password_reset_token(
+    claims = verify_password_reset_token(
         token=body.token
     )
-    if not email:
+    if not claims:
         raise HTTPException(
             status_code=400,
             detail="Invalid token"
         )
-    user = await user_service.get_user_by_email(
-        email=email,
-        session=session
+    email, nonce = claims
+    # Spend the nonce before any hashing, so a replayed or
+    # concurrently reused link is turned away cheaply.
+    user_id = await crud.consume_password_reset_nonce(
+        session=session,
+        nonce=nonce
     )
-    if not user:
+    if user_id is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid token"
+        )
+    user = await crud.get_user(
+        session=session,
+        user_id=user_id
+    )
+    if not user or user.email.lower() != email.lower():
+        await session.commit()
         raise HTTPException(
             status_code=404,
             detail="The user with this email \
                 does not exist in the system.",
         )
     elif not user.is_active:
+        await session.commit()
         raise HTTPException(
             status_code=400,
             detail="Inactive user"
         )
-    hashed_password = generate_password_hash(
+    hashed_password = await generate_password_hash(
         password=body.new_password
     )
     user.hashed_password = hashed_password
     session.add(user)
+    # A completed reset retires every other outstanding link
+    await crud.revoke_password_reset_nonces(
+        session=session,
+        user_id=user.id
+    )
+    invalidation.publish(session, "user", user.id)
+    audit_log.capture(
+        session,
+        "user.password_reset",
+        target_id=user.id
+    )
     await session.commit()
     return Message(
         message="Password updated successfully"
@@ -179,8 +220,8 @@ async def recover_password_html_content(
             detail="The user with this username \
                 does not exist in the system.",
         )
-    password_reset_token = generate_password_reset_token(
-        email=email
+    password_reset_token = await issue_password_reset_token(
+        session, user
     )
     email_data = await generate_reset_password_email(
         email_to=user.email,
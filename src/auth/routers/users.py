@@ -1,15 +1,30 @@
 import uuid
-from typing import Any
-from sqlmodel import select, delete, func
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Annotated, Any
+from sqlmodel import select, delete
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status
+)
+from src import invalidation
+from src.config import settings
 from src.exceptions import UserAlreadyExists
-from auth import crud
+from auth import crud, etags, fieldsets
+from auth.audit import audit_log
 from auth.utils import generate_password_hash, verify_password
 from auth.dependencies import (
     SessionDep,
     CurrentUser,
+    CurrentUserEntity,
+    UserLoaderDep,
+    UserReader,
     get_current_active_superuser
 )
+from auth.principal import AuthPrincipal
 from auth.models import (
     Message,
     User,
@@ -18,15 +33,23 @@ from auth.models import (
     UserUpdate,
     UserUpdateMe,
     UserPublic,
+    UsersBatch,
+    UsersBatchPublic,
+    UsersPage,
     UsersPublic,
+    UserStatsPublic,
     UpdatePassword,
 )
-from auth.service import UserService
+from auth.service import UserService, UserSort
 
 
 router = APIRouter()
 user_service = UserService()
 
+# Offset pages of live users follow ix_user_email_live; id breaks ties
+# so a page is the same from one request to the next
+PAGE_ORDER = (User.email, User.id)
+
 
 @router.post(
     "/create_user",
@@ -37,7 +60,8 @@ user_service = UserService()
 )
 async def create_user(
     *, session: SessionDep,
-    user_in: UserCreate
+    user_in: UserCreate,
+    current_user: CurrentUser
 ) -> Any:
     """
     Create new user.
@@ -51,7 +75,8 @@ async def create_user(
 
     user = await crud.create_user(
         session=session,
-        user_create=user_in
+        user_create=user_in,
+        actor_id=current_user.id
     )
     """
     if settings.emails_enabled and user_in.email:
@@ -86,14 +111,11 @@ async def register_user(
         raise UserAlreadyExists()
 
     user = await crud.create_user(
-        user_data, session
+        session=session,
+        user_create=UserCreate.model_validate(user_data)
     )
 
-    return {
-        "message": f"Account Created! \
-            Check email to verify your account",
-        "user": user,
-    }
+    return user
 
 
 @router.get(
@@ -106,25 +128,134 @@ async def register_user(
 async def get_users(
     session: SessionDep,
     offset: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    fields: str | None = None
 ) -> Any:
+    shape = fieldsets.parse_fields(fields)
 
-    count_statement = select(func.count()).select_from(
-        User
-    )
-    count = await session.exec(count_statement).one()
+    count = (await crud.get_user_stats(session=session)).total
+
+    if shape is not None:
+        statement = select(
+            *fieldsets.columns(shape)
+        ).where(
+            User.deleted_at.is_(None)
+        ).order_by(*PAGE_ORDER).offset(offset).limit(limit)
+        rows = (await session.exec(statement)).all()
+        return fieldsets.render_page(rows, count, shape)
 
-    statement = select(User).offset(offset).limit(limit)
-    users = await session.exec(statement).all()
+    statement = select(User).where(
+        User.deleted_at.is_(None)
+    ).order_by(*PAGE_ORDER).offset(offset).limit(limit)
+    users = (await session.exec(statement)).all()
     return UsersPublic(
         data=users,
         count=count
     )
 
 
+@router.get(
+    "/stats",
+    dependencies=[
+        Depends(get_current_active_superuser)
+    ],
+    response_model=UserStatsPublic
+)
+async def get_user_stats(session: SessionDep) -> Any:
+    """
+    Live user totals, read from the maintained counters.
+    """
+    return await crud.get_user_stats(session=session)
+
+
+@router.get(
+    "/search",
+    dependencies=[
+        Depends(get_current_active_superuser)
+    ],
+    response_model=UsersPage
+)
+async def search_users(
+    session: SessionDep,
+    q: Annotated[
+        str | None,
+        Query(min_length=3, max_length=255)
+    ] = None,
+    fuzzy: bool = False,
+    is_active: bool | None = None,
+    is_superuser: bool | None = None,
+    sort: UserSort = "email",
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 50
+) -> Any:
+    """
+    Search users by email or full name.
+    """
+    try:
+        users, next_cursor = await user_service.search(
+            session=session,
+            q=q,
+            fuzzy=fuzzy,
+            is_active=is_active,
+            is_superuser=is_superuser,
+            sort=sort,
+            cursor=cursor,
+            limit=limit
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cursor"
+        )
+    return UsersPage(
+        data=users,
+        next_cursor=next_cursor
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=UsersBatchPublic
+)
+async def read_users_batch(
+    body: UsersBatch,
+    reader: UserReader,
+    loader: UserLoaderDep
+) -> Any:
+    """
+    Get several users by id in one query.
+    """
+    user_ids = list(dict.fromkeys(body.ids))
+    if len(user_ids) > settings.USER_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.USER_BATCH_MAX_IDS} \
+                ids can be requested at once",
+        )
+    if (
+        isinstance(reader, AuthPrincipal)
+        and not reader.is_superuser
+        and user_ids != [reader.id]
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail="The user doesn't have enough privileges",
+        )
+    users = await loader.load_many(user_ids)
+    return UsersBatchPublic(
+        data=[user for user in users if user is not None],
+        missing=[
+            user_id for user_id, user in zip(user_ids, users)
+            if user is None
+        ]
+    )
+
+
 @router.patch("/profile", response_model=UserPublic)
 async def update_user_me(
     *, session: SessionDep,
+    request: Request,
+    response: Response,
     user_in: UserUpdateMe,
     current_user: CurrentUser
 ) -> Any:
@@ -144,12 +275,22 @@ async def update_user_me(
                 status_code=409,
                 detail="User with this email already exists"
             )
-    user_data = user_in.model_dump(exclude_unset=True)
-    current_user.sqlmodel_update(user_data)
-    session.add(current_user)
-    await session.commit()
-    await session.refresh(current_user)
-    return current_user
+    user = await crud.update_user(
+        session=session,
+        user_id=current_user.id,
+        user_in=user_in,
+        expected_version=etags.expected_version(
+            request, current_user.id
+        ),
+        actor_id=current_user.id
+    )
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="User not found"
+        )
+    etags.set_validators(response, *etags.remember(user))
+    return user
 
 
 @router.patch(
@@ -159,12 +300,12 @@ async def update_user_me(
 async def update_password_me(
     *, session: SessionDep,
     body: UpdatePassword,
-    current_user: CurrentUser
+    current_user: CurrentUserEntity
 ) -> Any:
     """
     Update own password.
     """
-    if not verify_password(
+    if not await verify_password(
         body.current_password,
         current_user.hashed_password
     ):
@@ -178,11 +319,18 @@ async def update_password_me(
             detail="New password cannot be \
                 the same as the current one"
         )
-    hashed_password = generate_password_hash(
+    hashed_password = await generate_password_hash(
         body.new_password
     )
     current_user.hashed_password = hashed_password
     session.add(current_user)
+    invalidation.publish(session, "user", current_user.id)
+    audit_log.capture(
+        session,
+        "user.password_change",
+        actor_id=current_user.id,
+        target_id=current_user.id
+    )
     await session.commit()
     return Message(
         message="Password updated successfully"
@@ -195,7 +343,7 @@ async def update_password_me(
 )
 async def delete_user_me(
     session: SessionDep,
-    current_user: CurrentUser
+    current_user: CurrentUserEntity
 ) -> Any:
     """
     Delete own user.
@@ -206,40 +354,88 @@ async def delete_user_me(
             detail="Super users are not \
                 allowed to delete themselves"
         )
-    await session.delete(current_user)
-    await session.commit()
+    await crud.delete_user(
+        session=session,
+        db_user=current_user,
+        actor_id=current_user.id
+    )
     return Message(
         message="User deleted successfully"
     )
 
 
-@router.get("/profile", response_model=User)
+@router.get("/profile", response_model=UserPublic)
 async def get_current_user(
-    user: User = Depends(CurrentUser)
-):
-    return user
+    request: Request,
+    response: Response,
+    current_user: CurrentUserEntity
+) -> Any:
+    """
+    Get own user.
+    """
+    etag, last_modified = etags.remember(current_user)
+    if etags.is_not_modified(request, etag, last_modified):
+        return etags.not_modified(etag, last_modified)
+    etags.set_validators(response, etag, last_modified)
+    return current_user
 
 
 @router.get(
     "/{user_id}",
     response_model=UserPublic
 )
-def read_user_by_id(
+async def read_user_by_id(
     user_id: uuid.UUID,
+    request: Request,
+    response: Response,
     session: SessionDep,
-    current_user: CurrentUser
+    reader: UserReader,
+    fields: str | None = None
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = session.get(User, user_id)
-    if user == current_user:
-        return user
-    if not current_user.is_superuser:
+    shape = fieldsets.parse_fields(fields)
+    if (
+        isinstance(reader, AuthPrincipal)
+        and user_id != reader.id
+        and not reader.is_superuser
+    ):
         raise HTTPException(
             status_code=403,
             detail="The user doesn't have enough privileges",
         )
+    if shape is not None:
+        user = await crud.get_user_fields(
+            session=session,
+            user_id=user_id,
+            columns=fieldsets.columns(shape)
+        )
+    else:
+        cached = etags.user_validators.get(user_id)
+        if cached and etags.is_not_modified(request, *cached):
+            return etags.not_modified(*cached)
+        user = await crud.get_user(
+            session=session,
+            user_id=user_id
+        )
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="User not found"
+        )
+    if shape is not None:
+        etag = etags.user_etag(user, variant=fieldsets.tag(shape))
+        last_modified = user.updated_at
+        if etags.is_not_modified(request, etag, last_modified):
+            return etags.not_modified(etag, last_modified)
+        response = fieldsets.render_user(user, shape)
+        etags.set_validators(response, etag, last_modified)
+        return response
+    etag, last_modified = etags.remember(user)
+    if etags.is_not_modified(request, etag, last_modified):
+        return etags.not_modified(etag, last_modified)
+    etags.set_validators(response, etag, last_modified)
     return user
 
 
@@ -253,19 +449,18 @@ def read_user_by_id(
 async def update_user(
     *,
     session: SessionDep,
+    request: Request,
+    response: Response,
     user_id: uuid.UUID,
     user_in: UserUpdate,
+    current_user: CurrentUser,
 ) -> Any:
     """
     Update a user.
     """
-    db_user = await session.get(User, user_id)
-    if not db_user:
-        raise HTTPException(
-            status_code=404,
-            detail="The user with this id \
-                does not exist in the system",
-        )
+    expected_version = etags.expected_version(
+        request, user_id
+    )
     if user_in.email:
         existing_user = await user_service.get_user_by_email(
             session=session, 
@@ -279,9 +474,18 @@ async def update_user(
 
     db_user = await crud.update_user(
         session=session,
-        db_user=db_user,
-        user_in=user_in
+        user_id=user_id,
+        user_in=user_in,
+        expected_version=expected_version,
+        actor_id=current_user.id
     )
+    if not db_user:
+        raise HTTPException(
+            status_code=404,
+            detail="The user with this id \
+                does not exist in the system",
+        )
+    etags.set_validators(response, *etags.remember(db_user))
     return db_user
 
 
@@ -299,20 +503,26 @@ async def delete_user(
     """
     Delete a user by id.
     """
-    user = await session.get(User, user_id)
+    user = await crud.get_user(
+        session=session,
+        user_id=user_id
+    )
     if not user:
         raise HTTPException(
             status_code=404,
             detail="User not found"
         )
-    if user == current_user:
+    if user.id == current_user.id:
         raise HTTPException(
             status_code=403,
             detail="Super users are not \
                 allowed to delete themselves"
         )
-    await session.delete(user)
-    await session.commit()
+    await crud.delete_user(
+        session=session,
+        db_user=user,
+        actor_id=current_user.id
+    )
     return Message(
         message="User deleted successfully"
     )
\ No newline at end of file
@@ -1,36 +1,244 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Literal, TypeVar
+
+from sqlalchemy import or_, tuple_
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
+from src import metrics
+from src.database import async_session
+from src.singleflight import SingleFlight
+from auth import crud
 from auth.models import User
-from auth.utils import verify_password
+from auth.principal import AuthPrincipal
+from auth.utils import verify_and_update_password
+
+T = TypeVar("T")
+
+UserSort = Literal["email", "-email", "updated_at", "-updated_at"]
+
+# Every sort is backed by a live-row index; email is unique among
+# live users, so it needs no id tiebreaker.
+SORT_KEYS = {
+    "email": (User.email,),
+    "updated_at": (User.updated_at, User.id),
+}
+
+
+def encode_cursor(values: list[Any]) -> str:
+    raw = json.dumps(
+        [
+            value.isoformat() if isinstance(value, datetime)
+            else str(value)
+            for value in values
+        ]
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> list[Any]:
+    values = json.loads(base64.urlsafe_b64decode(cursor))
+    if not isinstance(values, list) or len(values) != len(SORT_KEYS[sort]):
+        raise ValueError("Malformed cursor")
+    if sort == "updated_at":
+        values = [
+            datetime.fromisoformat(values[0]),
+            uuid.UUID(values[1])
+        ]
+    return values
+
+
+user_lookups = SingleFlight()
+metrics.register("user_lookups", user_lookups.stats)
+
+
+async def load_detached(
+    load: Callable[[AsyncSession], Awaitable[T]]
+) -> T:
+    # Coalesced lookups are shared between requests, so they run on
+    # their own session and hand back a detached instance.
+    async with async_session() as session:
+        return await load(session)
+
+
+def escape_like(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace("%", "\\%")
+        .replace("_", "\\_")
+    )
 
 
 class UserService:
+    async def _coalesced(
+        self,
+        key: tuple[str, Any],
+        session: AsyncSession,
+        load: Callable[[AsyncSession], Awaitable[User | None]]
+    ) -> User | None:
+        user = await user_lookups.do(
+            key, lambda: load_detached(load)
+        )
+        if user is None:
+            return None
+        return await session.merge(user, load=False)
+
+    async def get_user(
+        self, user_id: uuid.UUID,
+        session: AsyncSession
+    ) -> User | None:
+        return await self._coalesced(
+            ("id", user_id),
+            session,
+            lambda s: crud.get_user(session=s, user_id=user_id)
+        )
+
     async def get_user_by_email(
         self, email: str, 
         session: AsyncSession
-    ):
-        statement = select(User).where(User.email == email)
-        result = await session.exec(statement)
-        user = result.first()
-
-        return user
+    ) -> User | None:
+        return await self._coalesced(
+            ("email", email),
+            session,
+            lambda s: crud.get_user_by_email(session=s, email=email)
+        )
     
+    async def get_principal(
+        self, user_id: uuid.UUID
+    ) -> AuthPrincipal | None:
+        # Principals are immutable, so every waiter can share one
+        return await user_lookups.do(
+            ("principal", user_id),
+            lambda: load_detached(
+                lambda s: crud.get_auth_principal(
+                    session=s, user_id=user_id
+                )
+            )
+        )
+
+    async def get_principal_by_email(
+        self, email: str
+    ) -> AuthPrincipal | None:
+        return await user_lookups.do(
+            ("principal_email", email),
+            lambda: load_detached(
+                lambda s: crud.get_auth_principal_by_email(
+                    session=s, email=email
+                )
+            )
+        )
+
     async def authenticate(
         self, *,
         session: AsyncSession,
         email: str,
         password: str
-    ) -> User | None:
-        db_user = await self.get_user_by_email(
-            session=session,
-            email=email
-        )
-        if not db_user:
+    ) -> AuthPrincipal | None:
+        principal = await self.get_principal_by_email(email)
+        if not principal:
             return None
-        if not verify_password(
+        valid, new_hash = await verify_and_update_password(
             password,
-            db_user.hashed_password
-        ):
+            principal.hashed_password
+        )
+        if not valid:
             return None
-        return db_user
+        if new_hash is not None:
+            await crud.update_password_hash(
+                session=session,
+                user_id=principal.id,
+                verified_hash=principal.hashed_password,
+                hashed_password=new_hash
+            )
+        return principal
+
+    def search_statement(
+        self, *,
+        q: str | None = None,
+        fuzzy: bool = False,
+        is_active: bool | None = None,
+        is_superuser: bool | None = None,
+        sort: UserSort = "email",
+        cursor: list[Any] | None = None,
+        limit: int = 100
+    ) -> SelectOfScalar[User]:
+        """
+        Build the search query. Substring matches use ILIKE and fuzzy
+        matches the pg_trgm similarity operator, both served by the
+        trigram GIN indexes; pages are keyset-paginated on SORT_KEYS.
+        """
+        statement = select(User).where(User.deleted_at.is_(None))
+        if q:
+            if fuzzy:
+                statement = statement.where(
+                    or_(
+                        User.email.op("%")(q),
+                        User.full_name.op("%")(q)
+                    )
+                )
+            else:
+                pattern = f"%{escape_like(q)}%"
+                statement = statement.where(
+                    or_(
+                        User.email.ilike(pattern, escape="\\"),
+                        User.full_name.ilike(pattern, escape="\\")
+                    )
+                )
+        if is_active is not None:
+            statement = statement.where(User.is_active == is_active)
+        if is_superuser is not None:
+            statement = statement.where(
+                User.is_superuser == is_superuser
+            )
+
+        descending = sort.startswith("-")
+        keys = SORT_KEYS[sort.lstrip("-")]
+        if cursor is not None:
+            if len(keys) == 1:
+                column, value = keys[0], cursor[0]
+                statement = statement.where(
+                    column < value if descending else column > value
+                )
+            else:
+                left, right = tuple_(*keys), tuple_(*cursor)
+                statement = statement.where(
+                    left < right if descending else left > right
+                )
+        return statement.order_by(
+            *(key.desc() if descending else key for key in keys)
+        ).limit(limit)
+
+    async def search(
+        self, *,
+        session: AsyncSession,
+        sort: UserSort = "email",
+        cursor: str | None = None,
+        limit: int = 100,
+        **filters: Any
+    ) -> tuple[list[User], str | None]:
+        statement = self.search_statement(
+            sort=sort,
+            cursor=(
+                decode_cursor(cursor, sort.lstrip("-"))
+                if cursor
+                else None
+            ),
+            limit=limit + 1,
+            **filters
+        )
+        users = list((await session.exec(statement)).all())
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            last = users[-1]
+            next_cursor = encode_cursor(
+                [
+                    getattr(last, key.key)
+                    for key in SORT_KEYS[sort.lstrip("-")]
+                ]
+            )
+        return users, next_cursor
@@ -0,0 +1,97 @@
+import logging
+
+from sqlalchemy import func, update
+from sqlmodel import select
+
+from src import metrics
+from src.database import async_session, engine
+from auth.models import User, UserStats
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("total", "active", "superusers")
+
+
+def shard_counts():
+    shard = func.user_stats_shard(User.id).label("shard")
+    return select(
+        shard,
+        func.count().label("total"),
+        func.count().filter(User.is_active).label("active"),
+        func.count().filter(User.is_superuser).label("superusers")
+    ).where(
+        User.deleted_at.is_(None)
+    ).group_by(shard)
+
+
+class UserStatsReconciler:
+    """
+    Recounts live users and corrects whatever the user_stats counters
+    drifted by (rows changed with triggers disabled, TRUNCATE, manual
+    fixes).
+
+    Counters and users are read in one REPEATABLE READ snapshot, so
+    the difference between them is exact for that moment. The
+    difference is then added to the counters, rather than overwriting
+    them, which keeps every change committed since the snapshot. No
+    locks are held during the scan.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.corrections = 0
+
+    async def drift(self) -> dict[int, dict[str, int]]:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(
+                isolation_level="REPEATABLE READ"
+            )
+            async with conn.begin():
+                counters = (await conn.execute(select(UserStats))).all()
+                actual = {
+                    row.shard: row
+                    for row in (await conn.execute(shard_counts())).all()
+                }
+        drift = {}
+        for counter in counters:
+            real = actual.get(counter.shard)
+            delta = {
+                name: (getattr(real, name) if real else 0)
+                - getattr(counter, name)
+                for name in COUNTERS
+            }
+            if any(delta.values()):
+                drift[counter.shard] = delta
+        return drift
+
+    async def reconcile(self) -> int:
+        drift = await self.drift()
+        if drift:
+            async with async_session() as session:
+                for shard, delta in drift.items():
+                    await session.execute(
+                        update(UserStats)
+                        .where(UserStats.shard == shard)
+                        .values({
+                            name: getattr(UserStats, name) + value
+                            for name, value in delta.items()
+                        })
+                    )
+                await session.commit()
+            logger.warning(
+                "Corrected user stats drift in %d shards: %s",
+                len(drift), drift
+            )
+        self.runs += 1
+        self.corrections += len(drift)
+        return len(drift)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "corrections": self.corrections,
+        }
+
+
+user_stats_reconciler = UserStatsReconciler()
+metrics.register("user_stats_reconciler", user_stats_reconciler.stats)
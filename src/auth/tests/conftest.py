@@ -0,0 +1,19 @@
+import pytest
+
+from auth.tests.plans import (
+    PLAN_TEST_ROWS,
+    PlanDatabase,
+    PlanSample
+)
+
+
+@pytest.fixture(scope="session")
+def plan_db(migrated_database) -> PlanDatabase:
+    db = PlanDatabase(migrated_database)
+    db.seed(PLAN_TEST_ROWS)
+    return db
+
+
+@pytest.fixture(scope="session")
+def plan_sample(plan_db) -> PlanSample:
+    return plan_db.sample()
@@ -0,0 +1,410 @@
+import asyncio
+import difflib
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+PLAN_TEST_ROWS = int(os.getenv("PLAN_TEST_ROWS", "10000000"))
+
+SEED_USERS = """
+INSERT INTO "user" (
+    id, email, full_name, is_active, is_superuser,
+    hashed_password, updated_at, version, deleted_at
+)
+SELECT
+    gen_random_uuid(),
+    'user' || n || '@'
+        || (ARRAY['example.com', 'example.org', 'example.net'])[1 + n % 3],
+    'Name ' || substr(md5(n::text), 1, 12),
+    n % 100 <> 0,
+    n % 100000 = 0,
+    'not-a-hash',
+    now() - make_interval(secs => n),
+    1,
+    CASE WHEN n % 50 = 0 THEN now() END
+FROM generate_series(1, {rows}) AS n
+"""
+
+# What the user_email_sync and user_stats_count triggers would have
+# written row by row; millions of updates to the same 16 counter rows
+# in one transaction slow down with every version they leave behind.
+SEED_USER_TRIGGERS = ("user_email_sync", "user_stats_count")
+
+SEED_USER_EMAILS = """
+INSERT INTO user_email (email, user_id)
+SELECT lower(email), id FROM "user" WHERE deleted_at IS NULL
+"""
+
+SEED_USER_STATS = """
+UPDATE user_stats AS s
+SET total = c.total, active = c.active, superusers = c.superusers
+FROM (
+    SELECT
+        user_stats_shard(id) AS shard,
+        count(*) AS total,
+        count(*) FILTER (WHERE is_active) AS active,
+        count(*) FILTER (WHERE is_superuser) AS superusers
+    FROM "user"
+    WHERE deleted_at IS NULL
+    GROUP BY 1
+) AS c
+WHERE s.shard = c.shard
+"""
+
+# One key per ~20 users, a tenth of them revoked
+SEED_API_KEYS = """
+INSERT INTO api_key (id, user_id, name, prefix, digest, scopes, revoked_at)
+SELECT
+    gen_random_uuid(),
+    id,
+    'seed',
+    substr(md5(id::text), 1, 12),
+    md5(email) || md5(full_name),
+    ARRAY['users:read'],
+    CASE WHEN hashtext(email) % 200 = 0 THEN now() END
+FROM "user"
+WHERE hashtext(email) % 20 = 0
+"""
+
+# One outstanding link per ~50 users, about half of them expired
+SEED_PASSWORD_RESET_NONCES = """
+INSERT INTO password_reset_nonce (nonce, user_id, expires_at)
+SELECT
+    md5(id::text || 'reset'),
+    id,
+    now() + make_interval(mins => hashtext(email) % 1440)
+FROM "user"
+WHERE hashtext(email) % 50 = 0
+"""
+
+EMAIL = "user4242@example.com"
+
+SAMPLE = """
+SELECT
+    (SELECT id FROM "user" WHERE id = (
+        SELECT user_id FROM user_email WHERE email = '{email}'
+    )),
+    ARRAY(
+        SELECT id FROM "user" WHERE deleted_at IS NULL
+        ORDER BY email LIMIT 100
+    ),
+    k.id,
+    k.user_id,
+    k.prefix,
+    (SELECT nonce FROM password_reset_nonce WHERE expires_at > now() LIMIT 1)
+FROM api_key AS k
+WHERE k.revoked_at IS NULL
+LIMIT 1
+"""
+
+# Plannable statements; savepoints and the like are left out
+PLANNABLE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.I)
+
+PARTITION = re.compile(r"\buser_p\d+")
+
+
+@dataclass(frozen=True, slots=True)
+class PlanSample:
+    """
+    Existing rows of the seeded database for plan cases to look up.
+    """
+    email: str
+    user_id: uuid.UUID
+    user_ids: list[uuid.UUID]
+    api_key_id: uuid.UUID
+    api_key_user_id: uuid.UUID
+    api_key_prefix: str
+    nonce: str
+
+
+class StatementRecorder:
+    """
+    `before_cursor_execute` listener keeping each statement sent to
+    the database along with its parameters.
+    """
+
+    def __init__(self):
+        self.statements: list[tuple[str, Any]] = []
+
+    def __call__(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        # A multi-row insert has no single set of parameters to plan
+        if not executemany and PLANNABLE.match(statement):
+            self.statements.append((statement, parameters))
+
+
+class PlanDatabase:
+    """
+    A migrated Postgres database seeded with PLAN_TEST_ROWS users,
+    used to EXPLAIN the statements the app builds.
+    """
+
+    def __init__(self, url: str):
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        self.engine = create_async_engine(url)
+
+    def run(self, coro):
+        return asyncio.run(coro)
+
+    async def _seed(self, rows: int) -> None:
+        async with self.engine.begin() as conn:
+            existing = (
+                await conn.exec_driver_sql('SELECT count(*) FROM "user"')
+            ).scalar()
+            # Other tests add a few users of their own; a table that
+            # is off by more than that was seeded for another size.
+            seeded = not rows <= existing <= rows + rows // 100
+            if seeded:
+                await conn.exec_driver_sql(
+                    'TRUNCATE "user", user_email CASCADE'
+                )
+                await conn.exec_driver_sql(
+                    "UPDATE user_stats "
+                    "SET total = 0, active = 0, superusers = 0"
+                )
+                await conn.exec_driver_sql(
+                    "TRUNCATE password_reset_nonce"
+                )
+                for trigger in SEED_USER_TRIGGERS:
+                    await conn.exec_driver_sql(
+                        f'ALTER TABLE "user" DISABLE TRIGGER {trigger}'
+                    )
+                await conn.exec_driver_sql(SEED_USERS.format(rows=rows))
+                await conn.exec_driver_sql(SEED_USER_EMAILS)
+                await conn.exec_driver_sql(SEED_USER_STATS)
+                for trigger in SEED_USER_TRIGGERS:
+                    await conn.exec_driver_sql(
+                        f'ALTER TABLE "user" ENABLE TRIGGER {trigger}'
+                    )
+            for table, seed in (
+                ("api_key", SEED_API_KEYS),
+                ("password_reset_nonce", SEED_PASSWORD_RESET_NONCES),
+            ):
+                empty = not (
+                    await conn.exec_driver_sql(
+                        f"SELECT EXISTS (SELECT FROM {table})"
+                    )
+                ).scalar()
+                if empty:
+                    await conn.exec_driver_sql(seed)
+                    seeded = True
+            # Statistics are sampled, so analyzing on every run could
+            # tip plans that are close in cost one way or the other
+            if seeded:
+                await conn.exec_driver_sql(
+                    'ANALYZE "user", user_email, user_stats, api_key, '
+                    'password_reset_nonce'
+                )
+        await self.engine.dispose()
+
+    async def _explain(self, statement, analyze: bool) -> dict:
+        options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+        async with self.engine.connect() as conn:
+            sql = statement.compile(
+                dialect=conn.dialect,
+                compile_kwargs={"literal_binds": True}
+            )
+            plan = (
+                await conn.exec_driver_sql(f"EXPLAIN ({options}) {sql}")
+            ).scalar()
+        await self.engine.dispose()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+
+    async def _sample(self) -> PlanSample:
+        async with self.engine.connect() as conn:
+            row = (
+                await conn.exec_driver_sql(SAMPLE.format(email=EMAIL))
+            ).one()
+        await self.engine.dispose()
+        return PlanSample(EMAIL, *row)
+
+    async def _capture(
+        self,
+        case: Callable[[Any, PlanSample], Awaitable[Any]],
+        sample: PlanSample
+    ) -> list[tuple[str, dict]]:
+        # The app's own engine, so statements issued on sessions the
+        # code opens itself are recorded too.
+        from sqlalchemy import event
+        from sqlmodel.ext.asyncio.session import AsyncSession
+        from src.database import engine
+
+        recorder = StatementRecorder()
+        async with engine.connect() as conn:
+            event.listen(
+                engine.sync_engine, "before_cursor_execute", recorder
+            )
+            try:
+                # Commits only release savepoints; every write is
+                # rolled back with the outer transaction.
+                await conn.begin()
+                session = AsyncSession(
+                    bind=conn,
+                    join_transaction_mode="create_savepoint",
+                    expire_on_commit=False
+                )
+                try:
+                    await case(session, sample)
+                finally:
+                    await session.close()
+                    await conn.rollback()
+            finally:
+                event.remove(
+                    engine.sync_engine, "before_cursor_execute", recorder
+                )
+            plans = []
+            for statement, parameters in recorder.statements:
+                plan = (
+                    await conn.exec_driver_sql(
+                        f"EXPLAIN (FORMAT JSON) {statement}",
+                        parameters or None
+                    )
+                ).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                plans.append((statement, plan[0]["Plan"]))
+        await engine.dispose()
+        return plans
+
+    def seed(self, rows: int) -> None:
+        self.run(self._seed(rows))
+
+    def sample(self) -> PlanSample:
+        return self.run(self._sample())
+
+    def explain(self, statement, analyze: bool = False) -> dict:
+        return self.run(self._explain(statement, analyze))
+
+    def capture(
+        self,
+        case: Callable[[Any, PlanSample], Awaitable[Any]],
+        sample: PlanSample
+    ) -> list[tuple[str, dict]]:
+        """
+        Run `case` against the database and return each statement it
+        issued with its EXPLAIN plan, in order.
+        """
+        return self.run(self._capture(case, sample))
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def is_user_relation(name: str | None) -> bool:
+    # "user" itself or one of its hash partitions, user_p00 ...
+    return name == "user" or (name or "").startswith("user_p")
+
+
+def user_partitions_executed(plan: dict) -> set[str]:
+    """
+    Partitions of "user" an EXPLAIN ANALYZE plan actually read; those
+    pruned at run time show up with no loops.
+    """
+    return {
+        node["Relation Name"]
+        for node in plan_nodes(plan)
+        if is_user_relation(node.get("Relation Name"))
+        and node.get("Actual Loops", 0) > 0
+    }
+
+
+def seq_scanned(plan: dict) -> set[str]:
+    return {
+        node.get("Relation Name")
+        for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan"
+    }
+
+
+def normalize(name: str) -> str:
+    # Which partition a lookup lands on depends on the seeded ids
+    return PARTITION.sub("user_p*", name)
+
+
+def plan_outline(plan: dict, depth: int = 0) -> list[str]:
+    label = plan["Node Type"]
+    if "Index Name" in plan:
+        label += f" using {normalize(plan['Index Name'])}"
+    if "Relation Name" in plan:
+        label += f" on {normalize(plan['Relation Name'])}"
+    lines = ["  " * depth + label]
+    for child in plan.get("Plans", []):
+        lines.extend(plan_outline(child, depth + 1))
+    return lines
+
+
+def plan_summary(statement: str, plan: dict) -> dict:
+    """
+    The parts of a plan kept in a baseline: its shape, cost, and the
+    indexes and sequential scans it relies on.
+    """
+    return {
+        "statement": statement,
+        "outline": plan_outline(plan),
+        "total_cost": plan["Total Cost"],
+        "indexes": sorted({
+            normalize(node["Index Name"])
+            for node in plan_nodes(plan)
+            if "Index Name" in node
+        }),
+        "seq_scans": sorted({
+            normalize(name)
+            for name in seq_scanned(plan)
+            if name
+        }),
+    }
+
+
+def user_seq_scans(summary: dict) -> list[str]:
+    # No request should read every user, so such a plan is never
+    # acceptable, whatever the baseline says
+    return [
+        relation for relation in summary["seq_scans"]
+        if is_user_relation(relation)
+    ]
+
+
+def plan_regressions(
+    baseline: dict,
+    current: dict,
+    cost_tolerance: float
+) -> list[str]:
+    problems = [
+        f"no longer uses {index}"
+        for index in baseline["indexes"]
+        if index not in current["indexes"]
+    ]
+    problems.extend(
+        f"seq scans {relation}" for relation in user_seq_scans(current)
+    )
+    problems.extend(
+        f"now seq scans {relation}"
+        for relation in current["seq_scans"]
+        if relation not in baseline["seq_scans"]
+        and not is_user_relation(relation)
+    )
+    limit = baseline["total_cost"] * cost_tolerance
+    if current["total_cost"] > limit:
+        problems.append(
+            f"costs {current['total_cost']:.2f}, over "
+            f"{limit:.2f} ({cost_tolerance}x the baseline)"
+        )
+    return problems
+
+
+def plan_diff(baseline: list[str], current: list[str]) -> str:
+    return "\n".join(
+        difflib.unified_diff(
+            baseline, current, "baseline", "current", lineterm=""
+        )
+    )
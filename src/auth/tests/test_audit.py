@@ -0,0 +1,124 @@
+import asyncio
+import types
+import uuid
+
+from auth.audit import STAGED, AuditLog, Spool
+from auth.models import utcnow
+
+
+def audit_events(count: int) -> list[dict]:
+    return [
+        {
+            "event_id": uuid.uuid4(),
+            "occurred_at": utcnow(),
+            "action": "user.update",
+            "actor_id": None,
+            "target_id": uuid.uuid4(),
+            "details": {"fields": ["full_name"]},
+        }
+        for _ in range(count)
+    ]
+
+
+def test_segment_is_deleted_once_written(tmp_path):
+    spool = Spool(tmp_path, segment_size=3)
+
+    first = spool.append(audit_events(2))
+    second = spool.append(audit_events(2))
+
+    # The first segment filled up and was closed
+    assert first == second
+    assert spool.append(audit_events(1)) != first
+    spool.written(first, 3)
+    assert first.exists()
+    spool.written(first, 1)
+    assert not first.exists()
+
+
+def test_live_worker_spool_is_not_replayed(tmp_path):
+    live = Spool(tmp_path, segment_size=100)
+    live.append(audit_events(2))
+
+    assert list(Spool(tmp_path, segment_size=100).abandoned()) == []
+
+
+def test_dead_worker_spool_is_replayed_once(tmp_path):
+    dead = Spool(tmp_path, segment_size=100)
+    spooled = audit_events(3)
+    dead.append(spooled)
+    dead.close()
+
+    recovering = Spool(tmp_path, segment_size=100)
+    replayed = list(recovering.abandoned())
+
+    assert [
+        [audit_event["event_id"] for audit_event in events]
+        for _, events in replayed
+    ] == [[audit_event["event_id"] for audit_event in spooled]]
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+
+def test_replay_that_fails_keeps_the_file(tmp_path):
+    dead = Spool(tmp_path, segment_size=100)
+    dead.append(audit_events(1))
+    dead.close()
+
+    for path, _ in Spool(tmp_path, segment_size=100).abandoned():
+        break
+
+    assert path.exists()
+
+
+def test_committed_events_are_spooled_before_they_are_queued(tmp_path):
+    audit_log = AuditLog(
+        queue_size=10,
+        batch_size=10,
+        flush_interval=0.01,
+        spool=Spool(tmp_path, segment_size=100)
+    )
+    session = types.SimpleNamespace(info={})
+    audit_log.capture(session, "user.delete", target_id=uuid.uuid4())
+
+    audit_log._after_commit(session)
+
+    (segment,) = tmp_path.glob("*.jsonl")
+    assert "user.delete" in segment.read_text()
+    assert audit_log._queue.empty()
+    assert STAGED not in session.info
+
+
+def test_replaying_written_events_is_harmless(migrated_database, tmp_path):
+    from sqlalchemy import func, select
+
+    from src.database import async_session, engine
+    from auth.models import AuditEvent
+
+    spooled = audit_events(3)
+
+    async def main():
+        audit_log = AuditLog(
+            queue_size=10,
+            batch_size=2,
+            flush_interval=0.01,
+            spool=Spool(tmp_path, segment_size=100)
+        )
+        await audit_log._write(spooled)
+        dead = Spool(tmp_path, segment_size=100)
+        dead.append(spooled)
+        dead.close()
+
+        assert await audit_log.recover() == 3
+        async with async_session() as session:
+            count = (
+                await session.execute(
+                    select(func.count()).where(
+                        AuditEvent.event_id.in_(
+                            [event["event_id"] for event in spooled]
+                        )
+                    )
+                )
+            ).scalar_one()
+        await engine.dispose()
+        return count
+
+    assert asyncio.run(main()) == 3
@@ -0,0 +1,30 @@
+import uuid
+
+import pytest
+from starlette.requests import Request
+
+from auth.etags import etag_matches, expected_version
+from src.exceptions import UserVersionConflict
+
+
+def request_with(if_match: str) -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(b"if-match", if_match.encode())],
+    })
+
+
+def test_if_match_accepts_the_compressed_weak_etag():
+    user_id = uuid.uuid4()
+
+    assert expected_version(
+        request_with(f'W/"{user_id.hex}-4"'), user_id
+    ) == 4
+    assert etag_matches(f'W/"{user_id.hex}-4"', f'"{user_id.hex}-4"')
+
+
+def test_if_match_for_another_user_conflicts():
+    with pytest.raises(UserVersionConflict):
+        expected_version(
+            request_with(f'"{uuid.uuid4().hex}-4"'), uuid.uuid4()
+        )
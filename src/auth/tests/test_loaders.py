@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from auth.loaders import DataLoader
+
+
+class Backend:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, keys):
+        self.batches.append(keys)
+        await asyncio.sleep(0)
+        if self.fail:
+            raise LookupError("backend down")
+        return {key: key * 10 for key in keys if key > 0}
+
+
+def test_loads_in_one_tick_share_a_batch():
+    backend = Backend()
+
+    async def main():
+        loader = DataLoader(backend, max_batch_size=2)
+        values = await asyncio.gather(
+            loader.load(1), loader.load(2), loader.load(1), loader.load(-1),
+            loader.load(3)
+        )
+        return values, await loader.load(2)
+
+    values, cached = asyncio.run(main())
+
+    assert values == [10, 20, 10, None, 30]
+    assert cached == 20
+    assert backend.batches == [[1, 2], [-1, 3]]
+
+
+def test_batch_errors_reach_every_caller_and_are_not_cached():
+    backend = Backend(fail=True)
+
+    async def main():
+        loader = DataLoader(backend)
+        results = await asyncio.gather(
+            loader.load(1), loader.load(2), return_exceptions=True
+        )
+        backend.fail = False
+        return results, await loader.load(1)
+
+    results, retried = asyncio.run(main())
+
+    assert all(isinstance(result, LookupError) for result in results)
+    assert retried == 10
+    assert backend.batches == [[1, 2], [1]]
+
+
+def test_pending_batches_are_referenced_until_done():
+    async def main():
+        loader = DataLoader(Backend())
+        pending = loader.load(1)
+        await asyncio.sleep(0)
+        running = set(loader._tasks)
+        await pending
+        await asyncio.sleep(0)
+        return running, loader._tasks
+
+    running, after = asyncio.run(main())
+
+    assert len(running) == 1
+    assert after == set()
+
+
+def test_cancelled_caller_does_not_cancel_the_batch():
+    async def main():
+        loader = DataLoader(Backend())
+        first = asyncio.ensure_future(loader.load(1))
+        second = loader.load(1)
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 10
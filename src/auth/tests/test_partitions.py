@@ -0,0 +1,33 @@
+import json
+import uuid
+
+import pytest
+
+from auth.tests.plans import user_partitions_executed
+
+EMAIL = "user4242@example.com"
+
+
+def lookups():
+    from auth import crud
+    from auth.models import User
+
+    user_id = uuid.UUID(int=4242)
+    return {
+        "user_by_id": crud.principal_statement().where(User.id == user_id),
+        "user_by_email": crud.user_by_email_statement(EMAIL),
+        "principal_by_email": crud.principal_statement().where(
+            User.id == crud.email_owner(EMAIL)
+        ),
+    }
+
+
+@pytest.mark.parametrize(
+    "name", ["user_by_id", "user_by_email", "principal_by_email"]
+)
+def test_lookups_read_one_partition(plan_db, name):
+    plan = plan_db.explain(lookups()[name], analyze=True)
+
+    assert len(user_partitions_executed(plan)) == 1, json.dumps(
+        plan, indent=2
+    )
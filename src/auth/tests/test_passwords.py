@@ -0,0 +1,46 @@
+import pytest
+from passlib.context import CryptContext
+
+from auth.utils import password_options, passwd_context
+from src.config import settings
+
+# "password" hashed at 10 rounds
+BCRYPT_10_ROUNDS = (
+    "$2b$10$N9qo8uLOickgx2ZMRZoMyeIjZAgcfl7p92ldGxad68LJZdL17lhWy"
+)
+
+
+def argon2_context(monkeypatch, time_cost: int) -> CryptContext:
+    monkeypatch.setattr(settings, "PASSWORD_SCHEMES", ["argon2"])
+    monkeypatch.setattr(settings, "ARGON2_TIME_COST", time_cost)
+    return CryptContext(
+        schemes=settings.PASSWORD_SCHEMES,
+        deprecated="auto",
+        **password_options()
+    )
+
+
+def test_configured_cost_is_the_minimum(monkeypatch):
+    assert password_options()["bcrypt__min_rounds"] == (
+        settings.BCRYPT_ROUNDS
+    )
+    monkeypatch.setattr(settings, "PASSWORD_SCHEMES", ["argon2"])
+    assert password_options()["argon2__min_rounds"] == (
+        settings.ARGON2_TIME_COST
+    )
+
+
+def test_bcrypt_hash_at_the_old_cost_needs_update():
+    assert settings.BCRYPT_ROUNDS > 10
+    assert passwd_context.needs_update(BCRYPT_10_ROUNDS)
+
+
+@pytest.mark.parametrize("time_cost,needs_update", [(2, True), (3, False)])
+def test_argon2_hash_at_the_old_cost_needs_update(
+    monkeypatch, time_cost, needs_update
+):
+    old_hash = argon2_context(monkeypatch, time_cost).hash("password")
+
+    assert argon2_context(monkeypatch, 3).needs_update(old_hash) is (
+        needs_update
+    )
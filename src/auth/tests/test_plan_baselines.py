@@ -0,0 +1,299 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+
+from auth.tests.plans import (
+    PLAN_TEST_ROWS,
+    plan_diff,
+    plan_regressions,
+    plan_summary,
+    user_seq_scans
+)
+
+BASELINES = Path(__file__).parent / "plan_baselines"
+# Set to rewrite the baselines from the current plans instead of
+# checking against them
+UPDATE_BASELINES = bool(os.getenv("PLAN_UPDATE_BASELINES"))
+PLAN_COST_TOLERANCE = float(os.getenv("PLAN_COST_TOLERANCE", "2.0"))
+
+CASES = [
+    "crud.get_user",
+    "crud.get_user_by_email",
+    "crud.get_auth_principal",
+    "crud.get_auth_principal_by_email",
+    "crud.update_password_hash",
+    "crud.get_user_stats",
+    "crud.get_users_by_ids",
+    "crud.get_user_fields",
+    "crud.create_user",
+    "crud.update_user",
+    "crud.delete_user",
+    "crud.create_api_key",
+    "crud.get_api_keys",
+    "crud.revoke_api_key",
+    "crud.create_password_reset_nonce",
+    "crud.consume_password_reset_nonce",
+    "crud.revoke_password_reset_nonces",
+    "crud.prune_password_reset_nonces",
+    "api_keys.load_entry",
+    "service.search_email_substring",
+    "service.search_fuzzy",
+    "service.search_inactive",
+    "service.search_recently_updated",
+    "service.search_updated_after_cursor",
+    "routers.users.get_users",
+    "routers.users.get_users_fields",
+    "routers.users.get_users_deep_offset",
+    "routers.users.read_users_batch",
+]
+
+
+def cases():
+    """
+    Everything a case awaits runs against the seeded database, and
+    each statement it issues is planned. Writes are rolled back.
+    """
+    from datetime import datetime, timedelta, timezone
+
+    from auth import api_keys, crud
+    from auth.dependencies import create_user_loader
+    from auth.models import (
+        ApiKeyCreate,
+        User,
+        UserCreate,
+        UserUpdate,
+        UsersBatch
+    )
+    from auth.principal import AuthPrincipal
+    from auth.routers import users
+    from auth.service import UserService, encode_cursor
+
+    service = UserService()
+    superuser = AuthPrincipal(
+        id=uuid.UUID(int=0),
+        is_active=True,
+        is_superuser=True,
+        hashed_password=""
+    )
+
+    async def delete_user(session, sample):
+        db_user = await crud.get_user(
+            session=session,
+            user_id=sample.user_id
+        )
+        await crud.delete_user(session=session, db_user=db_user)
+
+    return {
+        "crud.get_user": lambda session, sample: crud.get_user(
+            session=session,
+            user_id=sample.user_id
+        ),
+        "crud.get_user_by_email": lambda session, sample: (
+            crud.get_user_by_email(session=session, email=sample.email)
+        ),
+        "crud.get_auth_principal": lambda session, sample: (
+            crud.get_auth_principal(
+                session=session,
+                user_id=sample.user_id
+            )
+        ),
+        "crud.get_auth_principal_by_email": lambda session, sample: (
+            crud.get_auth_principal_by_email(
+                session=session,
+                email=sample.email
+            )
+        ),
+        "crud.update_password_hash": lambda session, sample: (
+            crud.update_password_hash(
+                session=session,
+                user_id=sample.user_id,
+                verified_hash="not-a-hash",
+                hashed_password="not-a-hash"
+            )
+        ),
+        "crud.get_user_stats": lambda session, sample: (
+            crud.get_user_stats(session=session)
+        ),
+        "crud.get_users_by_ids": lambda session, sample: (
+            crud.get_users_by_ids(
+                session=session,
+                user_ids=sample.user_ids
+            )
+        ),
+        "crud.get_user_fields": lambda session, sample: (
+            crud.get_user_fields(
+                session=session,
+                user_id=sample.user_id,
+                columns=[User.email, User.full_name]
+            )
+        ),
+        "crud.create_user": lambda session, sample: crud.create_user(
+            session=session,
+            user_create=UserCreate(
+                email="plan-baseline@example.com",
+                password="plan-baseline"
+            )
+        ),
+        "crud.update_user": lambda session, sample: crud.update_user(
+            session=session,
+            user_id=sample.user_id,
+            user_in=UserUpdate(full_name="Plan Baseline"),
+            expected_version=1
+        ),
+        "crud.delete_user": delete_user,
+        "crud.create_api_key": lambda session, sample: (
+            crud.create_api_key(
+                session=session,
+                key_in=ApiKeyCreate(
+                    name="plan-baseline",
+                    scopes=["users:read"]
+                ),
+                user_id=sample.user_id
+            )
+        ),
+        "crud.get_api_keys": lambda session, sample: crud.get_api_keys(
+            session=session,
+            user_id=sample.api_key_user_id
+        ),
+        "crud.revoke_api_key": lambda session, sample: (
+            crud.revoke_api_key(
+                session=session,
+                key_id=sample.api_key_id
+            )
+        ),
+        "crud.create_password_reset_nonce": lambda session, sample: (
+            crud.create_password_reset_nonce(
+                session=session,
+                user_id=sample.user_id,
+                expires_at=(
+                    datetime.now(timezone.utc) + timedelta(hours=1)
+                )
+            )
+        ),
+        "crud.consume_password_reset_nonce": lambda session, sample: (
+            crud.consume_password_reset_nonce(
+                session=session,
+                nonce=sample.nonce
+            )
+        ),
+        "crud.revoke_password_reset_nonces": lambda session, sample: (
+            crud.revoke_password_reset_nonces(
+                session=session,
+                user_id=sample.user_id
+            )
+        ),
+        "crud.prune_password_reset_nonces": lambda session, sample: (
+            crud.prune_password_reset_nonces(session=session)
+        ),
+        "api_keys.load_entry": lambda session, sample: (
+            api_keys.load_entry(sample.api_key_prefix)
+        ),
+        "service.search_email_substring": lambda session, sample: (
+            service.search(session=session, q="user4242424", limit=50)
+        ),
+        "service.search_fuzzy": lambda session, sample: service.search(
+            session=session,
+            q=sample.email,
+            fuzzy=True,
+            limit=50
+        ),
+        "service.search_inactive": lambda session, sample: (
+            service.search(session=session, is_active=False, limit=50)
+        ),
+        "service.search_recently_updated": lambda session, sample: (
+            service.search(session=session, sort="-updated_at", limit=50)
+        ),
+        "service.search_updated_after_cursor": lambda session, sample: (
+            service.search(
+                session=session,
+                sort="updated_at",
+                cursor=encode_cursor([
+                    datetime(2020, 1, 1, tzinfo=timezone.utc),
+                    sample.user_id
+                ]),
+                limit=50
+            )
+        ),
+        "routers.users.get_users": lambda session, sample: (
+            users.get_users(session=session, offset=0, limit=100)
+        ),
+        "routers.users.get_users_fields": lambda session, sample: (
+            users.get_users(
+                session=session,
+                offset=0,
+                limit=100,
+                fields="email,full_name"
+            )
+        ),
+        "routers.users.get_users_deep_offset": lambda session, sample: (
+            users.get_users(session=session, offset=100000, limit=100)
+        ),
+        "routers.users.read_users_batch": lambda session, sample: (
+            users.read_users_batch(
+                body=UsersBatch(ids=sample.user_ids),
+                reader=superuser,
+                loader=create_user_loader(session)
+            )
+        ),
+    }
+
+
+def test_every_case_is_listed():
+    if not os.getenv("TEST_DATABASE_URL"):
+        pytest.skip("TEST_DATABASE_URL is not set")
+    assert sorted(cases()) == sorted(CASES)
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_plans_match_baseline(plan_db, plan_sample, name):
+    captured = plan_db.capture(cases()[name], plan_sample)
+    current = [
+        plan_summary(statement, plan) for statement, plan in captured
+    ]
+    path = BASELINES / f"{name}.json"
+    scanned = [
+        f"{summary['statement']}\nseq scans {relation}"
+        for summary in current
+        for relation in user_seq_scans(summary)
+    ]
+    assert not scanned, "\n\n".join(scanned)
+
+    if UPDATE_BASELINES:
+        BASELINES.mkdir(exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {"rows": PLAN_TEST_ROWS, "statements": current},
+                indent=2
+            ) + "\n"
+        )
+        return
+    assert path.exists(), (
+        f"No baseline for {name}; record one with "
+        "PLAN_UPDATE_BASELINES=1"
+    )
+    baseline = json.loads(path.read_text())
+    assert baseline["rows"] == PLAN_TEST_ROWS, (
+        f"Baseline was taken with {baseline['rows']} users, not "
+        f"{PLAN_TEST_ROWS}; unset PLAN_TEST_ROWS to compare against it"
+    )
+
+    expected = baseline["statements"]
+    assert [s["statement"] for s in current] == [
+        s["statement"] for s in expected
+    ], "Statements changed; record a new baseline with " \
+        "PLAN_UPDATE_BASELINES=1"
+    failures = []
+    for before, after in zip(expected, current):
+        problems = plan_regressions(before, after, PLAN_COST_TOLERANCE)
+        if problems:
+            failures.append(
+                "\n".join([
+                    after["statement"],
+                    *problems,
+                    plan_diff(before["outline"], after["outline"])
+                ])
+            )
+    assert not failures, "\n\n".join(failures)
@@ -0,0 +1,42 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from auth.tests.plans import is_user_relation, seq_scanned
+
+SEARCHES = {
+    "email_substring": dict(q="user4242"),
+    "name_substring": dict(q="Name 5f3"),
+    "fuzzy": dict(q="user4242@example.com", fuzzy=True),
+    "superusers": dict(is_superuser=True),
+    "inactive": dict(is_active=False),
+    "inactive_substring": dict(q="example.net", is_active=False),
+    "recently_updated": dict(sort="-updated_at"),
+    "updated_after_cursor": dict(
+        sort="updated_at",
+        cursor=[
+            datetime(2020, 1, 1, tzinfo=timezone.utc),
+            uuid.UUID(int=0)
+        ]
+    ),
+    "email_after_cursor": dict(
+        sort="email",
+        cursor=["user5000000@example.com"]
+    ),
+}
+
+
+@pytest.mark.parametrize("name", SEARCHES)
+def test_search_never_seq_scans_users(plan_db, name):
+    from auth.service import UserService
+
+    statement = UserService().search_statement(
+        limit=51, **SEARCHES[name]
+    )
+    plan = plan_db.explain(statement)
+
+    assert not any(
+        is_user_relation(name) for name in seq_scanned(plan)
+    ), json.dumps(plan, indent=2)
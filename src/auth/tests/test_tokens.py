@@ -0,0 +1,17 @@
+import pytest
+
+from auth.utils import create_access_token, decode_token
+
+
+def test_cached_payload_is_read_only():
+    token = create_access_token("ann")
+    payload = decode_token(token)
+
+    with pytest.raises(TypeError):
+        payload["sub"] = "bob"
+    assert decode_token(token)["sub"] == "ann"
+    assert dict(decode_token(token)) == dict(payload)
+
+
+def test_invalid_token_is_rejected():
+    assert decode_token("garbage") is None
@@ -0,0 +1,114 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+class FakeSession:
+    """
+    Serves `session.get` from a fixed set of users; anything else
+    the route tries is a test failure.
+    """
+
+    def __init__(self, *users):
+        self.users = {user.id: user for user in users}
+
+    async def get(self, model, key):
+        return self.users.get(key)
+
+
+@pytest.fixture
+def app():
+    from main import app
+
+    yield app
+    app.dependency_overrides.clear()
+
+
+def client_as(app, principal, session: FakeSession) -> TestClient:
+    from src.database import get_session
+    from auth.dependencies import get_current_user
+
+    app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_current_user] = lambda: principal
+    return TestClient(app)
+
+
+def test_superuser_cannot_delete_themselves(app):
+    from auth.models import User
+    from auth.principal import AuthPrincipal
+
+    user = User(
+        email="admin@example.com",
+        is_superuser=True,
+        hashed_password="not-a-hash"
+    )
+    principal = AuthPrincipal(
+        id=user.id,
+        is_active=True,
+        is_superuser=True,
+        hashed_password=user.hashed_password
+    )
+
+    response = client_as(app, principal, FakeSession(user)).delete(
+        f"/api/v1/users/{user.id}"
+    )
+
+    assert response.status_code == 403
+
+
+def test_deleting_a_missing_user_is_404(app):
+    from auth.principal import AuthPrincipal
+
+    principal = AuthPrincipal(
+        id=uuid.uuid4(),
+        is_active=True,
+        is_superuser=True,
+        hashed_password="not-a-hash"
+    )
+
+    response = client_as(app, principal, FakeSession()).delete(
+        f"/api/v1/users/{uuid.uuid4()}"
+    )
+
+    assert response.status_code == 404
+
+
+def test_batch_reports_missing_ids_in_request_order(app):
+    from auth.dependencies import get_user_loader, get_user_reader
+    from auth.loaders import DataLoader
+    from auth.models import User
+    from auth.principal import AuthPrincipal
+
+    users = [
+        User(email=f"user{i}@example.com", hashed_password="not-a-hash")
+        for i in range(2)
+    ]
+    missing = uuid.uuid4()
+    batches = []
+
+    async def load_users(user_ids):
+        batches.append(user_ids)
+        return {user.id: user for user in users if user.id in user_ids}
+
+    app.dependency_overrides[get_user_reader] = lambda: AuthPrincipal(
+        id=uuid.uuid4(),
+        is_active=True,
+        is_superuser=True,
+        hashed_password="not-a-hash"
+    )
+    app.dependency_overrides[get_user_loader] = lambda: DataLoader(
+        load_users
+    )
+
+    response = TestClient(app).post(
+        "/api/v1/users/batch",
+        json={"ids": [str(missing), str(users[1].id), str(users[0].id)]}
+    )
+
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["data"]] == [
+        str(users[1].id), str(users[0].id)
+    ]
+    assert response.json()["missing"] == [str(missing)]
+    assert len(batches) == 1
@@ -1,13 +1,62 @@
 import jwt
+import time
+import hashlib
 import logging
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Mapping
+from fastapi.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 
+from src import metrics
+from src.cache import TTLCache
 from src.config import settings
-from src.utils import EmailData, render_email_template
+from src.utils import (
+    EmailData,
+    RateLimitedLogger,
+    render_email_template
+)
+
+logger = logging.getLogger(__name__)
+invalid_token_log = RateLimitedLogger(
+    logger,
+    limit=settings.INVALID_TOKEN_LOG_LIMIT,
+    interval=settings.INVALID_TOKEN_LOG_INTERVAL
+)
+
+
+def password_options() -> dict[str, Any]:
+    """
+    Hashing costs per scheme. The configured cost is also the
+    minimum, so hashes made at a lower cost are rehashed on login.
+    """
+    options = {
+        "bcrypt": {
+            "rounds": settings.BCRYPT_ROUNDS,
+            "min_rounds": settings.BCRYPT_ROUNDS,
+        },
+        "argon2": {
+            "time_cost": settings.ARGON2_TIME_COST,
+            "min_rounds": settings.ARGON2_TIME_COST,
+            "memory_cost": settings.ARGON2_MEMORY_COST,
+            "parallelism": settings.ARGON2_PARALLELISM,
+        },
+    }
+    return {
+        f"{scheme}__{key}": value
+        for scheme in settings.PASSWORD_SCHEMES
+        for key, value in options.get(scheme, {}).items()
+    }
+
 
-passwd_context = CryptContext(schemes=["bcrypt"])
+passwd_context = CryptContext(
+    schemes=settings.PASSWORD_SCHEMES,
+    deprecated="auto",
+    **password_options()
+)
+
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE)
+metrics.register("token_cache", token_cache.stats)
 
 ACCESS_TOKEN_EXPIRY = settings.JWT_EXPIRY
 REFRESH_TOKEN_EXPIRY = settings.JWT_EXPIRY
@@ -15,14 +64,27 @@ REFRESH_TOKEN_EXPIRY = settings.JWT_EXPIRY
 JWT_ALGORITHM = "HS256"
 
 
-def generate_password_hash(password: str) -> str:
-    hash = passwd_context.hash(password)
+# Hashing holds a core for tens of milliseconds, so it runs in the
+# thread pool rather than on the event loop.
+async def generate_password_hash(password: str) -> str:
+    return await run_in_threadpool(passwd_context.hash, password)
+
 
-    return hash
+async def verify_password(password: str, hash: str) -> bool:
+    return await run_in_threadpool(passwd_context.verify, password, hash)
 
 
-def verify_password(password: str, hash: str) -> bool:
-    return passwd_context.verify(password, hash)
+async def verify_and_update_password(
+    password: str,
+    hash: str
+) -> tuple[bool, str | None]:
+    """
+    Verify `password` and, when `hash` uses a deprecated scheme or
+    outdated cost, also return its replacement hash.
+    """
+    return await run_in_threadpool(
+        passwd_context.verify_and_update, password, hash
+    )
 
 
 def create_access_token(
@@ -46,20 +108,46 @@ def create_access_token(
     return token
 
 
-def decode_token(token: str) -> dict:
+def token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(
+        token.encode(), digest_size=16
+    ).digest()
+
+
+def decode_token(token: str) -> Mapping[str, Any] | None:
+    """
+    The claims of a validly signed, unexpired token. Cached payloads
+    are shared between requests, so they are handed out read-only.
+    """
+    key = token_cache_key(token)
+    token_data = token_cache.get(key)
+    if token_data is not None:
+        return token_data
+
     try:
-        token_data = jwt.decode(
+        token_data = MappingProxyType(jwt.decode(
             jwt=token,
             key=settings.SECRET_KEY,
             algorithms=[JWT_ALGORITHM]
-        )
-
-        return token_data
-
+        ))
     except jwt.PyJWTError as e:
-        logging.exception(e)
+        invalid_token_log.warning(
+            "Rejected token: %s", type(e).__name__
+        )
         return None
 
+    exp = token_data.get("exp")
+    token_cache.set(
+        key,
+        token_data,
+        ttl=(
+            min(exp - time.time(), settings.TOKEN_CACHE_TTL)
+            if exp is not None
+            else settings.TOKEN_CACHE_TTL
+        )
+    )
+    return token_data
+
 
 async def generate_reset_password_email(
     email_to: str,
@@ -109,15 +197,25 @@ def generate_new_account_email(
     )
 
 
-def generate_password_reset_token(email: str) -> str:
-    delta = timedelta(
+def password_reset_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(
         hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS
     )
+
+
+def generate_password_reset_token(
+    email: str,
+    nonce: str,
+    expires: datetime
+) -> str:
     now = datetime.now(timezone.utc)
-    expires = now + delta
-    exp = expires.timestamp()
     encoded_jwt = jwt.encode(
-        {"exp": exp, "nbf": now, "sub": email},
+        {
+            "exp": expires.timestamp(),
+            "nbf": now,
+            "sub": email,
+            "jti": nonce
+        },
         settings.SECRET_KEY,
         algorithm=JWT_ALGORITHM,
     )
@@ -126,9 +224,16 @@ def generate_password_reset_token(email: str) -> str:
 
 def verify_password_reset_token(
         token: str
-) -> str | None:
-    try:
-        decoded_token = decode_token(token)
-        return str(decoded_token["sub"])
-    except jwt.InvalidTokenError:
+) -> tuple[str, str] | None:
+    """
+    The `(email, nonce)` of a validly signed, unexpired reset token.
+    Whether the nonce is still unused is up to the caller.
+    """
+    decoded_token = decode_token(token)
+    if (
+        not decoded_token
+        or "sub" not in decoded_token
+        or "jti" not in decoded_token
+    ):
         return None
+    return str(decoded_token["sub"]), str(decoded_token["jti"])
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    Bounded LRU mapping whose entries expire after a per-entry ttl.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float | None = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[
+            Hashable, tuple[float | None, Any]
+        ] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: float | None = None
+    ) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        if ttl is not None and ttl <= 0:
+            return
+        expires_at = (
+            time.monotonic() + ttl
+            if ttl is not None
+            else None
+        )
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def prune(self, predicate: Callable[[Any], bool]) -> int:
+        stale = [
+            key for key, (_, value) in self._data.items()
+            if predicate(value)
+        ]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,286 @@
+import asyncio
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from src import metrics
+from src.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer around the stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def accepted_encodings(header: str) -> dict[str, float]:
+    encodings = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            encodings[name.lower()] = quality
+    return encodings
+
+
+def choose_encoding(header: str) -> str | None:
+    encodings = accepted_encodings(header)
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for name in supported:
+        quality = encodings.get(name, encodings.get("*", 0.0))
+        # Ties keep the earlier, denser encoding
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def weak_etag(etag: bytes) -> bytes:
+    # The compressed bytes differ from the identity representation's,
+    # so they only share a weak validator
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+def vary_on_encoding(values: list[bytes]) -> bytes:
+    fields = [
+        field.strip()
+        for value in values
+        for field in value.split(b",")
+        if field.strip()
+    ]
+    lowered = [field.lower() for field in fields]
+    if b"*" in lowered or b"accept-encoding" in lowered:
+        return b", ".join(fields)
+    return b", ".join(fields + [b"Accept-Encoding"])
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, whichever the client
+    prefers and is available.
+
+    Responses whose content type is not in `content_types` go out
+    untouched; those smaller than `minimum_size` go out uncompressed
+    but still with `Vary: Accept-Encoding`. A response sent in one
+    piece is compressed on the event loop when small and in a thread
+    pool once it reaches `thread_threshold`. A streamed response is
+    compressed chunk by chunk, with each chunk flushed as it is sent,
+    so the body is never buffered.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = settings.COMPRESSION_MIN_SIZE,
+        thread_threshold: int = settings.COMPRESSION_THREAD_THRESHOLD,
+        content_types: list[str] = settings.COMPRESSION_CONTENT_TYPES,
+        gzip_level: int = settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = settings.COMPRESSION_BROTLI_QUALITY,
+        executor: ThreadPoolExecutor | None = None
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_threshold = thread_threshold
+        self.content_types = tuple(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=settings.COMPRESSION_THREADS,
+            thread_name_prefix="compression"
+        )
+        self.compressed = 0
+        self.offloaded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        metrics.register("compression", self.stats)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "compressed": self.compressed,
+            "offloaded": self.offloaded,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": (
+                self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+            ),
+        }
+
+    def encoder(self, name: str) -> GzipEncoder | BrotliEncoder:
+        if name == "br":
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+    async def run(self, size: int, fn: Callable[[], bytes]) -> bytes:
+        if size < self.thread_threshold:
+            return fn()
+        self.offloaded += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, fn
+        )
+
+    def compressible(self, headers: list[tuple[bytes, bytes]]) -> bool:
+        content_type = b""
+        for key, value in headers:
+            key = key.lower()
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").lower().startswith(
+            self.content_types
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept = dict(scope["headers"]).get(b"accept-encoding", b"")
+        encoding = choose_encoding(accept.decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict | None = None
+        encoder: GzipEncoder | BrotliEncoder | None = None
+        passthrough = False
+
+        def encoded_headers(content_length: int | None):
+            headers = [(b"content-encoding", encoding.encode())]
+            vary = []
+            for key, value in start["headers"]:
+                key = key.lower()
+                if key == b"vary":
+                    vary.append(value)
+                elif key == b"etag":
+                    headers.append((key, weak_etag(value)))
+                elif key != b"content-length":
+                    headers.append((key, value))
+            headers.append((b"vary", vary_on_encoding(vary)))
+            if content_length is not None:
+                headers.append(
+                    (b"content-length", str(content_length).encode())
+                )
+            return headers
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = list(message.get("headers", []))
+                start["headers"] = headers
+                passthrough = (
+                    message["status"] < 200
+                    or message["status"] in (204, 304)
+                    or not self.compressible(headers)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None and not more_body:
+                # Whole body in one message: compress it in one go
+                if len(body) < self.minimum_size:
+                    # Larger responses from the same route are encoded,
+                    # so caches must still key this one on the encoding
+                    passthrough = True
+                    vary = [
+                        value for key, value in start["headers"]
+                        if key.lower() == b"vary"
+                    ]
+                    start["headers"] = [
+                        (key, value) for key, value in start["headers"]
+                        if key.lower() != b"vary"
+                    ] + [(b"vary", vary_on_encoding(vary))]
+                    await send(start)
+                    await send(message)
+                    return
+                one_shot = self.encoder(encoding)
+                compressed = await self.run(
+                    len(body),
+                    lambda: one_shot.compress(body) + one_shot.finish()
+                )
+                self.compressed += 1
+                self.record(len(body), len(compressed))
+                start["headers"] = encoded_headers(len(compressed))
+                await send(start)
+                await send({
+                    "type": "http.response.body",
+                    "body": compressed
+                })
+                return
+
+            if encoder is None:
+                # Streamed body: the final size is unknown up front
+                encoder = self.encoder(encoding)
+                self.compressed += 1
+                start["headers"] = encoded_headers(None)
+                await send(start)
+
+            stream = encoder
+            if more_body:
+                chunk = await self.run(
+                    len(body),
+                    lambda: stream.compress(body) + stream.flush()
+                )
+            else:
+                chunk = await self.run(
+                    len(body),
+                    lambda: stream.compress(body) + stream.finish()
+                )
+            self.record(len(body), len(chunk))
+            await send({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": more_body
+            })
+
+        await self.app(scope, receive, send_wrapper)
+
+    def record(self, size_in: int, size_out: int) -> None:
+        self.bytes_in += size_in
+        self.bytes_out += size_out
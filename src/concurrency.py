@@ -0,0 +1,205 @@
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from src import metrics
+from src.config import settings
+
+# Monotonic time by which the current request must finish
+request_deadline: ContextVar[float | None] = ContextVar(
+    "request_deadline", default=None
+)
+
+# Routes that hash passwords; bcrypt makes them far more expensive
+# than anything else, so they get their own budget.
+AUTH_ROUTES = (
+    "/login",
+    "/password-recovery",
+    "/reset-password",
+    f"{settings.API_PREFIX}/users/register",
+    f"{settings.API_PREFIX}/users/create_user",
+    f"{settings.API_PREFIX}/users/profile/password",
+)
+
+# Routes that are slow on purpose, such as sampling the worker for a
+# while. They run without a deadline and outside the AIMD limits, so
+# they neither time out nor drag the limit down.
+UNLIMITED_ROUTES = (
+    f"{settings.API_PREFIX}/debug/profile",
+)
+
+
+def remaining_time() -> float | None:
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def classify_route(method: str, path: str) -> str:
+    if path.startswith(AUTH_ROUTES):
+        return "auth"
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "read"
+    return "write"
+
+
+class AIMDLimit:
+    """
+    Additive-increase/multiplicative-decrease concurrency limit.
+
+    The limit grows by 1/limit per fast response while it is being
+    used and shrinks by `backoff` whenever a request is slower than
+    `target_latency` or times out.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial: float,
+        min_limit: float,
+        max_limit: float,
+        target_latency: float,
+        backoff: float = 0.9
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.accepted += 1
+        return True
+
+    def release(self, latency: float, dropped: bool = False) -> None:
+        utilized = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+        if dropped or latency > self.target_latency:
+            self.dropped += dropped
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif utilized:
+            self.limit = min(
+                self.max_limit, self.limit + 1 / self.limit
+            )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
+
+
+def create_limits() -> dict[str, AIMDLimit]:
+    limits = {
+        route_class: AIMDLimit(**options)
+        for route_class, options in settings.CONCURRENCY_LIMITS.items()
+    }
+    metrics.register(
+        "concurrency",
+        lambda: {name: limit.stats() for name, limit in limits.items()}
+    )
+    return limits
+
+
+async def send_error(
+    send: Callable,
+    status_code: int,
+    message: str,
+    error_code: str
+) -> None:
+    body = json.dumps(
+        {"message": message, "error_code": error_code}
+    ).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", b"1"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    Sheds load before it queues up on the DB pool: each route class
+    admits at most its current AIMD limit of requests and rejects the
+    rest with 503. Admitted requests run under a deadline that
+    cancels their pending queries once it passes. Routes under
+    `unlimited` bypass both.
+    """
+
+    def __init__(
+        self,
+        app,
+        limits: dict[str, AIMDLimit] | None = None,
+        classify: Callable[[str, str], str] = classify_route,
+        timeout: float = settings.REQUEST_TIMEOUT,
+        unlimited: tuple[str, ...] = UNLIMITED_ROUTES
+    ):
+        self.app = app
+        self.limits = limits if limits is not None else create_limits()
+        self.classify = classify
+        self.timeout = timeout
+        self.unlimited = unlimited
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.unlimited)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits[
+            self.classify(scope["method"], scope["path"])
+        ]
+        if not limit.try_acquire():
+            await send_error(
+                send, 503,
+                "Server is overloaded, please retry",
+                "overloaded"
+            )
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        started = time.monotonic()
+        token = request_deadline.set(started + self.timeout)
+        dropped = False
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self.app(scope, receive, send_wrapper)
+        except TimeoutError:
+            dropped = True
+            if not response_started:
+                await send_error(
+                    send, 504,
+                    "Request took too long",
+                    "deadline_exceeded"
+                )
+        finally:
+            request_deadline.reset(token)
+            limit.release(time.monotonic() - started, dropped)
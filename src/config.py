@@ -24,6 +24,133 @@ class Settings(BaseSettings):
     SMTP_SSL: bool | None = None
     SMTP_TLS: bool | None = None
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Versioned routers are mounted under this prefix
+    API_PREFIX: str = "/api/v1"
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # 0 picks one worker per available CPU
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEP_ALIVE: int = 5
+    # Recycle a worker after this many requests, 0 disables it; only
+    # applies with more than one worker, nothing restarts a lone process
+    SERVER_MAX_REQUESTS: int = 10000
+    # Each worker adds up to this many requests so they don't all
+    # restart at once
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+    SERVER_ACCESS_LOG: bool = False
+    TOKEN_CACHE_SIZE: int = 10000
+    # Upper bound on how long a verified token is trusted from cache
+    TOKEN_CACHE_TTL: int = 300
+    INVALID_TOKEN_LOG_LIMIT: int = 10
+    INVALID_TOKEN_LOG_INTERVAL: int = 60
+    USER_VALIDATOR_CACHE_SIZE: int = 10000
+    USER_VALIDATOR_CACHE_TTL: int = 30
+    # Soft-deleted users are kept this long before being purged
+    USER_PURGE_RETENTION_HOURS: int = 168
+    USER_PURGE_BATCH_SIZE: int = 500
+    USER_PURGE_MAX_ROWS_PER_SECOND: float = 2000
+    USER_PURGE_INTERVAL: int = 300
+    USER_BATCH_MAX_IDS: int = 100
+    PASSWORD_RESET_NONCE_PRUNE_INTERVAL: int = 3600
+    # When to recount users and correct drift in user_stats (UTC cron)
+    USER_STATS_RECONCILE_CRON: str = "17 3 * * *"
+    # Without leader election every worker runs every job; only for
+    # single-process deployments
+    SCHEDULER_LEADER_ELECTION: bool = True
+    SCHEDULER_ELECTION_INTERVAL: float = 5.0
+    # Running jobs get this long to finish at shutdown
+    SCHEDULER_SHUTDOWN_TIMEOUT: float = 10.0
+    # Random delay added to each run so workers don't fire in lockstep
+    SCHEDULER_JITTER: float = 5.0
+    # "postgres" (LISTEN/NOTIFY) or "local" for single-process runs
+    INVALIDATION_TRANSPORT: str = "postgres"
+    INVALIDATION_CHANNEL: str = "cache_invalidation"
+    INVALIDATION_BATCH_DELAY: float = 0.05
+    INVALIDATION_BATCH_SIZE: int = 1000
+    INVALIDATION_HEALTHCHECK_INTERVAL: float = 10.0
+    # Per-request deadline; pending queries are cancelled once it passes
+    REQUEST_TIMEOUT: float = 10.0
+    # Ceiling for any single asyncpg command, deadline or not
+    DB_COMMAND_TIMEOUT: float = 30.0
+    ACTIVITY_BUFFER_MAX_USERS: int = 50000
+    ACTIVITY_FLUSH_BATCH_SIZE: int = 1000
+    ACTIVITY_FLUSH_INTERVAL: float = 30.0
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL: float = 1.0
+    # Each worker spools committed events here until they are written.
+    # Absolute, so workers started from any directory share (and
+    # replay) one spool; it must be writable and survive restarts
+    AUDIT_SPOOL_DIR: str = "/var/lib/auth/audit-spool"
+    AUDIT_SPOOL_SEGMENT_SIZE: int = 10000
+    # How often workers look for spool files left by dead workers
+    AUDIT_SPOOL_RECOVER_INTERVAL: int = 60
+    # The first scheme hashes new passwords; hashes in the others, or
+    # with weaker parameters, are upgraded on the next login
+    PASSWORD_SCHEMES: list[str] = ["bcrypt"]
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    API_KEY_CACHE_SIZE: int = 10000
+    # How long a resolved key is trusted without asking the database;
+    # revocations reach every worker sooner through invalidation
+    API_KEY_CACHE_TTL: int = 300
+    API_KEY_NEGATIVE_CACHE_TTL: int = 30
+    # Responses to requests carrying an Idempotency-Key are replayed
+    # for retries within this many seconds
+    IDEMPOTENCY_TTL: int = 86400
+    # "postgres" shares keys between workers; "local" is only for
+    # single-process runs
+    IDEMPOTENCY_STORE: str = "postgres"
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    # A claimed key whose request has not finished within this many
+    # seconds can be claimed by a retry
+    IDEMPOTENCY_LOCK_TIMEOUT: float = 60.0
+    IDEMPOTENCY_POLL_INTERVAL: float = 0.1
+    IDEMPOTENCY_PRUNE_INTERVAL: int = 3600
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = 65536
+    # Responses below this many bytes are not worth compressing
+    COMPRESSION_MIN_SIZE: int = 1024
+    # Bodies (or streamed chunks) this large are compressed off the loop
+    COMPRESSION_THREAD_THRESHOLD: int = 262144
+    COMPRESSION_THREADS: int = 2
+    COMPRESSION_CONTENT_TYPES: list[str] = [
+        "application/json",
+        "text/",
+    ]
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    # Records beyond this many waiting to be written are dropped
+    LOG_QUEUE_SIZE: int = 10000
+    # Fraction of sub-WARNING records kept, per logger name prefix
+    LOG_SAMPLING: dict[str, float] = {
+        "sqlalchemy.engine": 0.01,
+        "uvicorn.access": 0.1,
+    }
+    DB_ECHO: bool = False
+    PROFILE_INTERVAL: float = 0.005
+    PROFILE_REQUEST_KEEP: int = 32
+    PROFILE_REQUEST_TTL: int = 3600
+    CONCURRENCY_LIMITS: dict[str, dict[str, float]] = {
+        "read": {
+            "initial": 64, "min_limit": 8,
+            "max_limit": 512, "target_latency": 0.25
+        },
+        "write": {
+            "initial": 32, "min_limit": 4,
+            "max_limit": 256, "target_latency": 0.5
+        },
+        "auth": {
+            "initial": 8, "min_limit": 2,
+            "max_limit": 64, "target_latency": 1.0
+        },
+    }
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
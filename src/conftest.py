@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# The app imports modules both as `src.*` and as `auth.*`.
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+# Enough configuration to import the app. Nothing connects to the
+# database unless a test asks for it.
+for name, value in {
+    "DATABASE_URL": "postgresql+asyncpg://postgres@localhost/test",
+    "SECRET_KEY": "test-secret-key",
+    "JWT_EXPIRY": "60",
+    "PROJECT_NAME": "test",
+    "BACKEND_CORS_ORIGINS": '["http://localhost"]',
+    "EMAILS_FROM_NAME": "test",
+    "EMAILS_FROM_EMAIL": "test@example.com",
+    "AUDIT_SPOOL_DIR": tempfile.mkdtemp(prefix="audit-spool-"),
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture(scope="session")
+def migrated_database() -> str:
+    """
+    URL of the test database, migrated to head.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    command.upgrade(config, "head")
+    return TEST_DATABASE_URL
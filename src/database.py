@@ -1,16 +1,72 @@
+import time
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, status
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 import os
 
+from src.concurrency import request_deadline
+from src.config import settings
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=settings.DB_ECHO,
+    future=True,
+    connect_args={
+        "command_timeout": settings.DB_COMMAND_TIMEOUT
+    }
+)
 
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Awaited with each request's session once the request is done
+session_teardown_hooks: list[
+    Callable[[AsyncSession], Awaitable[None]]
+] = []
+
+
+def statement_timeout(deadline: float) -> Callable:
+    """
+    `after_begin` listener that sets the transaction's
+    statement_timeout to what is left of the request's time budget
+    when the transaction begins. The budget is fixed from then on, so
+    each statement of a longer transaction may still run past the
+    deadline; the middleware cancels those queries once it passes.
+    """
+    def set_statement_timeout(session, transaction, connection):
+        remaining = max(int((deadline - time.monotonic()) * 1000), 1)
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {remaining}"
+        )
+
+    return set_statement_timeout
+
+
 async def get_session():
+    deadline = request_deadline.get()
+    if deadline is not None and deadline <= time.monotonic():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Request deadline exceeded"
+        )
     async with async_session() as session:
-        yield session
+        if deadline is not None:
+            # Per transaction, since SET LOCAL ends with each commit
+            event.listen(
+                session.sync_session,
+                "after_begin",
+                statement_timeout(deadline)
+            )
+        try:
+            yield session
+        finally:
+            for hook in session_teardown_hooks:
+                await hook(session)
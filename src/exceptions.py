@@ -1,8 +1,12 @@
+import logging
 from typing import Any, Callable
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
 from fastapi import FastAPI, status
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+
+logger = logging.getLogger(__name__)
 
 
 class BaseException(Exception):
@@ -59,6 +63,18 @@ class UserNotFound(BaseException):
     pass
 
 
+class UserVersionConflict(BaseException):
+    """User was modified since the version the client based its update on."""
+
+    pass
+
+
+def violated_constraint(exc: IntegrityError) -> str | None:
+    # asyncpg's own error, which names the constraint, is the cause of
+    # the DBAPI error SQLAlchemy wraps
+    return getattr(exc.orig.__cause__, "constraint_name", None)
+
+
 def create_exception_handler(
     status_code: int, initial_detail: Any
 ) -> Callable[[Request, Exception], JSONResponse]:
@@ -162,6 +178,23 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    version_conflict_handler = create_exception_handler(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        initial_detail={
+            "message": "User was modified by another request",
+            "resolution": "Fetch the user again and retry",
+            "error_code": "user_version_conflict",
+        },
+    )
+    app.add_exception_handler(
+        UserVersionConflict,
+        version_conflict_handler
+    )
+    app.add_exception_handler(
+        StaleDataError,
+        version_conflict_handler
+    )
+
     @app.exception_handler(500)
     async def internal_server_error(request, exc):
 
@@ -176,11 +209,27 @@ def register_all_errors(app: FastAPI):
 
     @app.exception_handler(SQLAlchemyError)
     async def database__error(request, exc):
-        print(str(exc))
+        logger.error("Database error: %s", exc)
         return JSONResponse(
             content={
                 "message": "Oops! Something went wrong",
                 "error_code": "server_error",
             },
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
\ No newline at end of file
+        )
+
+    # Two requests racing to claim the same email both pass the
+    # existence check; the loser trips user_email's primary key.
+    email_taken_handler = create_exception_handler(
+        status_code=status.HTTP_409_CONFLICT,
+        initial_detail={
+            "message": "User with email already exists",
+            "error_code": "user_exists",
+        },
+    )
+
+    @app.exception_handler(IntegrityError)
+    async def integrity_error(request, exc):
+        if violated_constraint(exc) == "user_email_pkey":
+            return await email_taken_handler(request, exc)
+        return await database__error(request, exc)
\ No newline at end of file
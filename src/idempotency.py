@@ -0,0 +1,478 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    LargeBinary,
+    and_,
+    func,
+    or_
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Field, SQLModel, delete, select, update
+
+from src import metrics
+from src.cache import TTLCache
+from src.config import settings
+
+# POST routes whose retries must not run the handler twice: they hash
+# passwords, create rows or send email.
+IDEMPOTENT_ROUTES = (
+    "/password-recovery/",
+    "/api/v1/users/register",
+    "/api/v1/users/create_user",
+)
+
+MAX_KEY_LENGTH = 255
+
+
+@dataclass(frozen=True, slots=True)
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+
+@dataclass(frozen=True, slots=True)
+class Claim:
+    """
+    Outcome of claiming a key: either this request owns it and runs
+    the handler, or another request with `fingerprint` got there first
+    and `response` is what it stored, if it has finished.
+    """
+    owned: bool
+    fingerprint: str | None = None
+    response: StoredResponse | None = None
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    __tablename__ = "idempotency_key"
+
+    key: str = Field(primary_key=True, max_length=64)
+    fingerprint: str = Field(max_length=64)
+    # Null while the owning request is still running
+    status: int | None = None
+    headers: list[list[str]] | None = Field(
+        default=None,
+        sa_column=Column(JSONB, nullable=True)
+    )
+    body: bytes | None = Field(
+        default=None,
+        sa_column=Column(LargeBinary, nullable=True)
+    )
+    locked_until: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
+    expires_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            index=True
+        )
+    )
+
+
+class LocalIdempotencyStore:
+    """
+    Keys kept in this process only. Meant for tests and
+    single-process runs: a retry reaching another worker would run
+    the handler again.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.responses = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.in_flight: dict[str, tuple[str, asyncio.Event]] = {}
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        stored = self.responses.get(key)
+        if stored is not None:
+            return Claim(False, stored.fingerprint, stored)
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            return Claim(False, pending[0])
+        self.in_flight[key] = (fingerprint, asyncio.Event())
+        return Claim(True)
+
+    async def wait(self, key: str, timeout: float) -> None:
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(timeout):
+                    await pending[1].wait()
+
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        self.responses.set(key, response)
+        self._finish(key)
+
+    async def release(self, key: str, fingerprint: str) -> None:
+        self._finish(key)
+
+    async def prune(self) -> int:
+        return 0
+
+    def _finish(self, key: str) -> None:
+        pending = self.in_flight.pop(key, None)
+        if pending is not None:
+            pending[1].set()
+
+
+class PostgresIdempotencyStore:
+    """
+    Keys shared by every worker through the idempotency_key table.
+
+    A request claims its key with a single INSERT ... ON CONFLICT, so
+    exactly one worker runs the handler. The claim is a lease: if its
+    owner dies without finishing, the key can be claimed again once
+    `lock_timeout` passes. Other workers poll the row until the
+    response is stored.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        ttl: float,
+        lock_timeout: float
+    ):
+        self.engine = engine
+        self.ttl = timedelta(seconds=ttl)
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        record = IdempotencyRecord
+        statement = insert(record).values(
+            key=key,
+            fingerprint=fingerprint,
+            locked_until=func.now() + self.lock_timeout,
+            expires_at=func.now() + self.ttl
+        )
+        # An expired key, or one whose owner's lease ran out, is
+        # taken over as if it were new.
+        statement = statement.on_conflict_do_update(
+            index_elements=[record.key],
+            set_={
+                "fingerprint": statement.excluded.fingerprint,
+                "status": None,
+                "headers": None,
+                "body": None,
+                "locked_until": statement.excluded.locked_until,
+                "expires_at": statement.excluded.expires_at,
+            },
+            where=or_(
+                record.expires_at <= func.now(),
+                and_(
+                    record.status.is_(None),
+                    record.locked_until <= func.now()
+                )
+            )
+        ).returning(record.key)
+        async with self.engine.begin() as conn:
+            if (await conn.execute(statement)).first() is not None:
+                return Claim(True)
+            row = (
+                await conn.execute(
+                    select(
+                        record.fingerprint,
+                        record.status,
+                        record.headers,
+                        record.body
+                    ).where(record.key == key)
+                )
+            ).first()
+        if row is None:
+            # Released in between; the caller claims again
+            return Claim(False, fingerprint)
+        if row.status is None:
+            return Claim(False, row.fingerprint)
+        return Claim(
+            False,
+            row.fingerprint,
+            StoredResponse(
+                fingerprint=row.fingerprint,
+                status=row.status,
+                headers=[
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in row.headers
+                ],
+                body=row.body
+            )
+        )
+
+    async def wait(self, key: str, timeout: float) -> None:
+        await asyncio.sleep(timeout)
+
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                update(IdempotencyRecord)
+                .where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.fingerprint == response.fingerprint
+                )
+                .values(
+                    status=response.status,
+                    headers=[
+                        [name.decode("latin-1"), value.decode("latin-1")]
+                        for name, value in response.headers
+                    ],
+                    body=response.body
+                )
+            )
+
+    async def release(self, key: str, fingerprint: str) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.fingerprint == fingerprint,
+                    IdempotencyRecord.status.is_(None)
+                )
+            )
+
+    async def prune(self) -> int:
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.expires_at <= func.now()
+                )
+            )
+        return result.rowcount
+
+
+IdempotencyStore = LocalIdempotencyStore | PostgresIdempotencyStore
+
+
+def create_store() -> IdempotencyStore:
+    if settings.IDEMPOTENCY_STORE == "local":
+        return LocalIdempotencyStore(
+            ttl=settings.IDEMPOTENCY_TTL,
+            maxsize=settings.IDEMPOTENCY_CACHE_SIZE
+        )
+    from src.database import engine
+
+    return PostgresIdempotencyStore(
+        engine,
+        ttl=settings.IDEMPOTENCY_TTL,
+        lock_timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT
+    )
+
+
+idempotency_store = create_store()
+
+
+async def send_json(
+    send: Callable,
+    status_code: int,
+    message: str,
+    error_code: str
+) -> None:
+    body = json.dumps(
+        {"message": message, "error_code": error_code}
+    ).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_body(receive: Callable) -> bytes | None:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def caller_identity(headers: dict[bytes, bytes]) -> str:
+    # Keys are chosen by clients, so they are only unique per caller
+    credentials = (
+        headers.get(b"authorization", b"")
+        + b"\0"
+        + headers.get(b"x-api-key", b"")
+    )
+    return hashlib.blake2b(credentials, digest_size=16).hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    Honours an `Idempotency-Key` header on the configured POST routes.
+
+    The first request with a key runs normally and its response is
+    kept in `store` for IDEMPOTENCY_TTL seconds; retries with the same
+    key and body get that response back without running the handler,
+    and duplicates arriving while it is still running wait for it.
+    Reusing a key for a different body is rejected with 422. Server
+    errors are not kept, so those requests can be retried for real.
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: tuple[str, ...] = IDEMPOTENT_ROUTES,
+        store: IdempotencyStore | None = None,
+        max_response_bytes: int = settings.IDEMPOTENCY_MAX_RESPONSE_BYTES,
+        poll_interval: float = settings.IDEMPOTENCY_POLL_INTERVAL
+    ):
+        self.app = app
+        self.routes = routes
+        self.store = store or idempotency_store
+        self.max_response_bytes = max_response_bytes
+        self.poll_interval = poll_interval
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.mismatched = 0
+        metrics.register("idempotency", self.stats)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "mismatched": self.mismatched,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.routes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await send_json(
+                send, 400,
+                "Invalid Idempotency-Key header",
+                "invalid_idempotency_key"
+            )
+            return
+
+        body = await read_body(receive)
+        if body is None:
+            return
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = hashlib.sha256(
+            b"\0".join([
+                caller_identity(headers).encode(),
+                scope["path"].encode(),
+                idempotency_key
+            ])
+        ).hexdigest()
+
+        while True:
+            claim = await self.store.claim(key, fingerprint)
+            if claim.owned:
+                break
+            if claim.fingerprint != fingerprint:
+                await self.reject_mismatch(send)
+                return
+            if claim.response is not None:
+                self.replayed += 1
+                await self.replay(claim.response, send)
+                return
+            # If the first request fails, the next claim takes over
+            self.waited += 1
+            await self.store.wait(key, self.poll_interval)
+
+        self.executed += 1
+        response = None
+        try:
+            response = await self.execute(
+                scope, receive, send, body, fingerprint
+            )
+        finally:
+            # Shielded so a cancelled request still settles its key
+            if response is not None:
+                await asyncio.shield(self.store.complete(key, response))
+            else:
+                await asyncio.shield(
+                    self.store.release(key, fingerprint)
+                )
+
+    async def execute(
+        self,
+        scope,
+        receive: Callable,
+        send: Callable,
+        body: bytes,
+        fingerprint: str
+    ) -> StoredResponse | None:
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {
+                    "type": "http.request",
+                    "body": body,
+                    "more_body": False
+                }
+            return await receive()
+
+        status = 500
+        response_headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_response_bytes:
+                    chunks.append(chunk)
+            await send(message)
+
+        await self.app(scope, replay_receive, send_wrapper)
+        if status >= 500 or status == 429 or size > self.max_response_bytes:
+            return None
+        return StoredResponse(
+            fingerprint=fingerprint,
+            status=status,
+            headers=response_headers,
+            body=b"".join(chunks)
+        )
+
+    async def replay(self, stored: StoredResponse, send: Callable) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [
+                (b"idempotent-replayed", b"true")
+            ],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
+
+    async def reject_mismatch(self, send: Callable) -> None:
+        self.mismatched += 1
+        await send_json(
+            send, 422,
+            "Idempotency-Key was already used for a different request",
+            "idempotency_key_reused"
+        )
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Hashable, Iterable
+
+import asyncpg
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from src import metrics
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+Event = tuple[str, str]
+
+# NOTIFY payloads are capped at 8000 bytes
+MAX_PAYLOAD = 7900
+FLUSH_ALL = "*"
+
+
+def encode(events: Iterable[Event]) -> list[str]:
+    """
+    Pack events as `topic|key;topic|key` payloads that each fit in a
+    single NOTIFY.
+    """
+    by_topic: dict[str, list[str]] = defaultdict(list)
+    for topic, key in events:
+        by_topic[topic].append(key)
+    payloads, current = [], ""
+    for topic, keys in by_topic.items():
+        for key in keys:
+            part = f"{topic}|{key}"
+            candidate = f"{current};{part}" if current else part
+            if len(candidate) > MAX_PAYLOAD and current:
+                payloads.append(current)
+                candidate = part
+            current = candidate
+    if current:
+        payloads.append(current)
+    return payloads
+
+
+def decode(payload: str) -> list[Event]:
+    events = []
+    for part in payload.split(";"):
+        topic, _, key = part.partition("|")
+        if topic and key:
+            events.append((topic, key))
+    return events
+
+
+class InvalidationBus:
+    """
+    Fans change events out to every worker's in-process caches.
+
+    Writers stage events on their session with `publish`; they are
+    sent only if the transaction commits. Receivers buffer incoming
+    events and apply them to subscribed caches in batches.
+    """
+
+    def __init__(
+        self,
+        transport: "LocalTransport | PostgresTransport",
+        batch_delay: float = 0.05,
+        batch_size: int = 1000
+    ):
+        self.transport = transport
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self._handlers: dict[
+            str, list[Callable[[set[str]], Any]]
+        ] = defaultdict(list)
+        self._flushers: list[Callable[[], Any]] = []
+        self._pending: dict[str, set[str]] = defaultdict(set)
+        self._pending_count = 0
+        self._scheduled: asyncio.TimerHandle | None = None
+        self.published = 0
+        self.received = 0
+        self.batches = 0
+        self.full_flushes = 0
+
+    def subscribe(
+        self,
+        topic: str,
+        handler: Callable[[set[str]], Any],
+        flush: Callable[[], Any]
+    ) -> None:
+        self._handlers[topic].append(handler)
+        self._flushers.append(flush)
+
+    def publish(self, session, topic: str, key: Hashable) -> None:
+        session.info.setdefault("invalidations", set()).add(
+            (topic, str(key))
+        )
+
+    def receive(self, events: Iterable[Event]) -> None:
+        for topic, key in events:
+            if topic == FLUSH_ALL:
+                self.flush_all()
+                continue
+            if key not in self._pending[topic]:
+                self._pending[topic].add(key)
+                self._pending_count += 1
+                self.received += 1
+        if self._pending_count >= self.batch_size:
+            self.apply()
+        elif self._pending_count and self._scheduled is None:
+            self._scheduled = asyncio.get_running_loop().call_later(
+                self.batch_delay, self.apply
+            )
+
+    def apply(self) -> None:
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+        pending, self._pending = self._pending, defaultdict(set)
+        self._pending_count = 0
+        if not pending:
+            return
+        self.batches += 1
+        for topic, keys in pending.items():
+            for handler in self._handlers.get(topic, ()):
+                try:
+                    handler(keys)
+                except Exception:
+                    logger.exception("Invalidation handler failed")
+
+    def flush_all(self) -> None:
+        self.full_flushes += 1
+        self._pending.clear()
+        self._pending_count = 0
+        for flush in self._flushers:
+            flush()
+
+    def _before_commit(self, session: Session) -> None:
+        events = session.info.get("invalidations")
+        if events:
+            self.transport.notify_in_transaction(
+                session, encode(events)
+            )
+
+    def _after_commit(self, session: Session) -> None:
+        events = session.info.pop("invalidations", None)
+        if not events:
+            return
+        self.published += len(events)
+        # Apply our own writes right away rather than waiting for the
+        # transport to echo them back.
+        try:
+            self.receive(events)
+        except RuntimeError:
+            self.flush_all()
+        self.transport.notify_committed(self, events)
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop("invalidations", None)
+
+    async def start(self) -> None:
+        await self.transport.start(self)
+
+    async def stop(self) -> None:
+        await self.transport.stop(self)
+        self.apply()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "published": self.published,
+            "received": self.received,
+            "batches": self.batches,
+            "full_flushes": self.full_flushes,
+        }
+
+
+class LocalTransport:
+    """
+    In-memory transport: buses attached to the same instance see each
+    other's committed events. Meant for tests and single-process runs.
+    """
+
+    def __init__(self):
+        self._buses: list[InvalidationBus] = []
+
+    async def start(self, bus: InvalidationBus) -> None:
+        self._buses.append(bus)
+
+    async def stop(self, bus: InvalidationBus) -> None:
+        self._buses.remove(bus)
+
+    def notify_in_transaction(self, session, payloads) -> None:
+        pass
+
+    def notify_committed(self, sender, events) -> None:
+        for bus in self._buses:
+            if bus is not sender:
+                bus.receive(events)
+
+
+class PostgresTransport:
+    """
+    NOTIFY is issued inside the writer's transaction, so Postgres
+    delivers it exactly when (and only if) the transaction commits.
+    Each worker holds one dedicated LISTEN connection; after that
+    connection drops, every cache is flushed since events may have
+    been missed.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        healthcheck_interval: float = 10.0,
+        max_backoff: float = 30.0
+    ):
+        self.dsn = make_url(url).set(
+            drivername="postgresql"
+        ).render_as_string(hide_password=False)
+        self.channel = channel
+        self.healthcheck_interval = healthcheck_interval
+        self.max_backoff = max_backoff
+        self._task: asyncio.Task | None = None
+        self.reconnects = 0
+
+    def notify_in_transaction(self, session, payloads) -> None:
+        # Runs inside AsyncSession's greenlet, so sync execute is fine
+        for payload in payloads:
+            session.execute(
+                select(func.pg_notify(self.channel, payload))
+            )
+
+    def notify_committed(self, sender, events) -> None:
+        pass
+
+    async def start(self, bus: InvalidationBus) -> None:
+        self._task = asyncio.create_task(self._listen(bus))
+
+    async def stop(self, bus: InvalidationBus) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, bus: InvalidationBus) -> None:
+        backoff = 1.0
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(
+                    self.channel,
+                    lambda conn, pid, channel, payload: bus.receive(
+                        decode(payload)
+                    )
+                )
+                if connected_before:
+                    self.reconnects += 1
+                    bus.flush_all()
+                connected_before = True
+                backoff = 1.0
+                while True:
+                    await asyncio.sleep(self.healthcheck_interval)
+                    await connection.execute(
+                        "SELECT 1",
+                        timeout=self.healthcheck_interval
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning(
+                    "Invalidation listener lost its connection",
+                    exc_info=True
+                )
+            finally:
+                if connection is not None:
+                    try:
+                        await connection.close(timeout=1)
+                    except Exception:
+                        connection.terminate()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+def create_bus() -> InvalidationBus:
+    if settings.INVALIDATION_TRANSPORT == "local":
+        transport = LocalTransport()
+    else:
+        transport = PostgresTransport(
+            settings.DATABASE_URL,
+            settings.INVALIDATION_CHANNEL,
+            healthcheck_interval=settings.INVALIDATION_HEALTHCHECK_INTERVAL
+        )
+    bus = InvalidationBus(
+        transport,
+        batch_delay=settings.INVALIDATION_BATCH_DELAY,
+        batch_size=settings.INVALIDATION_BATCH_SIZE
+    )
+    event.listen(Session, "before_commit", bus._before_commit)
+    event.listen(Session, "after_commit", bus._after_commit)
+    event.listen(Session, "after_rollback", bus._after_rollback)
+    return bus
+
+
+invalidation_bus = create_bus()
+metrics.register("invalidation_bus", invalidation_bus.stats)
+
+
+def publish(session, topic: str, key: Hashable) -> None:
+    """
+    Stage an invalidation on `session`; it goes out on commit.
+    """
+    invalidation_bus.publish(session, topic, key)
@@ -0,0 +1,181 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+from src import metrics
+from src.config import settings
+
+request_id: ContextVar[str | None] = ContextVar(
+    "request_id", default=None
+)
+
+_listener: QueueListener | None = None
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records below WARNING for loggers
+    listed in `rates` (matched by dotted prefix).
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them and
+    drops them when the queue is full, so logging never blocks the
+    event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+        }
+
+
+def configure_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(
+        JSONFormatter() if settings.LOG_JSON
+        else logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s "
+            "[%(request_id)s] %(message)s"
+        )
+    )
+    handler = DroppingQueueHandler(
+        queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    )
+    handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    # uvicorn gives its loggers their own blocking stream handlers and
+    # stops them propagating; send them through the queue instead.
+    # uvicorn only writes the access log when that logger has somewhere
+    # to go, so it stays cut off unless the access log is enabled.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    logging.getLogger("uvicorn.access").propagate = (
+        settings.SERVER_ACCESS_LOG
+    )
+
+    _listener = QueueListener(
+        handler.queue, output, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+    metrics.register("logging", handler.stats)
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    Binds X-Request-ID (or a fresh id) to the request's context so
+    every log record it emits can be correlated.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(b"x-request-id")
+        current = (
+            incoming.decode("latin-1")[:128]
+            if incoming
+            else uuid.uuid4().hex
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", current.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
@@ -1,27 +1,47 @@
-from sqlmodel import SQLModel
+import logging
 from fastapi import FastAPI, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
-from src.database import engine, get_session
+from src import metrics
+from src.log_config import RequestIdMiddleware, configure_logging
+from src.compression import CompressionMiddleware
+from src.concurrency import AdaptiveConcurrencyMiddleware
+from src.idempotency import IdempotencyMiddleware
+from src.profiling import RequestProfilerMiddleware
+from src.profiling import router as profiling_router
+from src.invalidation import invalidation_bus
+from src.scheduler import scheduler
+from src.database import get_session
 from src.exceptions import register_all_errors
+from src.config import settings
+from auth.dependencies import get_current_active_superuser
+from auth.activity import activity_buffer
+from auth.audit import audit_log
+from auth.jobs import register_jobs
+from auth.routers.api_keys import router as api_key_router
 from auth.routers.login import router as auth_router
 from auth.routers.users import router as user_router
 
-version = "v1"
+configure_logging()
+logger = logging.getLogger(__name__)
+register_jobs(scheduler)
 
-version_prefix =f"/api/{version}"
+version_prefix = settings.API_PREFIX
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Server is starting...")
-    async with engine.begin() as conn:
-        await conn.run_sync(
-            SQLModel.metadata.create_all
-        )
+    logger.info("Server is starting...")
+    await invalidation_bus.start()
+    await audit_log.start()
+    await scheduler.start()
 
     yield
 
-    print("Server is shutting down...")
+    logger.info("Server is shutting down...")
+    await scheduler.stop()
+    await activity_buffer.flush()
+    await audit_log.stop()
+    await invalidation_bus.stop()
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(
@@ -33,11 +53,42 @@ app.include_router(
     prefix=f"{version_prefix}/users",
     tags=["users"]
 )
+app.include_router(
+    api_key_router,
+    prefix=f"{version_prefix}/api-keys",
+    tags=["api-keys"],
+    dependencies=[
+        Depends(get_current_active_superuser)
+    ]
+)
+app.include_router(
+    profiling_router,
+    prefix=f"{version_prefix}/debug",
+    tags=["debug"],
+    dependencies=[
+        Depends(get_current_active_superuser)
+    ]
+)
 
 register_all_errors(app)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(RequestProfilerMiddleware)
+app.add_middleware(AdaptiveConcurrencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 @app.get("/")
 async def root(
     session: AsyncSession = Depends(get_session)
 ):
-    return {"message": "Hello World"}
\ No newline at end of file
+    return {"message": "Hello World"}
+
+
+@app.get(
+    f"{version_prefix}/metrics",
+    dependencies=[
+        Depends(get_current_active_superuser)
+    ]
+)
+async def read_metrics():
+    return metrics.collect()
@@ -0,0 +1,17 @@
+from typing import Any, Callable
+
+_collectors: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register(
+    name: str,
+    collector: Callable[[], dict[str, Any]]
+) -> None:
+    _collectors[name] = collector
+
+
+def collect() -> dict[str, dict[str, Any]]:
+    return {
+        name: collector()
+        for name, collector in _collectors.items()
+    }
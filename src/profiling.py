@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import hmac
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from src.cache import TTLCache
+from src.config import settings
+
+Stack = tuple[str, ...]
+ProfileFormat = Literal["collapsed", "speedscope"]
+
+PROFILE_HEADER = "x-profile-request"
+
+request_profiles = TTLCache(
+    maxsize=settings.PROFILE_REQUEST_KEEP,
+    ttl=settings.PROFILE_REQUEST_TTL
+)
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """
+    Samples one thread's Python stack from a background thread every
+    `interval` seconds. The profiled thread pays nothing beyond the
+    GIL hand-offs, so it is safe to run on a live worker.
+    """
+
+    def __init__(
+        self,
+        thread_id: int,
+        interval: float,
+        should_sample: Callable[[], bool] | None = None
+    ):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.should_sample = should_sample
+        self.samples: Counter[Stack] = Counter()
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="profiler",
+            daemon=True
+        )
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> Counter[Stack]:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self.started_at
+        return self.samples
+
+    def _run(self) -> None:
+        current_frames = sys._current_frames
+        while not self._stop.wait(self.interval):
+            if self.should_sample and not self.should_sample():
+                continue
+            frame = current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+
+def task_filter(task: asyncio.Task) -> Callable[[], bool]:
+    """
+    Only sample while `task` is the one running on its loop, so a
+    request profile isn't polluted by other requests. Must be called
+    from `task` itself.
+    """
+    loop = task.get_loop()
+    if asyncio.current_task(loop) is not task:
+        raise RuntimeError("task_filter must be called from the task")
+    return lambda: asyncio.current_task(loop) is task
+
+
+def collapsed(samples: Counter[Stack]) -> str:
+    return "\n".join(
+        f"{';'.join(stack)} {count}"
+        for stack, count in samples.most_common()
+    ) + "\n"
+
+
+def speedscope(
+    samples: Counter[Stack],
+    interval: float,
+    name: str
+) -> dict[str, Any]:
+    frames: dict[str, int] = {}
+    indexed_samples, weights = [], []
+    for stack, count in samples.items():
+        indexed_samples.append(
+            [frames.setdefault(label, len(frames)) for label in stack]
+        )
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": settings.PROJECT_NAME,
+        "shared": {
+            "frames": [{"name": label} for label in frames]
+        },
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": indexed_samples,
+            "weights": weights,
+        }],
+    }
+
+
+def render(
+    samples: Counter[Stack],
+    interval: float,
+    name: str,
+    format: ProfileFormat
+):
+    if format == "speedscope":
+        return JSONResponse(
+            content=speedscope(samples, interval, name),
+            headers={
+                "content-disposition":
+                    f'attachment; filename="{name}.speedscope.json"'
+            }
+        )
+    return PlainTextResponse(collapsed(samples))
+
+
+def sign_profile_request(expires: int) -> str:
+    signature = hmac.new(
+        settings.SECRET_KEY.encode(),
+        f"profile:{expires}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_request(value: str) -> bool:
+    # Signed values are ASCII; anything else would trip isdigit() and
+    # compare_digest() on the way
+    if not value.isascii():
+        return False
+    expires, _, _ = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(
+        value, sign_profile_request(int(expires))
+    )
+
+
+class RequestProfilerMiddleware:
+    """
+    Profiles a single request that carries a valid signed
+    X-Profile-Request header. The result is kept for later download
+    and its id returned in X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        value = headers.get(PROFILE_HEADER.encode())
+        if value is None or not verify_profile_request(
+            value.decode("latin-1")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        interval = settings.PROFILE_INTERVAL
+        sampler = Sampler(
+            threading.get_ident(),
+            interval,
+            task_filter(asyncio.current_task())
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode())
+                ]
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_profiles.set(
+                profile_id,
+                (sampler.stop(), interval, scope["path"])
+            )
+
+
+router = APIRouter()
+_profile_lock = asyncio.Lock()
+
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = Query(default=10, gt=0, le=120),
+    format: ProfileFormat = "collapsed"
+):
+    """
+    Sample this worker's event loop for a number of seconds.
+    """
+    if _profile_lock.locked():
+        raise HTTPException(
+            status_code=409,
+            detail="A profile is already running on this worker"
+        )
+    async with _profile_lock:
+        interval = settings.PROFILE_INTERVAL
+        sampler = Sampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            samples = sampler.stop()
+    return render(samples, interval, "worker", format)
+
+
+@router.post("/profile/request-token")
+async def create_profile_request_token(
+    ttl: int = Query(default=300, gt=0, le=3600)
+) -> dict[str, str]:
+    """
+    Signed value for the X-Profile-Request header.
+    """
+    return {
+        "header": "X-Profile-Request",
+        "value": sign_profile_request(int(time.time()) + ttl),
+    }
+
+
+@router.get("/profile/requests/{profile_id}")
+async def read_request_profile(
+    profile_id: str,
+    format: ProfileFormat = "collapsed"
+):
+    """
+    Download the profile of a single request.
+    """
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Profile not found"
+        )
+    samples, interval, path = profile
+    return render(samples, interval, f"request {path}", format)
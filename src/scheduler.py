@@ -0,0 +1,429 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from src import metrics
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def advisory_lock_id(name: str) -> int:
+    # Stable across processes and releases, unlike hash()
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class IntervalTrigger:
+    def __init__(self, seconds: float, jitter: float = 0.0):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def next_run(self, now: datetime) -> datetime:
+        return now + timedelta(
+            seconds=self.seconds + random.uniform(0, self.jitter)
+        )
+
+    def __repr__(self) -> str:
+        return f"every {self.seconds}s"
+
+
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+
+def parse_cron_field(spec: str, low: int, high: int) -> frozenset[int]:
+    values = set()
+    for part in spec.split(","):
+        expr, slash, step = part.partition("/")
+        step = int(step) if slash else 1
+        if expr == "*":
+            start, end = low, high
+        elif "-" in expr:
+            start, end = (int(value) for value in expr.split("-", 1))
+        else:
+            start = int(expr)
+            end = high if slash else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Invalid cron field {spec!r}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronTrigger:
+    """
+    Standard five-field cron expression (minute hour day month
+    weekday), evaluated in UTC. As in cron, when both day and weekday
+    are restricted a time matching either one fires.
+    """
+
+    def __init__(self, expression: str, jitter: float = 0.0):
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"Invalid cron expression {expression!r}")
+        parsed = {
+            name: parse_cron_field(spec, low, high)
+            for spec, (name, low, high) in zip(fields, CRON_FIELDS)
+        }
+        self.expression = expression
+        self.jitter = jitter
+        self.minutes = parsed["minute"]
+        self.hours = parsed["hour"]
+        self.days = parsed["day"]
+        self.months = parsed["month"]
+        # 0 and 7 are both Sunday
+        self.weekdays = frozenset(day % 7 for day in parsed["weekday"])
+        # Like Vixie cron, "*/2" still counts as unrestricted
+        self.any_day = fields[2].startswith("*")
+        self.any_weekday = fields[4].startswith("*")
+
+    def day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_fire(self, after: datetime) -> datetime:
+        moment = after.replace(second=0, microsecond=0) + timedelta(
+            minutes=1
+        )
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (
+                    moment.replace(day=1, hour=0, minute=0)
+                    + timedelta(days=32)
+                ).replace(day=1)
+            elif not self.day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(
+                    days=1
+                )
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron {self.expression!r} never fires")
+
+    def next_run(self, now: datetime) -> datetime:
+        return self.next_fire(now) + timedelta(
+            seconds=random.uniform(0, self.jitter)
+        )
+
+    def __repr__(self) -> str:
+        return f"cron {self.expression!r}"
+
+
+Trigger = IntervalTrigger | CronTrigger
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[], Awaitable[Any]],
+        trigger: Trigger,
+        *,
+        leader_only: bool,
+        timeout: float | None,
+        wake: asyncio.Event | None
+    ):
+        self.name = name
+        self.fn = fn
+        self.trigger = trigger
+        self.leader_only = leader_only
+        self.timeout = timeout
+        self.wake = wake
+        self.running = False
+        self.next_run_at: datetime | None = None
+        self.last_run_at: datetime | None = None
+        self.last_success_at: datetime | None = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "trigger": repr(self.trigger),
+            "leader_only": self.leader_only,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration": round(self.last_duration, 4),
+            "max_duration": round(self.max_duration, 4),
+            "mean_duration": round(
+                self.total_duration / self.runs if self.runs else 0.0, 4
+            ),
+            "next_run_at": self.next_run_at,
+            "last_run_at": self.last_run_at,
+            "last_success_at": self.last_success_at,
+        }
+
+
+class Scheduler:
+    """
+    Runs maintenance jobs inside each app worker.
+
+    Jobs marked `leader_only` run only on the worker holding a Postgres
+    advisory lock on a dedicated connection, so they run once per
+    cluster; the others run on every worker (e.g. flushing that
+    worker's in-memory buffers). A job never overlaps with itself, and
+    a leader-only job is cancelled if its worker loses the lock while
+    it runs, since the new leader may start it again. On
+    stop, idle jobs are cancelled at once and running ones get
+    `shutdown_timeout` seconds to finish.
+    """
+
+    def __init__(
+        self,
+        *,
+        url: str | None,
+        lock_name: str,
+        election_interval: float,
+        shutdown_timeout: float,
+        max_backoff: float = 30.0
+    ):
+        # Without a url every worker considers itself the leader,
+        # which is only right for single-process runs.
+        self.dsn = (
+            make_url(url).set(
+                drivername="postgresql"
+            ).render_as_string(hide_password=False)
+            if url else None
+        )
+        self.lock_id = advisory_lock_id(lock_name)
+        self.election_interval = election_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.max_backoff = max_backoff
+        self.jobs: dict[str, Job] = {}
+        self.is_leader = self.dsn is None
+        self.elections = 0
+        # Set when this worker gives up leadership
+        self._deposed = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._election: asyncio.Task | None = None
+
+    def add_job(
+        self,
+        name: str,
+        fn: Callable[[], Awaitable[Any]],
+        trigger: Trigger,
+        *,
+        leader_only: bool = True,
+        timeout: float | None = None,
+        wake: asyncio.Event | None = None
+    ) -> Job:
+        """
+        Schedule `fn`. Setting `wake` runs the job early, without
+        waiting for its trigger.
+        """
+        if name in self.jobs:
+            raise ValueError(f"Job {name!r} is already scheduled")
+        # Fails here, rather than in the job's task, for a cron
+        # expression that never fires
+        trigger.next_run(utcnow())
+        job = Job(
+            name, fn, trigger,
+            leader_only=leader_only,
+            timeout=timeout,
+            wake=wake
+        )
+        self.jobs[name] = job
+        return job
+
+    async def start(self) -> None:
+        self._stopping.clear()
+        if self.dsn is not None:
+            self._election = asyncio.create_task(self._elect())
+        self._tasks = [
+            asyncio.create_task(self._run(job), name=f"job:{job.name}")
+            for job in self.jobs.values()
+        ]
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(
+                self._tasks, timeout=self.shutdown_timeout
+            )
+            for task in pending:
+                logger.warning(
+                    "Cancelling scheduled job %s at shutdown",
+                    task.get_name()
+                )
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        if self._election is not None:
+            self._election.cancel()
+            await asyncio.gather(self._election, return_exceptions=True)
+            self._election = None
+
+    async def _sleep(self, job: Job, delay: float) -> bool:
+        """
+        Wait up to `delay` seconds; False once the scheduler stops.
+        """
+        events = [self._stopping] + ([job.wake] if job.wake else [])
+        waiters = [asyncio.create_task(event.wait()) for event in events]
+        try:
+            await asyncio.wait(
+                waiters,
+                timeout=max(delay, 0),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return not self._stopping.is_set()
+
+    async def _run(self, job: Job) -> None:
+        while True:
+            now = utcnow()
+            job.next_run_at = job.trigger.next_run(now)
+            delay = (job.next_run_at - now).total_seconds()
+            if not await self._sleep(job, delay):
+                return
+            if job.wake is not None:
+                job.wake.clear()
+            if job.leader_only and not self.is_leader:
+                job.skipped += 1
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Job) -> None:
+        job.running = True
+        job.last_run_at = utcnow()
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(job.timeout):
+                if job.leader_only:
+                    await self._while_leader(job)
+                else:
+                    await job.fn()
+            job.last_success_at = utcnow()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            job.failures += 1
+            logger.exception("Scheduled job %s failed", job.name)
+        finally:
+            duration = time.perf_counter() - started
+            job.running = False
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+
+    async def _while_leader(self, job: Job) -> None:
+        run = asyncio.create_task(job.fn())
+        deposed = asyncio.create_task(self._deposed.wait())
+        try:
+            await asyncio.wait(
+                [run, deposed], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            deposed.cancel()
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+        if run.cancelled():
+            raise RuntimeError(
+                f"Lost scheduler leadership while running {job.name}"
+            )
+        run.result()
+
+    async def _elect(self) -> None:
+        # Session-level advisory lock: held for as long as this
+        # connection lives, released by Postgres if it dies.
+        backoff = 1.0
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                backoff = 1.0
+                while True:
+                    if not self.is_leader:
+                        self.is_leader = await connection.fetchval(
+                            "SELECT pg_try_advisory_lock($1)",
+                            self.lock_id,
+                            timeout=self.election_interval
+                        )
+                        if self.is_leader:
+                            self._deposed.clear()
+                            self.elections += 1
+                            logger.info("Became scheduler leader")
+                    else:
+                        await connection.execute(
+                            "SELECT 1",
+                            timeout=self.election_interval
+                        )
+                    await asyncio.sleep(self.election_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning(
+                    "Scheduler lost its election connection",
+                    exc_info=True
+                )
+            finally:
+                if self.is_leader:
+                    logger.info("Gave up scheduler leadership")
+                    self._deposed.set()
+                self.is_leader = False
+                if connection is not None:
+                    try:
+                        await connection.close(timeout=1)
+                    except Exception:
+                        connection.terminate()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "leader": self.is_leader,
+            "elections": self.elections,
+            "jobs": {name: job.stats() for name, job in self.jobs.items()},
+        }
+
+
+def create_scheduler() -> Scheduler:
+    scheduler = Scheduler(
+        url=(
+            settings.DATABASE_URL
+            if settings.SCHEDULER_LEADER_ELECTION
+            else None
+        ),
+        lock_name=f"{settings.PROJECT_NAME}:scheduler",
+        election_interval=settings.SCHEDULER_ELECTION_INTERVAL,
+        shutdown_timeout=settings.SCHEDULER_SHUTDOWN_TIMEOUT
+    )
+    metrics.register("scheduler", scheduler.stats)
+    return scheduler
+
+
+scheduler = create_scheduler()
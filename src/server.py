@@ -0,0 +1,89 @@
+import os
+import random
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src.config import settings
+
+
+def cgroup_cpu_limit() -> int | None:
+    try:
+        quota, period = open(
+            "/sys/fs/cgroup/cpu.max"
+        ).read().split()
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return max(1, int(quota) // int(period))
+
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return cpus
+
+
+def worker_count() -> int:
+    """
+    Each uvicorn worker runs its own event loop, so one worker
+    per usable CPU keeps every core busy without oversubscribing.
+    """
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+    return available_cpus()
+
+
+class RecyclingConfig(uvicorn.Config):
+    """
+    Every worker process loads its own copy of the config, so drawing
+    the jitter there staggers the restarts of workers started together.
+    """
+
+    def load(self) -> None:
+        if self.limit_max_requests:
+            self.limit_max_requests += random.randint(
+                0, settings.SERVER_MAX_REQUESTS_JITTER
+            )
+        super().load()
+
+
+def run() -> None:
+    workers = worker_count()
+    config = RecyclingConfig(
+        "src.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE,
+        # Only the multiprocess supervisor replaces a worker that exits
+        limit_max_requests=(
+            settings.SERVER_MAX_REQUESTS or None if workers > 1 else None
+        ),
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        access_log=settings.SERVER_ACCESS_LOG,
+        # Logging is configured by the app (src.log_config)
+        log_config=None,
+    )
+    server = uvicorn.Server(config)
+    if workers > 1:
+        Multiprocess(
+            config, target=server.run, sockets=[config.bind_socket()]
+        ).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one `fn` per key at a time; concurrent callers for the
+    same key await the in-flight result instead of repeating the work.
+
+    The work runs in its own task, so a cancelled caller never cancels
+    it for the others; it is cancelled only once every caller is gone.
+    Errors are delivered to every caller and are not cached.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        self.failures = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[T]]
+    ) -> T:
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is None:
+            self.executions += 1
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(
+                lambda task: self._finish(key, call)
+            )
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        self._forget(key, call)
+        if not call.task.cancelled() and call.task.exception():
+            self.failures += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "saved": self.calls - self.executions,
+            "failures": self.failures,
+            "in_flight": len(self._calls),
+        }
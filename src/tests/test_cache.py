@@ -0,0 +1,78 @@
+import logging
+import time
+
+import pytest
+
+from src.cache import TTLCache
+from src.utils import RateLimitedLogger
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=1)
+    cache.set("expired", 3, ttl=0)
+
+    clock.now += 2
+    assert cache.get("short") is None
+    assert cache.get("default") == 1
+    assert cache.get("expired") is None
+    clock.now += 3
+    assert cache.get("default") is None
+    assert len(cache) == 0
+    assert cache.stats()["misses"] == 3
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_prune_drops_matching_values(clock):
+    cache = TTLCache(maxsize=10)
+    for user in ("ann", "bob", "ann"):
+        cache.set(object(), {"sub": user})
+
+    assert cache.prune(lambda payload: payload["sub"] == "ann") == 2
+    assert len(cache) == 1
+
+
+def test_logger_suppresses_past_the_limit_and_reports_it(clock, caplog):
+    log = RateLimitedLogger(
+        logging.getLogger("test"), limit=2, interval=60
+    )
+
+    with caplog.at_level(logging.WARNING, "test"):
+        for attempt in range(5):
+            log.warning("rejected %d", attempt)
+        clock.now += 60
+        log.warning("rejected %d", 5)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "rejected 0",
+        "rejected 1",
+        "3 similar messages suppressed",
+        "rejected 5",
+    ]
@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+
+import pytest
+
+from src.compression import CompressionMiddleware
+
+BODY = b'{"data": "' + b"x" * 4096 + b'"}'
+
+
+def respond(
+    body: bytes = BODY,
+    status: int = 200,
+    headers: list[tuple[bytes, bytes]] = (),
+    chunks: int = 1
+):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        })
+        size = -(-len(body) // chunks)
+        for start in range(0, len(body), size):
+            await send({
+                "type": "http.response.body",
+                "body": body[start:start + size],
+                "more_body": start + size < len(body),
+            })
+
+    return app
+
+
+def get(app, accept_encoding: bytes = b"gzip"):
+    middleware = CompressionMiddleware(app, minimum_size=1024)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [(b"accept-encoding", accept_encoding)],
+        },
+        None,
+        send
+    ))
+    middleware.executor.shutdown()
+    headers = {}
+    for key, value in sent[0]["headers"]:
+        headers.setdefault(key, []).append(value)
+    return sent[0]["status"], headers, b"".join(
+        message.get("body", b"") for message in sent[1:]
+    )
+
+
+@pytest.mark.parametrize("chunks", [1, 3])
+def test_compresses_whole_and_streamed_bodies(chunks):
+    _, headers, body = get(respond(chunks=chunks))
+
+    assert headers[b"content-encoding"] == [b"gzip"]
+    assert gzip.decompress(body) == BODY
+    if chunks == 1:
+        assert headers[b"content-length"] == [str(len(body)).encode()]
+    else:
+        assert b"content-length" not in headers
+
+
+def test_compressed_response_has_a_weak_etag():
+    _, headers, _ = get(respond(headers=[(b"etag", b'"abc-3"')]))
+
+    assert headers[b"etag"] == [b'W/"abc-3"']
+
+
+@pytest.mark.parametrize("vary,expected", [
+    ([], b"Accept-Encoding"),
+    ([b"Origin"], b"Origin, Accept-Encoding"),
+    ([b"Origin", b"Cookie"], b"Origin, Cookie, Accept-Encoding"),
+    ([b"accept-encoding, Origin"], b"accept-encoding, Origin"),
+    ([b"*"], b"*"),
+])
+def test_vary_is_merged_into_one_header(vary, expected):
+    _, headers, _ = get(
+        respond(headers=[(b"vary", value) for value in vary])
+    )
+
+    assert headers[b"vary"] == [expected]
+
+
+@pytest.mark.parametrize("vary,expected", [
+    ([], b"Accept-Encoding"),
+    ([b"Origin"], b"Origin, Accept-Encoding"),
+])
+def test_below_minimum_size_still_varies(vary, expected):
+    _, headers, body = get(
+        respond(body=b"{}", headers=[(b"vary", value) for value in vary])
+    )
+
+    assert b"content-encoding" not in headers
+    assert headers[b"vary"] == [expected]
+    assert body == b"{}"
+
+
+@pytest.mark.parametrize("app,accept_encoding,encoding,sent", [
+    (respond(headers=[(b"content-encoding", b"br")]), b"gzip", b"br", BODY),
+    (respond(status=304), b"gzip", None, BODY),
+    (respond(), b"identity", None, BODY),
+    (respond(), b"gzip;q=0", None, BODY),
+])
+def test_passes_through_untouched(app, accept_encoding, encoding, sent):
+    _, headers, body = get(app, accept_encoding)
+
+    assert headers.get(b"content-encoding", [None]) == [encoding]
+    assert b"vary" not in headers
+    assert body == sent
+
+
+def test_content_type_outside_the_list_passes_through():
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"image/png")],
+        })
+        await send({"type": "http.response.body", "body": BODY})
+
+    _, headers, body = get(app)
+
+    assert b"content-encoding" not in headers
+    assert body == BODY
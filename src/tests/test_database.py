@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from src.concurrency import request_deadline
+
+
+async def statement_timeouts(session_factory) -> list[int]:
+    """
+    The statement_timeout in force in two transactions of one
+    request session, a second apart.
+    """
+    sessions = session_factory()
+    session = await anext(sessions)
+    timeouts = []
+    try:
+        for _ in range(2):
+            value = (
+                await session.execute(text(
+                    "SELECT setting FROM pg_settings"
+                    " WHERE name = 'statement_timeout'"
+                ))
+            ).scalar_one()
+            timeouts.append(int(value))
+            await session.commit()
+            await asyncio.sleep(1)
+    finally:
+        await sessions.aclose()
+    return timeouts
+
+
+def test_statements_are_capped_by_the_request_deadline(migrated_database):
+    from src.database import engine, get_session
+
+    async def main():
+        request_deadline.set(time.monotonic() + 5)
+        try:
+            return await statement_timeouts(get_session)
+        finally:
+            await engine.dispose()
+
+    first, second = asyncio.run(main())
+
+    assert 4000 < first <= 5000
+    assert first - second >= 900
+
+
+def test_no_session_once_the_deadline_has_passed():
+    from src.database import get_session
+
+    async def main():
+        request_deadline.set(time.monotonic() - 1)
+        await anext(get_session())
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(main())
+    assert raised.value.status_code == 503
@@ -0,0 +1,49 @@
+import asyncio
+import uuid
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from src.exceptions import register_all_errors
+
+
+def status_for(exc: Exception) -> int:
+    app = FastAPI()
+    register_all_errors(app)
+
+    @app.get("/")
+    async def fail():
+        raise exc
+
+    return TestClient(app).get("/").status_code
+
+
+def test_taken_email_is_a_conflict(migrated_database):
+    from src.database import async_session, engine
+
+    async def main():
+        email = f"{uuid.uuid4()}@example.com"
+        try:
+            async with async_session() as session:
+                for _ in range(2):
+                    await session.execute(
+                        text(
+                            "INSERT INTO user_email (email, user_id) "
+                            "VALUES (:email, :user_id)"
+                        ),
+                        {"email": email, "user_id": uuid.uuid4()}
+                    )
+        except IntegrityError as exc:
+            return exc
+        finally:
+            await engine.dispose()
+
+    assert status_for(asyncio.run(main())) == 409
+
+
+def test_other_integrity_errors_stay_server_errors():
+    assert status_for(
+        IntegrityError("INSERT ...", {}, Exception("duplicate key"))
+    ) == 500
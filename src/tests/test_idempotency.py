@@ -0,0 +1,196 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.idempotency import (
+    IdempotencyMiddleware,
+    LocalIdempotencyStore,
+    PostgresIdempotencyStore
+)
+
+PATH = "/api/v1/users/register"
+
+
+class CountingApp:
+    """
+    Echoes the request body and counts how often it actually ran.
+    Holds every response until `release` is set.
+    """
+
+    def __init__(self, status: int = 201):
+        self.status = status
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = (await receive())["body"]
+        self.started.set()
+        await self.release.wait()
+        payload = json.dumps(
+            {"call": self.calls, "body": body.decode()}
+        ).encode()
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+
+async def post(app, body: bytes, key: bytes = b"key-1"):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": PATH,
+        "headers": [
+            (b"authorization", b"Bearer caller"),
+            (b"idempotency-key", key),
+        ],
+    }
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return (
+        sent[0]["status"],
+        dict(sent[0]["headers"]),
+        b"".join(message.get("body", b"") for message in sent[1:])
+    )
+
+
+@asynccontextmanager
+async def open_store(kind: str, url: str | None):
+    if kind == "local":
+        yield LocalIdempotencyStore(ttl=60, maxsize=100)
+        return
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE idempotency_key"))
+    try:
+        yield PostgresIdempotencyStore(engine, ttl=60, lock_timeout=5)
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(params=["local", "postgres"])
+def store_kind(request):
+    if request.param == "postgres":
+        return "postgres", request.getfixturevalue("migrated_database")
+    return "local", None
+
+
+def run_with_store(store_kind, scenario):
+    async def main():
+        async with open_store(*store_kind) as store:
+            await scenario(store)
+
+    asyncio.run(main())
+
+
+def test_retry_replays_the_stored_response(store_kind):
+    async def scenario(store):
+        downstream = CountingApp()
+        app = IdempotencyMiddleware(
+            downstream, store=store, poll_interval=0.01
+        )
+
+        first = await post(app, b'{"email": "a@example.com"}')
+        second = await post(app, b'{"email": "a@example.com"}')
+
+        assert downstream.calls == 1
+        assert first[0] == second[0] == 201
+        assert first[2] == second[2]
+        assert second[1][b"idempotent-replayed"] == b"true"
+
+    run_with_store(store_kind, scenario)
+
+
+def test_reused_key_with_another_body_is_rejected(store_kind):
+    async def scenario(store):
+        downstream = CountingApp()
+        app = IdempotencyMiddleware(
+            downstream, store=store, poll_interval=0.01
+        )
+
+        await post(app, b'{"email": "a@example.com"}')
+        status, _, body = await post(app, b'{"email": "b@example.com"}')
+
+        assert status == 422
+        assert json.loads(body)["error_code"] == "idempotency_key_reused"
+        assert downstream.calls == 1
+
+    run_with_store(store_kind, scenario)
+
+
+def test_concurrent_duplicates_wait_for_the_first(store_kind):
+    async def scenario(store):
+        downstream = CountingApp()
+        downstream.release.clear()
+        app = IdempotencyMiddleware(
+            downstream, store=store, poll_interval=0.01
+        )
+
+        first = asyncio.create_task(post(app, b"{}"))
+        await downstream.started.wait()
+        waiters = [
+            asyncio.create_task(post(app, b"{}")) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        assert not any(waiter.done() for waiter in waiters)
+        downstream.release.set()
+        responses = await asyncio.gather(first, *waiters)
+
+        assert downstream.calls == 1
+        assert {body for _, _, body in responses} == {responses[0][2]}
+        assert app.waited >= 3
+
+    run_with_store(store_kind, scenario)
+
+
+def test_server_errors_are_not_kept(store_kind):
+    async def scenario(store):
+        downstream = CountingApp(status=503)
+        app = IdempotencyMiddleware(
+            downstream, store=store, poll_interval=0.01
+        )
+
+        await post(app, b"{}")
+        await post(app, b"{}")
+
+        assert downstream.calls == 2
+
+    run_with_store(store_kind, scenario)
+
+
+def test_retry_on_another_worker_is_replayed(migrated_database):
+    async def main():
+        async with open_store("postgres", migrated_database) as first, \
+                open_store("postgres", migrated_database) as second:
+            downstream = CountingApp()
+            workers = [
+                IdempotencyMiddleware(downstream, store=store)
+                for store in (first, second)
+            ]
+
+            await post(workers[0], b"{}")
+            status, headers, _ = await post(workers[1], b"{}")
+
+            assert downstream.calls == 1
+            assert status == 201
+            assert headers[b"idempotent-replayed"] == b"true"
+
+    asyncio.run(main())
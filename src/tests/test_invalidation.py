@@ -0,0 +1,33 @@
+import uuid
+
+from src.invalidation import FLUSH_ALL, MAX_PAYLOAD, decode, encode
+
+
+def test_events_survive_a_round_trip():
+    events = [
+        ("user", str(uuid.uuid4())),
+        ("api_key", "3f2a"),
+        ("user", str(uuid.uuid4())),
+        ("user", FLUSH_ALL),
+    ]
+
+    (payload,) = encode(events)
+
+    assert sorted(decode(payload)) == sorted(events)
+
+
+def test_large_batches_are_split_into_notify_sized_payloads():
+    events = [("user", str(uuid.uuid4())) for _ in range(1000)]
+
+    payloads = encode(events)
+
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= MAX_PAYLOAD for payload in payloads)
+    assert [
+        event for payload in payloads for event in decode(payload)
+    ] == events
+
+
+def test_nothing_to_send():
+    assert encode([]) == []
+    assert decode("") == []
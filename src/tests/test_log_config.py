@@ -0,0 +1,61 @@
+import logging
+import logging.config
+
+import pytest
+from uvicorn.config import LOGGING_CONFIG
+
+from src import log_config, metrics
+from src.config import settings
+
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+@pytest.fixture
+def fresh_logging(monkeypatch):
+    """
+    Loggers as uvicorn leaves them before the app configures logging;
+    the previous configuration is put back afterwards.
+    """
+    saved = {
+        name: (logger.handlers[:], logger.propagate, logger.level)
+        for name in ("", *UVICORN_LOGGERS)
+        for logger in [logging.getLogger(name)]
+    }
+    monkeypatch.setattr(log_config, "_listener", None)
+    monkeypatch.setattr(metrics, "_collectors", dict(metrics._collectors))
+    monkeypatch.setattr(settings, "LOG_JSON", False)
+    monkeypatch.setattr(settings, "LOG_SAMPLING", {})
+    logging.config.dictConfig(LOGGING_CONFIG)
+    yield
+    log_config.stop_logging()
+    for name, (handlers, propagate, level) in saved.items():
+        logger = logging.getLogger(name)
+        logger.handlers[:] = handlers
+        logger.propagate = propagate
+        logger.setLevel(level)
+
+
+def test_uvicorn_records_go_through_the_queue(
+    fresh_logging, monkeypatch, capsys
+):
+    monkeypatch.setattr(settings, "SERVER_ACCESS_LOG", True)
+    log_config.configure_logging()
+
+    logging.getLogger("uvicorn.error").info("Started server process")
+    logging.getLogger("uvicorn.access").info("GET / 200")
+    enqueued = metrics.collect()["logging"]["enqueued"]
+    log_config.stop_logging()
+
+    output = capsys.readouterr()
+    assert enqueued == 2
+    assert "uvicorn.error [None] Started server process" in output.out
+    assert "uvicorn.access [None] GET / 200" in output.out
+    assert output.err == ""
+
+
+def test_access_log_stays_off_when_disabled(fresh_logging, monkeypatch):
+    monkeypatch.setattr(settings, "SERVER_ACCESS_LOG", False)
+    log_config.configure_logging()
+
+    assert not logging.getLogger("uvicorn.access").hasHandlers()
+    assert logging.getLogger("uvicorn.error").hasHandlers()
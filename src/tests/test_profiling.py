@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from src.concurrency import AdaptiveConcurrencyMiddleware, AIMDLimit
+from src.profiling import (
+    RequestProfilerMiddleware,
+    Sampler,
+    collapsed,
+    sign_profile_request,
+    speedscope,
+    task_filter,
+    verify_profile_request
+)
+
+
+def spin(seconds: float) -> None:
+    until = time.monotonic() + seconds
+    while time.monotonic() < until:
+        pass
+
+
+def sampled_functions(samples: Counter) -> set[str]:
+    return {
+        label.split(" ")[0] for stack in samples for label in stack
+    }
+
+
+def test_sampler_records_the_profiled_thread():
+    sampler = Sampler(threading.get_ident(), 0.001)
+    sampler.start()
+    spin(0.1)
+    samples = sampler.stop()
+
+    assert "spin" in sampled_functions(samples)
+
+
+def test_task_filter_skips_other_tasks():
+    def busy_request():
+        spin(0.1)
+
+    def busy_neighbour():
+        spin(0.1)
+
+    async def main():
+        async def profiled():
+            sampler = Sampler(
+                threading.get_ident(),
+                0.001,
+                task_filter(asyncio.current_task())
+            )
+            sampler.start()
+            await asyncio.sleep(0)
+            busy_request()
+            await asyncio.sleep(0.01)
+            return sampler.stop()
+
+        async def neighbour():
+            await asyncio.sleep(0)
+            busy_neighbour()
+
+        samples, _ = await asyncio.gather(profiled(), neighbour())
+        return samples
+
+    functions = sampled_functions(asyncio.run(main()))
+
+    assert "test_task_filter_skips_other_tasks.<locals>.busy_request" in (
+        functions
+    )
+    assert not any("busy_neighbour" in name for name in functions)
+
+
+def test_task_filter_must_be_created_by_the_task():
+    async def main():
+        other = asyncio.create_task(asyncio.sleep(0))
+        try:
+            with pytest.raises(RuntimeError):
+                task_filter(other)
+        finally:
+            await other
+
+    asyncio.run(main())
+
+
+def test_collapsed_and_speedscope_agree():
+    samples = Counter({("main", "handler"): 3, ("main",): 1})
+
+    assert collapsed(samples) == "main;handler 3\nmain 1\n"
+    profile = speedscope(samples, 0.01, "worker")
+    frames = [frame["name"] for frame in profile["shared"]["frames"]]
+    (sampled,) = profile["profiles"]
+    assert frames == ["main", "handler"]
+    assert sampled["samples"] == [[0, 1], [0]]
+    assert sampled["endValue"] == pytest.approx(0.04)
+
+
+def test_profile_request_signature():
+    value = sign_profile_request(int(time.time()) + 60)
+    expires, _, signature = value.partition(".")
+
+    assert verify_profile_request(value)
+    assert not verify_profile_request(f"{int(expires) + 1}.{signature}")
+    assert not verify_profile_request(
+        sign_profile_request(int(time.time()) - 1)
+    )
+    assert not verify_profile_request("garbage")
+    assert not verify_profile_request("\u00b2.sig")
+    assert not verify_profile_request(f"{expires}.{signature[:-1]}\u00e9")
+
+
+def test_undecodable_profile_header_is_ignored():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(RequestProfilerMiddleware(app)(
+        {
+            "type": "http",
+            "path": "/",
+            "headers": [(b"x-profile-request", b"\xff\xfe")],
+        },
+        None,
+        send
+    ))
+
+    assert sent[0]["status"] == 200
+    assert "headers" not in sent[0]
+
+
+@pytest.mark.parametrize("path,status", [
+    ("/api/v1/debug/profile", 200),
+    ("/api/v1/users/me", 504),
+])
+def test_worker_profile_outlives_the_request_deadline(path, status):
+    async def slow(scope, receive, send):
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def main():
+        limit = AIMDLimit(
+            initial=1, min_limit=1, max_limit=1, target_latency=1
+        )
+        app = AdaptiveConcurrencyMiddleware(
+            slow, limits={"read": limit, "write": limit}, timeout=0.01
+        )
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await app(
+            {"type": "http", "method": "POST", "path": path},
+            None,
+            send
+        )
+        return sent[0]["status"]
+
+    assert asyncio.run(main()) == status
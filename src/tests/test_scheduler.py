@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from src.scheduler import (
+    CronTrigger,
+    IntervalTrigger,
+    Scheduler,
+    parse_cron_field
+)
+
+
+def at(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def local_scheduler() -> Scheduler:
+    return Scheduler(
+        url=None,
+        lock_name="test",
+        election_interval=1,
+        shutdown_timeout=1
+    )
+
+
+@pytest.mark.parametrize("spec,low,high,expected", [
+    ("*", 0, 6, set(range(7))),
+    ("5", 0, 59, {5}),
+    ("1-3,7", 1, 12, {1, 2, 3, 7}),
+    ("*/15", 0, 59, {0, 15, 30, 45}),
+    ("10/20", 0, 59, {10, 30, 50}),
+    ("1-10/4", 1, 31, {1, 5, 9}),
+])
+def test_parse_cron_field(spec, low, high, expected):
+    assert parse_cron_field(spec, low, high) == expected
+
+
+@pytest.mark.parametrize("spec", ["60", "5-1", "*/0", "0-", "x"])
+def test_parse_cron_field_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_cron_field(spec, 0, 59)
+
+
+@pytest.mark.parametrize("expression,after,expected", [
+    # Next minute, not the current one
+    ("* * * * *", at(2024, 5, 1, 12, 0, 30), at(2024, 5, 1, 12, 1)),
+    ("30 3 * * *", at(2024, 5, 1, 3, 30), at(2024, 5, 2, 3, 30)),
+    # Month and year rollover
+    ("0 0 1 * *", at(2024, 1, 31, 12, 0), at(2024, 2, 1, 0, 0)),
+    ("0 0 1 1 *", at(2024, 12, 31, 23, 59), at(2025, 1, 1, 0, 0)),
+    ("0 0 31 * *", at(2024, 4, 1), at(2024, 5, 31, 0, 0)),
+    ("0 0 29 2 *", at(2025, 3, 1), at(2028, 2, 29, 0, 0)),
+    # Day or weekday: the 15th, or a Monday, whichever comes first
+    ("0 0 15 * 1", at(2024, 5, 1), at(2024, 5, 6, 0, 0)),
+    ("0 0 15 * 1", at(2024, 5, 13, 1, 0), at(2024, 5, 15, 0, 0)),
+    # Either one unrestricted: both must match
+    ("0 0 * * 0", at(2024, 5, 1), at(2024, 5, 5, 0, 0)),
+    ("0 0 */2 * 7", at(2024, 5, 1), at(2024, 5, 5, 0, 0)),
+])
+def test_cron_next_fire(expression, after, expected):
+    assert CronTrigger(expression).next_fire(after) == expected
+
+
+def test_cron_that_never_fires_is_rejected_when_scheduled():
+    scheduler = local_scheduler()
+
+    async def job():
+        pass
+
+    with pytest.raises(ValueError):
+        scheduler.add_job("never", job, CronTrigger("0 0 31 2 *"))
+    assert "never" not in scheduler.jobs
+
+
+def test_leader_only_job_stops_when_leadership_is_lost():
+    async def main():
+        scheduler = local_scheduler()
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def reconcile():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        job = scheduler.add_job(
+            "reconcile", reconcile, IntervalTrigger(60)
+        )
+        running = asyncio.create_task(scheduler._execute(job))
+        await started.wait()
+        scheduler._deposed.set()
+        await running
+        return job, cancelled.is_set()
+
+    job, cancelled = asyncio.run(main())
+
+    assert cancelled
+    assert job.failures == 1
+    assert job.last_success_at is None
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from src.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    async def main():
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(
+            *(flight.do("user", load) for _ in range(5))
+        )
+        again = await flight.do("user", load)
+        return results, again, flight.stats()
+
+    results, again, stats = asyncio.run(main())
+
+    assert results == [1] * 5
+    assert again == 2
+    assert stats["saved"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise LookupError("user store down")
+
+        results = await asyncio.gather(
+            flight.do("user", fail),
+            flight.do("user", fail),
+            return_exceptions=True
+        )
+        return results, flight.stats()
+
+    results, stats = asyncio.run(main())
+
+    assert all(isinstance(result, LookupError) for result in results)
+    assert stats["failures"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_one_cancelled_caller_leaves_the_work_running():
+    async def main():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return "user"
+
+        first = asyncio.create_task(flight.do("user", load))
+        second = asyncio.create_task(flight.do("user", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "user"
+
+
+def test_work_is_cancelled_and_forgotten_when_every_caller_leaves():
+    async def main():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def load():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        caller = asyncio.create_task(flight.do("user", load))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        in_flight = flight.stats()["in_flight"]
+
+        async def fresh():
+            return "fresh"
+
+        return in_flight, await flight.do("user", fresh)
+
+    assert asyncio.run(main()) == (0, "fresh")
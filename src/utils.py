@@ -1,3 +1,4 @@
+import time
 import logging
 import emails  # type: ignore
 from typing import Any
@@ -6,10 +7,50 @@ from jinja2 import Template
 from dataclasses import dataclass
 from src.config import settings
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class RateLimitedLogger:
+    """
+    Emits at most `limit` records per `interval` seconds and reports
+    how many were suppressed once the window rolls over.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        limit: int = 10,
+        interval: float = 60.0
+    ):
+        self.logger = logger
+        self.limit = limit
+        self.interval = interval
+        self._window_start = 0.0
+        self._emitted = 0
+        self._suppressed = 0
+
+    def log(self, level: int, msg: str, *args: Any) -> None:
+        now = time.monotonic()
+        if now - self._window_start >= self.interval:
+            if self._suppressed:
+                self.logger.log(
+                    level,
+                    "%d similar messages suppressed",
+                    self._suppressed
+                )
+            self._window_start = now
+            self._emitted = 0
+            self._suppressed = 0
+        if self._emitted >= self.limit:
+            self._suppressed += 1
+            return
+        self._emitted += 1
+        self.logger.log(level, msg, *args)
+
+    def warning(self, msg: str, *args: Any) -> None:
+        self.log(logging.WARNING, msg, *args)
+
+
 @dataclass
 class EmailData:
     html_content: str